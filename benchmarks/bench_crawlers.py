@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+เทียบ pill_crawler.py (ทีละไฟล์) กับ pill_disc_fast_async.py บนเซิร์ฟเวอร์จำลอง (fake_nlm_server.py)
+
+    python benchmarks/bench_crawlers.py --discs 2 --images 150 --latency 40 --bandwidth 2048 \\
+        --concurrency 4 16 32 --chunk 65536 262144
+
+แต่ละรอบ: เริ่มจากโฟลเดอร์ว่าง, POST /__reset, รัน crawler เป็น subprocess, GET /__stats
+รายงาน files/s, MB/s, latency p50/p99 ฝั่ง server และ ttfb p99 ฝั่ง client (async, จาก --metrics)
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SERVER = Path(__file__).resolve().parent / "fake_nlm_server.py"
+SERVER_ARGS = ("discs", "images", "image_kb", "dup_ratio", "listing", "latency", "jitter",
+               "bandwidth", "p429", "p503", "retry_after", "p_drop", "seed")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def http(url: str, method: str = "GET") -> dict:
+    req = urllib.request.Request(url, method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(req, timeout=10) as r:
+        return json.loads(r.read())
+
+
+def start_server(args, port: int) -> subprocess.Popen:
+    cmd = [sys.executable, str(SERVER), "--port", str(port)]
+    for name in SERVER_ARGS:
+        value = getattr(args, name)
+        flag = "--" + name.replace("_", "-")
+        cmd += [flag, *map(str, value)] if isinstance(value, (list, tuple)) else [flag, str(value)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            http(base + "/__stats")
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("fake server did not start")
+
+
+def disk_usage(root: Path) -> tuple[int, int]:
+    """(จำนวนรูป, bytes) ใต้ PillProjectDisc*/ ไม่นับ .blobs / .part"""
+    files = size = 0
+    for p in root.glob("PillProjectDisc*/**/*"):
+        if p.is_file() and p.suffix.lower() in (".jpg", ".jpeg", ".png"):
+            files += 1
+            size += p.stat().st_size
+    return files, size
+
+
+def run_sync(base: str, discs: int, out: Path, sleep: float) -> None:
+    # pill_crawler.py โหลดทีละ disc → วนเองตามจำนวน disc
+    for d in range(1, discs + 1):
+        subprocess.run([sys.executable, str(ROOT / "pill_crawler.py"), "--base", base, "--disc", str(d),
+                        "--out", str(out), "--sleep", str(sleep)],
+                       check=True, stdout=subprocess.DEVNULL, cwd=out)
+
+
+def run_async(base: str, discs: int, out: Path, conc: int, chunk: int, adaptive: bool) -> dict:
+    metrics_base = out / "bench_metrics"
+    cmd = [sys.executable, str(ROOT / "pill_disc_fast_async.py"), "--base", base,
+           "--range", "1", str(discs), "--out", str(out), "--concurrency", str(conc),
+           "--chunk", str(chunk), "--metrics", str(metrics_base)]
+    if not adaptive:
+        cmd += ["--max-concurrency", str(conc)]          # ตรึง concurrency ไว้ให้เทียบกันได้
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, cwd=out)
+    try:
+        return json.loads(metrics_base.with_suffix(".json").read_text(encoding="utf-8"))
+    except OSError:
+        return {}
+
+
+def client_p99(m: dict, name: str) -> float:
+    series = m.get("histograms", {}).get(name, [])
+    return max((s["value"]["p99"] for s in series), default=0.0)
+
+
+def bench(args) -> list[dict]:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}/"
+    server = start_server(args, port)
+    runs = []
+    if not args.skip_sync:
+        runs.append(("sync", None, None))
+    runs += [("async", c, k) for c, k in itertools.product(args.concurrency, args.chunk)]
+    results = []
+    try:
+        for kind, conc, chunk in runs:
+            for rep in range(args.repeat):
+                out = Path(tempfile.mkdtemp(prefix="bench_crawl_", dir=args.tmp))
+                http(base + "__reset", "POST")
+                t0 = time.perf_counter()
+                m = {}
+                if kind == "sync":
+                    run_sync(base, args.discs, out, args.sleep)
+                else:
+                    m = run_async(base, args.discs, out, conc, chunk, args.adaptive)
+                wall = time.perf_counter() - t0
+                st = http(base + "__stats")
+                files, size = disk_usage(out)
+                row = {"crawler": kind, "concurrency": conc, "chunk": chunk, "rep": rep,
+                       "seconds": wall, "files": files, "bytes": size,
+                       "files_s": files / wall, "mb_s": size / wall / 1e6,
+                       "requests": st["requests"], "statuses": st["statuses"],
+                       "srv_p50": st["p50"], "srv_p99": st["p99"],
+                       "ttfb_p99": client_p99(m, "ttfb_seconds")}
+                results.append(row)
+                print(f"  {kind:5s} conc={conc or '-':>3} chunk={chunk or '-':>7}  "
+                      f"{wall:7.2f}s  {row['files_s']:7.1f} files/s  {row['mb_s']:7.2f} MB/s  "
+                      f"srv p50 {st['p50'] * 1e3:6.1f}ms p99 {st['p99'] * 1e3:7.1f}ms  "
+                      f"req {st['requests']}  {st['statuses']}", flush=True)
+                if not args.keep:
+                    shutil.rmtree(out, ignore_errors=True)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return results
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark sync vs async pill crawlers against a local fake NLM server")
+    g = p.add_argument_group("fake server")
+    g.add_argument("--discs", type=int, default=2)
+    g.add_argument("--images", type=int, default=100, help="images per disc")
+    g.add_argument("--image-kb", type=int, nargs=2, default=(40, 400), metavar=("MIN", "MAX"))
+    g.add_argument("--dup-ratio", type=float, default=0.2)
+    g.add_argument("--listing", choices=("pre", "table"), default="pre")
+    g.add_argument("--latency", type=float, default=30.0, help="ms per response")
+    g.add_argument("--jitter", type=float, default=10.0, help="extra random ms")
+    g.add_argument("--bandwidth", type=float, default=0.0, help="KB/s per connection (0 = unlimited)")
+    g.add_argument("--p429", type=float, default=0.0)
+    g.add_argument("--p503", type=float, default=0.0)
+    g.add_argument("--retry-after", type=int, default=1)
+    g.add_argument("--p-drop", type=float, default=0.0)
+    g.add_argument("--seed", type=int, default=0)
+    c = p.add_argument_group("crawlers")
+    c.add_argument("--concurrency", type=int, nargs="+", default=[4, 16, 32])
+    c.add_argument("--chunk", type=int, nargs="+", default=[64 * 1024, 256 * 1024], help="bytes")
+    c.add_argument("--adaptive", action="store_true",
+                   help="let the async limiter grow past --concurrency (default: pinned)")
+    c.add_argument("--sleep", type=float, default=0.0, help="pill_crawler.py delay between files")
+    c.add_argument("--skip-sync", action="store_true", help="skip the sequential crawler (slow)")
+    c.add_argument("--repeat", type=int, default=1)
+    p.add_argument("--tmp", default=None, help="parent dir for per-run output dirs")
+    p.add_argument("--keep", action="store_true", help="keep per-run output dirs")
+    p.add_argument("--json", help="write all results to this file")
+    args = p.parse_args()
+
+    print(f"[BENCH] {args.discs} disc × {args.images} รูป  latency {args.latency}±{args.jitter}ms  "
+          f"bw {args.bandwidth or '∞'}KB/s  429 {args.p429}  503 {args.p503}  drop {args.p_drop}  "
+          f"(cpu {os.cpu_count()})")
+    results = bench(args)
+    if results:
+        best = max((r for r in results if r["crawler"] == "async"), key=lambda r: r["mb_s"], default=None)
+        sync = [r for r in results if r["crawler"] == "sync"]
+        if best:
+            print(f"[BEST] async conc={best['concurrency']} chunk={best['chunk']}  "
+                  f"{best['mb_s']:.2f} MB/s  {best['files_s']:.1f} files/s")
+        if best and sync:
+            print(f"[SPEEDUP] async/sync = {sync[0]['seconds'] / best['seconds']:.1f}x")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+วัด MB/s รวม เมื่อเขียนหลาย stream พร้อมกัน: เขียนใน event loop ตรงๆ (แบบเดิม) vs DiskWriter
+
+network จำลองด้วย asyncio.sleep ต่อ chunk (ตาม --stream-mbps) — ไม่ต้องต่อเน็ต
+ชี้ --dir ไปที่ดิสก์จริงที่จะเก็บ (เช่น USB/NTFS) เพื่อวัดของจริง
+หรือใส่ --disk-latency เพื่อจำลองดิสก์ที่ค้างเป็นช่วงๆ บนเครื่องไหนก็ได้
+
+    python benchmarks/bench_disk_writer.py --dir /media/usb/tmpbench --conc 1 4 8 16 24
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import disk_writer  # noqa: E402
+from disk_writer import DiskWriter  # noqa: E402
+
+
+def slow_disk(latency: float):
+    if latency:
+        time.sleep(latency)
+
+
+async def fake_stream(size: int, chunk: int, stream_bps: float):
+    payload = os.urandom(chunk)
+    sent = 0
+    while sent < size:
+        n = min(chunk, size - sent)
+        await asyncio.sleep(n / stream_bps)
+        sent += n
+        yield payload[:n]
+
+
+async def inline_job(path: Path, size: int, args):
+    # แบบเดิม: mkdir + open + write ใน coroutine
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        async for chunk in fake_stream(size, args.chunk, args.stream_mbps * 1e6):
+            slow_disk(args.disk_latency)
+            f.write(chunk)
+
+
+async def writer_job(path: Path, size: int, args, writer: DiskWriter):
+    await writer.ensure_dirs([path.parent])
+    f = await writer.open(path, 0, size)
+    try:
+        async for chunk in fake_stream(size, args.chunk, args.stream_mbps * 1e6):
+            await f.write(chunk)
+    finally:
+        await f.close()
+
+
+async def run_case(mode: str, conc: int, root: Path, args) -> float:
+    sem = asyncio.Semaphore(conc)
+    writer = DiskWriter(args.disk_threads) if mode == "writer" else None
+
+    async def one(i: int):
+        async with sem:
+            path = root / mode / f"d{i % 8}" / f"f{i}.bin"
+            if writer:
+                await writer_job(path, args.size, args, writer)
+            else:
+                await inline_job(path, args.size, args)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.files)))
+    dt = time.perf_counter() - t0
+    if writer:
+        writer.close()
+    return args.files * args.size / dt / 1e6
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark inline vs thread-pool disk writes")
+    p.add_argument("--dir", help="target directory (default: temp dir)")
+    p.add_argument("--conc", type=int, nargs="+", default=[1, 4, 8, 16, 24, 32])
+    p.add_argument("--files", type=int, default=64)
+    p.add_argument("--size", type=int, default=4 * 1024 * 1024, help="bytes per file")
+    p.add_argument("--chunk", type=int, default=256 * 1024)
+    p.add_argument("--stream-mbps", type=float, default=5.0, help="simulated MB/s per stream")
+    p.add_argument("--disk-latency", type=float, default=0.0, help="seconds added to every write")
+    p.add_argument("--disk-threads", type=int, default=4)
+    args = p.parse_args()
+
+    if args.disk_latency:
+        # ดิสก์ช้าแบบเดียวกันทั้งสองโหมด: writer หน่วงใน thread, inline หน่วงใน loop
+        orig = disk_writer._write_at
+
+        def delayed(fd, data, pos):
+            slow_disk(args.disk_latency)
+            orig(fd, data, pos)
+        disk_writer._write_at = delayed
+
+    base = Path(args.dir) if args.dir else Path(tempfile.mkdtemp(prefix="bench_disk_"))
+    print(f"[BENCH] dir={base}  files={args.files} x {args.size / 1e6:.1f}MB"
+          f"  stream={args.stream_mbps}MB/s  disk-latency={args.disk_latency}s")
+    print(f"{'conc':>6} {'inline MB/s':>12} {'writer MB/s':>12} {'speedup':>8}")
+    try:
+        for conc in args.conc:
+            root = base / f"c{conc}"
+            before = asyncio.run(run_case("inline", conc, root, args))
+            after = asyncio.run(run_case("writer", conc, root, args))
+            shutil.rmtree(root, ignore_errors=True)
+            print(f"{conc:>6} {before:>12.1f} {after:>12.1f} {after / before:>7.2f}x")
+    finally:
+        if not args.dir:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+เทียบความเร็ว parser หน้า directory listing (fast / lxml / bs4)
+
+ใช้หน้า index ที่เซฟไว้จริง:
+    curl -s https://data.lhncbc.nlm.nih.gov/public/Pills/PillProjectDisc1/images/ > pages/disc1.html
+    python benchmarks/bench_listing_parser.py --pages pages/
+ไม่ใส่ --pages จะสร้างหน้าแบบ Apache (<pre> และ <table>) ขนาด --entries รายการให้เอง
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from listing_parser import PARSERS, parse_listing  # noqa: E402
+
+BASE_URL = "https://data.lhncbc.nlm.nih.gov/public/Pills/PillProjectDisc1/images/"
+
+
+def synthetic_pages(n: int) -> dict[str, str]:
+    names = [f"{i:05d}-{i % 977:04d}-{i % 89:02d}_{i * 2654435761 % 2**32:08X}.jpg" for i in range(n)]
+    pre = ["<html><head><title>Index of /images</title></head><body><h1>Index of /images</h1><pre>"
+           '<img src="/icons/blank.gif" alt="Icon "> <a href="?C=N;O=D">Name</a>'
+           '                    <a href="?C=M;O=A">Last modified</a>      <a href="?C=S;O=A">Size</a>\n<hr>']
+    for i, name in enumerate(names):
+        pre.append(f'<img src="/icons/image2.gif" alt="[IMG]"> <a href="{name}">{name}</a>'
+                   f"   2015-03-{1 + i % 28:02d} 12:{i % 60:02d}  {100 + i % 900}K\n")
+    pre.append("<hr></pre></body></html>")
+    table = ['<html><body><table><tr><th><a href="?C=N;O=D">Name</a></th><th>Last modified</th><th>Size</th></tr>']
+    for i, name in enumerate(names):
+        table.append(f'<tr><td valign="top"><img src="/icons/image2.gif" alt="[IMG]"></td>'
+                     f'<td><a href="{name}">{name}</a></td><td align="right">2015-03-10 12:34  </td>'
+                     f'<td align="right">{1000 + i}</td><td>&nbsp;</td></tr>\n')
+    table.append("</table></body></html>")
+    return {f"apache-pre-{n}": "".join(pre), f"apache-table-{n}": "".join(table)}
+
+
+def bench(html: str, parser: str, repeat: int) -> tuple[float, int]:
+    times = []
+    n = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        n = len(parse_listing(html, BASE_URL, parser))
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times), n
+
+
+def main():
+    p = argparse.ArgumentParser(description="Directory-listing parser micro-benchmark")
+    p.add_argument("--pages", help="directory of saved index pages (*.html)")
+    p.add_argument("--entries", type=int, default=5000, help="entries per synthetic page")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--parsers", nargs="+", default=list(PARSERS))
+    args = p.parse_args()
+
+    if args.pages:
+        pages = {f.name: f.read_text(encoding="utf-8", errors="replace")
+                 for f in sorted(Path(args.pages).glob("*.htm*"))}
+    else:
+        pages = synthetic_pages(args.entries)
+
+    print(f"{'page':<28} {'parser':<6} {'median ms':>10} {'links':>7} {'vs bs4':>8}")
+    for name, html in pages.items():
+        results = {}
+        for parser in args.parsers:
+            try:
+                results[parser] = bench(html, parser, args.repeat)
+            except ImportError as e:
+                print(f"{name:<28} {parser:<6} {'skip':>10}  ({e.name} not installed)")
+        ref_urls = None
+        for parser, (dt, n) in results.items():
+            speed = f"{results['bs4'][0] / dt:.1f}x" if "bs4" in results else "-"
+            print(f"{name:<28} {parser:<6} {dt * 1000:>10.2f} {n:>7} {speed:>8}")
+            urls = [e.url for e in parse_listing(html, BASE_URL, parser)]
+            if ref_urls is None:
+                ref_urls = urls
+            elif urls != ref_urls:
+                print(f"  [WARN] {parser}: href ไม่ตรงกับ {next(iter(results))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+เทียบ close_pairs (near_duplicates.py) ระหว่าง popcount แบบ np.bitwise_count (NumPy >= 2.0) กับ LUT (NumPy < 2.0)
+
+ใช้ hash สุ่ม + คู่เกือบซ้ำที่ฝังไว้ + bucket ใหญ่ (hash ที่ช่วงแรกเหมือนกัน → ผ่าน _block_pairs)
+สองทางต้องได้คู่ชุดเดียวกัน (และตรงกับ brute force ถ้า n ไม่เกิน --brute-max) ไม่งั้นจบด้วย exit code 1
+
+    python benchmarks/bench_near_duplicates.py --n 200000 --big 2000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "dataset_yolo"))
+import near_duplicates as nd  # noqa: E402
+
+
+def synthetic_hashes(n: int, big: int, t: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    h = rng.integers(0, 2**63, n, dtype=np.uint64) ^ (rng.integers(0, 2, n, dtype=np.uint64) << np.uint64(63))
+    # คู่เกือบซ้ำ: สำเนาของรูปสุ่มที่กลับ bit ไม่เกิน t+1 ตำแหน่ง (t+1 = ต้องไม่ถูกนับ)
+    k = n // 10
+    src = rng.integers(0, n, k)
+    dst = rng.integers(0, n, k)
+    for s, d in zip(src, dst):
+        flip = rng.choice(64, rng.integers(0, t + 2), replace=False)
+        h[d] = h[s] ^ np.uint64(sum(1 << int(b) for b in flip))
+    # bucket ใหญ่: bit ช่วงแรกเหมือนกันหมด (เช่น รูปพื้นหลังล้วน)
+    if big:
+        _, width = nd._chunks(t)[0]
+        mask = np.uint64((1 << width) - 1)
+        idx = rng.choice(n, min(big, n), replace=False)
+        h[idx] = (h[idx] & ~mask) | np.uint64(0x5A5A5A5A5A5A5A5A & ((1 << width) - 1))
+    return h
+
+
+def brute_pairs(h: np.ndarray, t: int) -> np.ndarray:
+    d = nd.popcount64(h[:, None] ^ h[None, :])
+    i, j = np.nonzero(np.triu(d <= t, 1))
+    return np.stack([i, j], 1).astype(np.int64)
+
+
+def run(h: np.ndarray, t: int, popcount) -> tuple[np.ndarray, int, float]:
+    nd.popcount64 = popcount          # close_pairs/_block_pairs เรียกผ่าน global ของโมดูล
+    t0 = time.perf_counter()
+    pairs, compared = nd.close_pairs(h, t)
+    return pairs, compared, time.perf_counter() - t0
+
+
+def main():
+    p = argparse.ArgumentParser(description="Check/benchmark near-duplicate pair search with both popcount paths")
+    p.add_argument("--n", type=int, default=50_000, help="number of hashes")
+    p.add_argument("--big", type=int, default=1000, help="size of the forced large bucket")
+    p.add_argument("--threshold", type=int, default=nd.THRESHOLD)
+    p.add_argument("--brute-max", type=int, default=5000, help="also compare with O(n^2) brute force up to this n")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+
+    h = synthetic_hashes(args.n, args.big, args.threshold, args.seed)
+    native = nd.popcount64
+    paths = {"lut": nd._popcount64_lut}
+    if hasattr(np, "bitwise_count"):
+        paths = {"bitwise_count": native, **paths}
+    else:
+        print("[INFO] NumPy < 2.0 ไม่มี bitwise_count → เทียบ LUT กับ brute force อย่างเดียว")
+    print(f"[BENCH] n={args.n}  big bucket={args.big}  threshold={args.threshold}  numpy={np.__version__}")
+    results = {}
+    try:
+        for name, fn in paths.items():
+            pairs, compared, dt = run(h, args.threshold, fn)
+            results[name] = pairs
+            print(f"  {name:14s} {len(pairs):>8} คู่  เทียบ {compared:>10}  {dt:7.3f}s")
+    finally:
+        nd.popcount64 = native
+    if args.n <= args.brute_max:
+        results["brute"] = brute_pairs(h, args.threshold)
+        print(f"  {'brute':14s} {len(results['brute']):>8} คู่")
+    ref_name, ref = next(iter(results.items()))
+    bad = [name for name, pairs in results.items() if not np.array_equal(pairs, ref)]
+    if bad:
+        print(f"[ERR ] คู่ไม่ตรงกับ {ref_name}: {', '.join(bad)}")
+        sys.exit(1)
+    print(f"[OK] ทุกทางได้คู่ชุดเดียวกัน ({len(ref)} คู่)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+เทียบ samples/s ของการอ่าน dataset แบบไฟล์เดี่ยว (images/ + labels/) กับ shard + mmap (pack_shards.py)
+
+    python benchmarks/bench_shard_loading.py --data <DATA_ROOT>/data.yaml --shards <DATA_ROOT>/shards
+    python benchmarks/bench_shard_loading.py --synthetic 5000          # สร้าง dataset ปลอมใน /tmp แล้ววัด
+
+วัดผลบน USB/NAS ให้ตรงกับตอนเทรน: ล้าง page cache ก่อนแต่ละรอบ (ต้องเป็น root)
+    sync; echo 3 | sudo tee /proc/sys/vm/drop_caches
+"""
+
+import argparse
+import io
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "dataset_yolo"))
+from pack_shards import ShardReader  # noqa: E402
+from prepare_resized_cache import list_split, load_data_yaml  # noqa: E402
+
+
+def make_synthetic(root: Path, n: int, size: int):
+    from PIL import Image
+    (root / "images" / "train").mkdir(parents=True)
+    (root / "labels" / "train").mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    for i in range(n):
+        arr = rng.integers(0, 255, (size, size, 3), dtype=np.uint8)
+        Image.fromarray(arr).save(root / "images" / "train" / f"p{i:06d}.jpg", quality=85)
+        (root / "labels" / "train" / f"p{i:06d}.txt").write_text(f"{i % 49} 0.5 0.5 0.3 0.3\n")
+    (root / "data.yaml").write_text(f'path: "{root}"\ntrain: "images/train"\nnc: 49\nnames: []\n')
+
+
+def decode_bytes(buf) -> np.ndarray:
+    try:
+        import cv2
+        return cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_COLOR)
+    except ImportError:
+        from PIL import Image
+        with Image.open(io.BytesIO(buf)) as im:
+            return np.asarray(im.convert("RGB"))
+
+
+def run(fn, order, threads: int) -> float:
+    t0 = time.perf_counter()
+    if threads <= 1:
+        for i in order:
+            fn(i)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as ex:
+            for _ in ex.map(fn, order, chunksize=64):
+                pass
+    return time.perf_counter() - t0
+
+
+def main():
+    p = argparse.ArgumentParser(description="Loose files vs mmap shards: samples/s")
+    p.add_argument("--data", help="data.yaml of the loose-file dataset")
+    p.add_argument("--shards", help="shard dir from pack_shards.py")
+    p.add_argument("--split", default="train")
+    p.add_argument("--synthetic", type=int, default=0, help="generate N images in a temp dir instead")
+    p.add_argument("--size", type=int, default=320, help="synthetic image side (px)")
+    p.add_argument("--n", type=int, default=0, help="samples per run (0 = all)")
+    p.add_argument("--decode", action="store_true", help="also decode images (CPU-bound part)")
+    p.add_argument("--threads", type=int, nargs="+", default=[1, 8], help="reader threads to try")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+
+    tmp = None
+    if args.synthetic:
+        tmp = Path(tempfile.mkdtemp(prefix="bench_shards_"))
+        print(f"[INFO] synthetic {args.synthetic} รูป {args.size}px → {tmp}")
+        make_synthetic(tmp, args.synthetic, args.size)
+        args.data = str(tmp / "data.yaml")
+        args.shards = str(tmp / "shards")
+        subprocess.run([sys.executable, str(Path(__file__).resolve().parents[1] / "dataset_yolo" / "pack_shards.py"),
+                        "--data", args.data, "--out", args.shards], check=True, stdout=subprocess.DEVNULL)
+    if not (args.data and args.shards):
+        sys.exit("[ERR ] ต้องระบุ --data และ --shards (หรือ --synthetic N)")
+
+    try:
+        cfg = load_data_yaml(Path(args.data))
+        root = Path(cfg.get("path") or Path(args.data).parent)
+        pairs = list_split(root, cfg[args.split])
+        reader = ShardReader(args.shards, args.split)
+        # ลำดับสุ่มแบบเดียวกับ DataLoader shuffle; ใช้ชื่อไฟล์จับคู่ให้ทั้งสองแบบอ่านรูปเดียวกัน
+        pos = {n: i for i, n in enumerate(reader.names.tolist())}
+        common = [(img, lbl, pos[img.name]) for img, lbl in pairs if img.name in pos]
+        rng = random.Random(args.seed)
+        rng.shuffle(common)
+        if args.n:
+            common = common[:args.n]
+        n = len(common)
+        nbytes = int(sum(int(reader.img_len[k]) + int(reader.lbl_len[k]) for _, _, k in common))
+        print(f"[INFO] {n} samples, {nbytes / 1e6:.1f} MB, decode={args.decode}")
+
+        def loose(j):
+            img, lbl, _ = common[j]
+            data = img.read_bytes()
+            if lbl:
+                lbl.read_text(encoding="utf-8")
+            if args.decode:
+                decode_bytes(data)
+
+        def shard(j):
+            k = common[j][2]
+            buf = reader.image_bytes(k)
+            reader.boxes(k)
+            if args.decode:
+                decode_bytes(buf)
+            else:
+                np.frombuffer(buf, np.uint8).sum(dtype=np.uint64)   # แตะทุก page ให้ยุติธรรมกับการอ่านไฟล์
+
+        order = list(range(n))
+        for threads in args.threads:
+            for name, fn in (("loose", loose), ("shard", shard)):
+                times = [run(fn, order, threads) for _ in range(args.repeat)]
+                best, med = min(times), statistics.median(times)
+                print(f"  {name:5s} threads={threads:<3} {n / med:9.0f} samples/s (median)  "
+                      f"{n / best:9.0f} best  {nbytes / med / 1e6:8.1f} MB/s")
+        reader.close()
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ตรวจว่า ShardYOLODataset (shard_dataset.py) คืนรูปตรงกับ label ทุกตัวเมื่อเปิด rect mode
+(rect เรียง im_files/labels ใหม่ตามสัดส่วนภาพ — val ใช้ rect เสมอ)
+
+สร้าง dataset ปลอมใน /tmp: รูปสีพื้นต่างกันทุกรูป สัดส่วนภาพคละกัน, class = ลำดับรูป
+แล้วเทียบสีของรูปที่ load_image คืน กับสีที่ควรเป็นของชื่อไฟล์ใน label นั้น (ต้องมี ultralytics)
+
+    python benchmarks/check_shard_rect.py --n 64
+"""
+
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "dataset_yolo"))
+
+SIZES = ((320, 160), (160, 320), (240, 240), (320, 200), (200, 320))   # (w, h) คละสัดส่วน
+
+
+def color(i: int) -> tuple[int, int, int]:
+    return (i * 37) % 256, (i * 91 + 64) % 256, (i * 53 + 128) % 256
+
+
+def make_synthetic(root: Path, n: int):
+    from PIL import Image
+    (root / "images" / "val").mkdir(parents=True)
+    (root / "labels" / "val").mkdir(parents=True)
+    for i in range(n):
+        Image.new("RGB", SIZES[i % len(SIZES)], color(i)).save(root / "images" / "val" / f"p{i:04d}.png")
+        (root / "labels" / "val" / f"p{i:04d}.txt").write_text(f"{i} 0.5 0.5 0.3 0.3\n")
+    (root / "data.yaml").write_text(f'path: "{root}"\ntrain: "images/val"\nval: "images/val"\nnc: {n}\n'
+                                    f"names: [{', '.join(f'c{i}' for i in range(n))}]\n")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Check that rect-mode shard datasets pair each label with its image")
+    p.add_argument("--n", type=int, default=64, help="synthetic images")
+    p.add_argument("--batch", type=int, default=8)
+    args = p.parse_args()
+
+    from ultralytics.cfg import get_cfg
+    from shard_dataset import ShardYOLODataset
+
+    tmp = Path(tempfile.mkdtemp(prefix="check_shard_rect_"))
+    try:
+        make_synthetic(tmp, args.n)
+        subprocess.run([sys.executable, str(Path(__file__).resolve().parents[1] / "dataset_yolo" / "pack_shards.py"),
+                        "--data", str(tmp / "data.yaml"), "--out", str(tmp / "shards")],
+                       check=True, stdout=subprocess.DEVNULL)
+        ds = ShardYOLODataset(img_path=str(tmp / "shards" / "images" / "val"), shard_dir=tmp / "shards",
+                              split="val", imgsz=320, batch_size=args.batch, augment=False, hyp=get_cfg(),
+                              rect=True, stride=32, pad=0.5, data={"names": {i: f"c{i}" for i in range(args.n)}})
+        batch = ds.collate_fn([ds[k] for k in range(min(len(ds), args.batch))])   # ทั้งสาย transform ต้องผ่าน
+        assert "shard_idx" not in batch
+        moved = sum(Path(f).stem != f"p{k:04d}" for k, f in enumerate(ds.im_files))
+        bad = []
+        for k in range(len(ds)):
+            i = int(Path(ds.im_files[k]).stem[1:])
+            cls = ds.labels[k]["cls"].ravel().tolist()
+            im, _, _ = ds.load_image(k)
+            got = im.reshape(-1, 3).mean(0)[::-1]            # BGR → RGB
+            if cls != [i] or np.abs(got - color(i)).max() > 2:
+                bad.append((k, ds.im_files[k], cls, got.round().tolist(), color(i)))
+        print(f"[CHECK] {len(ds)} รูป  rect เรียงใหม่ {moved} ตำแหน่ง")
+        if bad:
+            for row in bad[:10]:
+                print(f"  [ERR ] {row}")
+            print(f"[ERR ] รูปไม่ตรงกับ label {len(bad)} ตัว")
+            sys.exit(1)
+        print("[OK] ทุก label ได้รูปของตัวเอง")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
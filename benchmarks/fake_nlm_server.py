@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+เซิร์ฟเวอร์จำลอง data.lhncbc.nlm.nih.gov/public/Pills/ สำหรับวัด/ทดสอบ crawler แบบออฟไลน์
+
+    python benchmarks/fake_nlm_server.py --port 8900 --discs 5 --images 300 --latency 30 --p429 0.02
+    python pill_disc_fast_async.py --base http://127.0.0.1:8900/ --range 1 5 --out /tmp/out
+
+- PillProjectDisc{N}/images/   : หน้า index แบบ Apache (<pre> หรือ <table>) มี ETag / Last-Modified
+- PillProjectDisc{N}/images/x  : รูป (เนื้อหาสุ่มแบบ deterministic, ขนาดตาม --image-kb)
+- PillProjectDisc{N}/MedicosConsultantsExport_{N}.xml และ ALLXML/...
+- รองรับ Range (206/416) และ If-None-Match (304)
+- ความผิดปกติที่ใส่ได้: latency, bandwidth ต่อ connection, 429/503 (+Retry-After), ตัด connection กลางไฟล์
+- GET /__stats  → จำนวน request, bytes, latency p50/p90/p99 (วัดฝั่ง server)   POST /__reset ล้างสถิติ
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import statistics
+import time
+from email.utils import formatdate
+
+from aiohttp import web
+
+STARTED = formatdate(time.time() - 86400 * 365, usegmt=True)
+CHUNK = 64 * 1024
+
+
+class FakeNLM:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.latencies: list[float] = []
+        self.bytes_sent = 0
+        self.statuses: dict[int, int] = {}
+        self._names: dict[int, list[str]] = {}
+
+    # ---------- deterministic content ----------
+    def image_names(self, disc: int) -> list[str]:
+        if disc not in self._names:
+            self._names[disc] = [
+                f"{disc:03d}{i:05d}-{(disc * 31 + i) % 9973:04d}_{i * 2654435761 % 2**32:08X}.jpg"
+                for i in range(self.args.images)]
+        return self._names[disc]
+
+    def content_key(self, name: str) -> str:
+        """--dup-ratio: รูปลำดับที่ i บางตัวมีเนื้อ (และขนาด) เหมือนกันทุก disc (เหมือนรูปอ้างอิงของจริง)
+        key ของรูปซ้ำต้องไม่ขึ้นกับ disc — ชื่อไฟล์มีเลข disc ปนอยู่ทุกส่วน จึงใช้ลำดับ i แทน"""
+        dup = f"dup-{int(name[3:8])}"
+        h = int(hashlib.md5(dup.encode()).hexdigest()[:8], 16)
+        return dup if (h % 1000) < self.args.dup_ratio * 1000 else name
+
+    def image_size(self, name: str) -> int:
+        lo, hi = self.args.image_kb
+        h = int(hashlib.md5(self.content_key(name).encode()).hexdigest()[:8], 16)
+        return 1024 * (lo + h % max(1, hi - lo + 1))
+
+    def body(self, name: str, size: int) -> bytes:
+        seed = hashlib.sha256(self.content_key(name).encode()).digest()
+        head = b"\xff\xd8\xff\xe0" + seed
+        return (head * (size // len(head) + 1))[:size]
+
+    def xml(self, disc: int) -> bytes:
+        rows = "".join(
+            f"<Image><ProprietaryName>Drug {i % 49}</ProprietaryName><NDC11>{disc:05d}{i:06d}</NDC11>"
+            f"<File><Name>{n}</Name></File><Imprint>P{i}</Imprint><Shape>ROUND</Shape>"
+            f"<Color>WHITE</Color><Size>8</Size></Image>"
+            for i, n in enumerate(self.image_names(disc)))
+        return (f'<?xml version="1.0"?><MedicosConsultantsExport><ImageExport>{rows}'
+                f"</ImageExport></MedicosConsultantsExport>").encode()
+
+    def listing(self, disc: int) -> str:
+        def human(n):
+            return f"{n / 1024:.0f}K" if n < 1024 * 1024 else f"{n / 1024 / 1024:.1f}M"
+        names = self.image_names(disc)
+        if self.args.listing == "table":
+            rows = "".join(
+                f'<tr><td valign="top"><img src="/icons/image2.gif" alt="[IMG]"></td>'
+                f'<td><a href="{n}">{n}</a></td><td align="right">2015-03-10 12:34  </td>'
+                f'<td align="right">{human(self.image_size(n))}</td><td>&nbsp;</td></tr>\n' for n in names)
+            return (f"<html><body><h1>Index of /PillProjectDisc{disc}/images</h1><table>"
+                    f'<tr><th><a href="?C=N;O=D">Name</a></th></tr>\n{rows}</table></body></html>')
+        rows = "".join(f'<img src="/icons/image2.gif" alt="[IMG]"> <a href="{n}">{n}</a>'
+                       f"   2015-03-10 12:34  {human(self.image_size(n))}\n" for n in names)
+        return (f"<html><body><h1>Index of /PillProjectDisc{disc}/images</h1><pre>"
+                f'<a href="?C=N;O=D">Name</a>\n<hr><a href="../">Parent Directory</a>\n{rows}</pre></body></html>')
+
+    # ---------- faults ----------
+    async def delay(self):
+        if self.args.latency:
+            jitter = self.rng.uniform(0, self.args.jitter) if self.args.jitter else 0
+            await asyncio.sleep((self.args.latency + jitter) / 1000)
+
+    def fault(self) -> web.Response | None:
+        r = self.rng.random()
+        if r < self.args.p429:
+            return web.Response(status=429, headers={"Retry-After": str(self.args.retry_after)})
+        if r < self.args.p429 + self.args.p503:
+            return web.Response(status=503, headers={"Retry-After": str(self.args.retry_after)})
+        return None
+
+    async def send_bytes(self, request, data: bytes, etag: str, content_type: str):
+        size = len(data)
+        start, end, status = 0, size - 1, 200
+        rng = request.headers.get("Range")
+        if rng and rng.startswith("bytes="):
+            a, _, b = rng[6:].partition("-")
+            start = int(a) if a else 0
+            end = int(b) if b else size - 1
+            if start >= size:
+                return web.Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+            status = 206
+        headers = {"Content-Length": str(end - start + 1), "ETag": etag, "Accept-Ranges": "bytes",
+                   "Last-Modified": STARTED, "Content-Type": content_type}
+        if status == 206:
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        resp = web.StreamResponse(status=status, headers=headers)
+        await resp.prepare(request)
+        drop_at = None
+        if self.rng.random() < self.args.p_drop:
+            drop_at = start + (end - start + 1) // 2
+        bps = self.args.bandwidth * 1024
+        pos = start
+        while pos <= end:
+            n = min(CHUNK, end - pos + 1)
+            if drop_at is not None and pos + n > drop_at:
+                await resp.write(data[pos:drop_at])
+                self.bytes_sent += drop_at - pos
+                request.transport.close()          # ตัดกลางไฟล์ → client ได้ไฟล์ไม่ครบ
+                return resp
+            await resp.write(data[pos:pos + n])
+            self.bytes_sent += n
+            pos += n
+            if bps:
+                await asyncio.sleep(n / bps)
+        await resp.write_eof()
+        return resp
+
+    # ---------- handlers ----------
+    @web.middleware
+    async def stats_mw(self, request, handler):
+        t0 = time.perf_counter()
+        resp = await handler(request)
+        if not request.path.startswith("/__"):
+            self.latencies.append(time.perf_counter() - t0)
+            self.statuses[resp.status] = self.statuses.get(resp.status, 0) + 1
+        return resp
+
+    def _disc(self, request) -> int:
+        disc = int(request.match_info["disc"])
+        if not 1 <= disc <= self.args.discs:
+            raise web.HTTPNotFound()
+        return disc
+
+    async def h_listing(self, request):
+        disc = self._disc(request)
+        await self.delay()
+        etag = f'"list-{disc}-{self.args.images}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        bad = self.fault()
+        if bad:
+            return bad
+        return web.Response(text=self.listing(disc), content_type="text/html",
+                            headers={"ETag": etag, "Last-Modified": STARTED})
+
+    async def h_image(self, request):
+        disc = self._disc(request)
+        name = request.match_info["name"]
+        if name == "index.html":
+            return await self.h_listing(request)
+        if name not in self.image_names(disc):
+            raise web.HTTPNotFound()
+        await self.delay()
+        bad = self.fault()
+        if bad:
+            return bad
+        return await self.send_bytes(request, self.body(name, self.image_size(name)),
+                                     f'"{hashlib.md5(name.encode()).hexdigest()}"', "image/jpeg")
+
+    async def h_xml(self, request):
+        disc = self._disc(request)
+        if int(request.match_info.get("disc2", disc)) != disc:
+            raise web.HTTPNotFound()
+        await self.delay()
+        return await self.send_bytes(request, self.xml(disc), f'"xml-{disc}"', "application/xml")
+
+    async def h_stats(self, request):
+        lat = sorted(self.latencies)
+
+        def q(p):
+            return lat[min(len(lat) - 1, int(p * len(lat)))] if lat else 0.0
+        return web.json_response({
+            "requests": len(lat), "bytes": self.bytes_sent, "statuses": self.statuses,
+            "p50": q(0.5), "p90": q(0.9), "p99": q(0.99),
+            "mean": statistics.fmean(lat) if lat else 0.0,
+        })
+
+    async def h_reset(self, request):
+        self.latencies.clear()
+        self.statuses.clear()
+        self.bytes_sent = 0
+        return web.json_response({"ok": True})
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.stats_mw])
+        r = app.router
+        r.add_get("/__stats", self.h_stats)
+        r.add_post("/__reset", self.h_reset)
+        r.add_get(r"/PillProjectDisc{disc:\d+}/images/", self.h_listing)
+        r.add_get(r"/PillProjectDisc{disc:\d+}/images/{name}", self.h_image)
+        r.add_get(r"/PillProjectDisc{disc2:\d+}/MedicosConsultantsExport_{disc:\d+}.xml", self.h_xml)
+        r.add_get(r"/ALLXML/MedicosConsultantsExport_{disc:\d+}.xml", self.h_xml)
+        return app
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Local stand-in for the NLM Pills server")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8900)
+    p.add_argument("--discs", type=int, default=3)
+    p.add_argument("--images", type=int, default=200, help="images per disc")
+    p.add_argument("--image-kb", type=int, nargs=2, default=(40, 400), metavar=("MIN", "MAX"))
+    p.add_argument("--dup-ratio", type=float, default=0.2, help="fraction of images identical across discs")
+    p.add_argument("--listing", choices=("pre", "table"), default="pre")
+    p.add_argument("--latency", type=float, default=0.0, help="ms added to every response")
+    p.add_argument("--jitter", type=float, default=0.0, help="extra random ms (uniform)")
+    p.add_argument("--bandwidth", type=float, default=0.0, help="KB/s per connection (0 = unlimited)")
+    p.add_argument("--p429", type=float, default=0.0)
+    p.add_argument("--p503", type=float, default=0.0)
+    p.add_argument("--retry-after", type=int, default=1)
+    p.add_argument("--p-drop", type=float, default=0.0, help="probability of dropping a body mid-way")
+    p.add_argument("--seed", type=int, default=0)
+    return p
+
+
+def main():
+    args = build_parser().parse_args()
+    server = FakeNLM(args)
+    print(f"[FAKE] http://{args.host}:{args.port}/  discs={args.discs} images={args.images} "
+          f"latency={args.latency}ms bw={args.bandwidth or '∞'}KB/s 429={args.p429} 503={args.p503} "
+          f"drop={args.p_drop}", flush=True)
+    web.run_app(server.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load test ของ dataset_yolo/serve.py: ยิงรูปพร้อมกันหลาย client แล้ววัด throughput และ latency p50/p99
+เทียบหลายค่า --window-ms (เปิด service ใหม่เป็น subprocess ทีละค่า)
+
+    python benchmarks/load_test_service.py --onnx best.onnx --images some/dir \\
+        --windows 0 2 5 10 20 --clients 32 --requests 2000 --repeat-ratio 0.3
+
+ใช้กับ service ที่รันอยู่แล้ว (วัดค่า window เดียว):
+    python benchmarks/load_test_service.py --url http://127.0.0.1:8080 --images some/dir
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import aiohttp
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+SERVE = ROOT / "dataset_yolo" / "serve.py"
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def http_json(url: str, method: str = "GET") -> dict:
+    req = urllib.request.Request(url, method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(req, timeout=30) as r:
+        return json.loads(r.read())
+
+
+def start_service(args, window: float, port: int) -> subprocess.Popen:
+    cmd = [sys.executable, str(SERVE), "--onnx", args.onnx, "--port", str(port),
+           "--window-ms", str(window), "--max-batch", str(args.max_batch),
+           "--cache-size", str(args.cache_size)]
+    if args.data:
+        cmd += ["--data", args.data]
+    if args.threads:
+        cmd += ["--threads", str(args.threads)]
+    proc = subprocess.Popen(cmd, cwd=SERVE.parent, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(600):           # โหลดโมเดลอาจใช้เวลา
+        if proc.poll() is not None:
+            raise RuntimeError(f"serve.py exited with {proc.returncode}")
+        try:
+            http_json(base + "/health")
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("serve.py did not start")
+
+
+def build_workload(images: list[bytes], n: int, repeat_ratio: float, seed: int) -> list[int]:
+    """ลำดับ index ของรูป: สัดส่วน repeat_ratio เป็นรูปที่เคยส่งแล้ว (จำลองรูปอ้างอิงที่ถูกส่งซ้ำ)"""
+    rng = random.Random(seed)
+    order, seen = [], []
+    fresh = list(range(len(images)))
+    rng.shuffle(fresh)
+    for _ in range(n):
+        if seen and (rng.random() < repeat_ratio or not fresh):
+            order.append(rng.choice(seen))
+        else:
+            i = fresh.pop() if fresh else rng.randrange(len(images))
+            seen.append(i)
+            order.append(i)
+    return order
+
+
+async def run_load(base: str, images: list[bytes], order: list[int], clients: int) -> dict:
+    latencies, errors = [], 0
+    it = iter(order)
+    sources = {}
+
+    async def client(session):
+        nonlocal errors
+        for i in it:
+            t0 = time.perf_counter()
+            try:
+                async with session.post(base + "/predict", data=images[i]) as r:
+                    body = await r.json()
+                    if r.status != 200:
+                        errors += 1
+                        continue
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - t0) * 1e3)
+            sources[body.get("source")] = sources.get(body.get("source"), 0) + 1
+
+    conn = aiohttp.TCPConnector(limit=clients)
+    t0 = time.perf_counter()
+    async with aiohttp.ClientSession(connector=conn) as session:
+        await asyncio.gather(*(client(session) for _ in range(clients)))
+    wall = time.perf_counter() - t0
+    a = np.asarray(latencies) if latencies else np.zeros(1)
+    return {"requests": len(latencies), "errors": errors, "seconds": wall,
+            "rps": len(latencies) / wall if wall else 0.0,
+            "p50": float(np.percentile(a, 50)), "p90": float(np.percentile(a, 90)),
+            "p99": float(np.percentile(a, 99)), "sources": sources}
+
+
+def main():
+    p = argparse.ArgumentParser(description="Load test for the pill detector service")
+    g = p.add_mutually_exclusive_group(required=True)
+    g.add_argument("--onnx", help="start serve.py with this model for each --windows value")
+    g.add_argument("--url", help="test an already running service instead")
+    p.add_argument("--data", help="data.yaml passed to serve.py")
+    p.add_argument("--images", required=True, help="directory of test images")
+    p.add_argument("--windows", type=float, nargs="+", default=[0, 2, 5, 10, 20], help="batch windows (ms)")
+    p.add_argument("--max-batch", type=int, default=16)
+    p.add_argument("--cache-size", type=int, default=10000)
+    p.add_argument("--threads", type=int, default=0)
+    p.add_argument("--clients", type=int, default=32, help="concurrent connections")
+    p.add_argument("--requests", type=int, default=1000)
+    p.add_argument("--repeat-ratio", type=float, default=0.0, help="fraction of repeated images (cache hits)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--json", help="write results to this file")
+    args = p.parse_args()
+
+    img_dir = Path(args.images)
+    paths = sorted(q for q in img_dir.iterdir() if q.suffix.lower() in IMG_EXTS)
+    if not paths:
+        sys.exit(f"[ERR ] ไม่พบรูปใน {img_dir}")
+    images = [q.read_bytes() for q in paths]
+    order = build_workload(images, args.requests, args.repeat_ratio, args.seed)
+    print(f"[LOAD] {len(images)} รูป, {args.requests} request, {args.clients} client, "
+          f"ซ้ำ {args.repeat_ratio:.0%} (cpu {os.cpu_count()})")
+
+    runs = [(None, args.url.rstrip("/"))] if args.url else [(w, None) for w in args.windows]
+    results = []
+    for window, url in runs:
+        proc = None
+        if url is None:
+            port = free_port()
+            proc = start_service(args, window, port)
+            url = f"http://127.0.0.1:{port}"
+        try:
+            http_json(url + "/reset?cache=1", "POST")
+            # warmup: ไม่นับเวลาโหลด session / page-in ของโมเดล
+            asyncio.run(run_load(url, images, order[:min(len(order), args.clients)], args.clients))
+            http_json(url + "/reset?cache=1", "POST")
+            r = asyncio.run(run_load(url, images, order, args.clients))
+            st = http_json(url + "/stats")
+        finally:
+            if proc:
+                proc.terminate()
+                proc.wait(timeout=30)
+        r.update(window_ms=st.get("window_ms", window), mean_batch=st.get("mean_batch"),
+                 cache_hits=st.get("cache", {}).get("hits"), server=st)
+        results.append(r)
+        print(f"  window {r['window_ms']:>5.1f}ms  {r['rps']:8.1f} req/s  p50 {r['p50']:7.1f}ms  "
+              f"p90 {r['p90']:7.1f}ms  p99 {r['p99']:7.1f}ms  batch เฉลี่ย {r['mean_batch']}  "
+              f"cache hit {r['cache_hits']}  ผิดพลาด {r['errors']}", flush=True)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ที่เก็บไฟล์แบบ content-addressed (sha256) สำหรับรูปที่ดาวน์โหลด
+
+รูปอ้างอิงของ NLM ซ้ำกันข้าม PillProjectDisc* เยอะมาก — เก็บตัวจริงไว้ชุดเดียวที่
+OUT/.blobs/ab/cdef... แล้ว hardlink (หรือ reflink ถ้า hardlink ไม่ได้) ไปที่ path ของแต่ละ disc
+
+    python blob_store.py report --root Pills_downloads     # ประหยัดไปเท่าไร
+    python blob_store.py ingest --root Pills_downloads     # ย้ายไฟล์ที่โหลดไว้ก่อนหน้าเข้า store
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:       # Windows
+    fcntl = None
+
+BLOB_DIR = ".blobs"
+HASH = "sha256"
+READ_CHUNK = 1024 * 1024
+FICLONE = 0x40049409      # ioctl reflink (btrfs/xfs/ocfs2) — Linux
+
+
+def new_hasher():
+    return hashlib.new(HASH)
+
+
+def hash_file(path: Path, limit: int | None = None):
+    """hasher ของ byte แรก limit ตัวของไฟล์ (ทั้งไฟล์ถ้า None) — ใช้ต่อ hash ตอน resume .part"""
+    h = new_hasher()
+    left = limit
+    with open(path, "rb") as f:
+        while left is None or left > 0:
+            buf = f.read(READ_CHUNK if left is None else min(READ_CHUNK, left))
+            if not buf:
+                break
+            h.update(buf)
+            if left is not None:
+                left -= len(buf)
+    return h
+
+
+def reflink(src: Path, dst: Path):
+    if fcntl is None:
+        raise OSError("reflink not supported on this platform")
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+
+def link_or_copy(src: Path, dst: Path) -> str:
+    """hardlink → reflink → copy; คืนวิธีที่ใช้ได้ (แทนที่ dst แบบ atomic)"""
+    tmp = dst.with_name(dst.name + ".lnk")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+        how = "hardlink"
+    except OSError:
+        try:
+            reflink(src, tmp)
+            how = "reflink"
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            shutil.copyfile(src, tmp)
+            how = "copy"
+    os.replace(tmp, dst)
+    return how
+
+
+class BlobStore:
+    def __init__(self, out_root: Path):
+        self.root = Path(out_root) / BLOB_DIR
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:]
+
+    def adopt(self, part: Path, dest: Path, digest: str) -> bool:
+        """ย้ายไฟล์ที่โหลดเสร็จ (part) เข้า store แล้วลิงก์ไปที่ dest — True = ซ้ำกับที่มีอยู่แล้ว"""
+        blob = self.blob_path(digest)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(part, blob)          # atomic — มีอยู่แล้ว (โหลดซ้ำพร้อมกันก็ตาม) → FileExistsError
+        except FileExistsError:
+            link_or_copy(blob, dest)
+            part.unlink()
+            return True
+        except OSError:
+            pass                         # filesystem ไม่รองรับ hardlink → เก็บแบบไฟล์ปกติ
+        os.replace(part, dest)
+        return False
+
+    def ingest(self, path: Path) -> tuple[str, bool]:
+        """เอาไฟล์ที่มีอยู่แล้ว (ไม่ได้ผ่าน store) เข้า store — คืน (digest, ซ้ำไหม)"""
+        digest = hash_file(path).hexdigest()
+        blob = self.blob_path(digest)
+        if blob.exists():
+            if not blob.samefile(path):
+                link_or_copy(blob, path)
+                return digest, True
+            return digest, False
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(path, blob)
+        except OSError:
+            shutil.copyfile(path, blob)
+            link_or_copy(blob, path)
+        return digest, False
+
+
+def report(out_root: Path, manifest_path: Path | None = None) -> dict:
+    from crawl_manifest import CrawlManifest, MANIFEST_NAME
+    manifest = CrawlManifest(manifest_path or out_root / MANIFEST_NAME)
+    try:
+        logical, files = manifest.db.execute(
+            "SELECT COALESCE(SUM(size),0), COUNT(*) FROM files WHERE status='done' AND sha256 IS NOT NULL"
+        ).fetchone()
+        unique, blobs = manifest.db.execute(
+            "SELECT COALESCE(SUM(size),0), COUNT(*) FROM "
+            "(SELECT MAX(size) AS size FROM files WHERE status='done' AND sha256 IS NOT NULL GROUP BY sha256)"
+        ).fetchone()
+        unhashed = manifest.db.execute(
+            "SELECT COUNT(*) FROM files WHERE status='done' AND sha256 IS NULL"
+        ).fetchone()[0]
+    finally:
+        manifest.close()
+    return {"files": files, "blobs": blobs, "logical_bytes": logical, "stored_bytes": unique,
+            "reclaimed_bytes": logical - unique, "unhashed_files": unhashed}
+
+
+def human(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{int(n)} B"
+        n /= 1024
+
+
+def print_report(r: dict):
+    print(f"[DEDUP] ไฟล์ {r['files']}  blob {r['blobs']}  "
+          f"ขนาดรวม {human(r['logical_bytes'])} → เก็บจริง {human(r['stored_bytes'])}  "
+          f"ประหยัด {human(r['reclaimed_bytes'])}")
+    if r["unhashed_files"]:
+        print(f"  [info] ยังไม่ได้ hash {r['unhashed_files']} ไฟล์ (โหลดก่อนมี store) → ใช้คำสั่ง ingest")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Content-addressed store for downloaded pill images")
+    p.add_argument("--root", default="Pills_downloads", help="crawler output root")
+    p.add_argument("--manifest", help="crawl manifest path (default: ROOT/.crawl_manifest.sqlite)")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("report", help="show space reclaimed by dedup")
+    sub.add_parser("ingest", help="hash + link files downloaded before the store existed")
+    args = p.parse_args()
+    root = Path(args.root)
+    manifest_path = Path(args.manifest) if args.manifest else None
+
+    if args.cmd == "ingest":
+        from crawl_manifest import CrawlManifest, MANIFEST_NAME
+        store = BlobStore(root)
+        manifest = CrawlManifest(manifest_path or root / MANIFEST_NAME)
+        rows = manifest.db.execute(
+            "SELECT url, path FROM files WHERE status='done' AND sha256 IS NULL").fetchall()
+        dups = 0
+        for i, (url, path) in enumerate(rows, 1):
+            try:
+                digest, dup = store.ingest(Path(path))
+            except OSError as e:
+                print(f"  [ERR ] {path}: {e}", file=sys.stderr)
+                continue
+            dups += dup
+            manifest.set_sha256(url, digest)
+            if i % 500 == 0:
+                print(f"    [PROG] {i}/{len(rows)}  ซ้ำ {dups}")
+        manifest.close()
+        print(f"[DONE] ingest {len(rows)} ไฟล์, ซ้ำ {dups}")
+
+    print_report(report(root, manifest_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+แบ่ง disc ให้หลาย process / หลายเครื่อง crawl พร้อมกัน (pill_disc_fast_async.py --shard i/N --workers K)
+
+- แต่ละ disc มีเจ้าของตั้งต้นแบบ deterministic: shard = ลำดับของ disc ในช่วง % N
+- การจองทำผ่านไฟล์ OUT/.crawl_claims.json ที่ล็อกด้วย fcntl.flock (ใช้ร่วมกันบน NFS/ไดรฟ์แชร์ได้)
+- shard ที่ทำ disc ของตัวเองหมดแล้วจะรับงานต่อจาก shard ที่ตาย: claim ที่ heartbeat เก่ากว่า STALE_AFTER
+  (หรือ pid บนเครื่องเดียวกันไม่อยู่แล้ว), disc ที่ failed, และ disc ที่ยังไม่มีใครจองของ shard ที่ตาย/จบไปแล้ว
+  หรือไม่เคยเริ่มเลยภายใน STALE_AFTER นับจากสร้าง claim file
+- manifest แยกต่อ shard (SQLite บนไดรฟ์แชร์เขียนพร้อมกันหลายเครื่องไม่ปลอดภัย) → merge_manifests รวมตอนจบแล้วลบทิ้ง
+  disc ที่จองได้เริ่มจากแถวของ manifest หลัก (CrawlManifest.seed_disc) → สถานะ quarantined ไม่หาย
+
+    python crawl_claims.py status --out Pills_downloads
+"""
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:       # Windows
+    fcntl = None
+
+CLAIMS_NAME = ".crawl_claims.json"
+HEARTBEAT_EVERY = 15.0    # วินาที
+STALE_AFTER = 120.0       # heartbeat เก่ากว่านี้ถือว่า process ตายแล้ว → คนอื่นรับ disc ต่อได้
+MAX_ATTEMPTS = 3          # disc ที่ failed ลองใหม่ได้กี่ครั้งต่อรอบ (ไม่ให้ shard ส่งต่อกันไม่จบ)
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """"i/N" → (i, N) โดย 0 <= i < N"""
+    try:
+        i, n = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"--shard ต้องเป็นรูป i/N เช่น 0/4 (ได้ {value!r})")
+    if n < 1 or not 0 <= i < n:
+        raise argparse.ArgumentTypeError(f"--shard {value}: ต้องมี 0 <= i < N")
+    return i, n
+
+
+def home_shard(discs: list[int], disc: int, n: int) -> int:
+    return discs.index(disc) % n
+
+
+def shard_tag(i: int, n: int) -> str:
+    return f"shard{i}of{n}"
+
+
+class ClaimFile:
+    """สถานะการจอง disc ที่แชร์กันทุก shard — ทุกการอ่าน/เขียนอยู่ใต้ flock เดียวกัน"""
+
+    def __init__(self, path: Path, discs: list[int], shard: int, n_shards: int):
+        if fcntl is None:
+            raise OSError("--shard/--workers ต้องใช้ fcntl.flock (Linux/macOS)")
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.discs = list(discs)
+        self.shard, self.n_shards = shard, n_shards
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{shard_tag(shard, n_shards)}"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # crawler เรียกผ่าน asyncio.to_thread ได้หลายเธรดพร้อมกัน — บน NFS flock กลายเป็น lock ต่อ process
+        # (เธรดใน process เดียวกันไม่กันกันเอง) จึงต้องมี mutex ในตัวด้วย
+        self._mutex = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._mutex, open(self.lock_path, "a+") as lk:
+            fcntl.flock(lk.fileno(), fcntl.LOCK_EX)
+            try:
+                state = self._read()
+                yield state
+                tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+                tmp.write_text(json.dumps(state, indent=1, sort_keys=True), encoding="utf-8")
+                os.replace(tmp, self.path)
+            finally:
+                fcntl.flock(lk.fileno(), fcntl.LOCK_UN)
+
+    def _read(self) -> dict:
+        try:
+            state = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault("discs", {})
+        state.setdefault("shards", {})
+        state.setdefault("created", time.time())
+        return state
+
+    def snapshot(self) -> dict:
+        with self._locked() as state:
+            return json.loads(json.dumps(state))
+
+    def _stale(self, ts: float | None, now: float) -> bool:
+        return ts is None or now - ts > STALE_AFTER
+
+    def _dead(self, owner: str, ts: float | None, now: float) -> bool:
+        """heartbeat เก่าเกิน หรือเป็น process บนเครื่องนี้ที่ไม่อยู่แล้ว (รันซ้ำหลัง crash ไม่ต้องรอ STALE_AFTER)"""
+        if self._stale(ts, now):
+            return True
+        host, pid, _ = owner.split(":", 2)
+        if host != socket.gethostname() or int(pid) == os.getpid():
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            pass
+        return False
+
+    def check_range(self):
+        """ทุก shard ต้องใช้ช่วง disc เดียวกัน ไม่งั้นการแบ่ง home shard ไม่ตรงกัน"""
+        with self._locked() as state:
+            rng = state.setdefault("range", self.discs)
+        if rng != self.discs:
+            raise RuntimeError(f"{self.path} เป็นของช่วง disc {rng[0]}..{rng[-1]} ({len(rng)} disc) — "
+                               f"ทุก shard ต้องใช้ช่วงเดียวกัน (ลบไฟล์นี้ถ้าจะเริ่มช่วงใหม่)")
+
+    def claim_next(self) -> tuple[int, str] | None:
+        """จอง disc ถัดไป → (disc, เหตุผล own|retry|stale|orphan) หรือ None ถ้าไม่มีงานให้ทำแล้ว"""
+        now = time.time()
+        with self._locked() as state:
+            claims, shards = state["discs"], state["shards"]
+            shards[str(self.shard)] = {"owner": self.owner, "n": self.n_shards, "heartbeat": now}
+            own, retry, stale, orphan = [], [], [], []
+            for d in self.discs:
+                c = claims.get(str(d))
+                home = home_shard(self.discs, d, self.n_shards)
+                if c is None:
+                    if home == self.shard:
+                        own.append(d)
+                    else:
+                        sh = shards.get(str(home))
+                        if sh is None:
+                            # shard เจ้าของยังไม่เคยเริ่ม — ให้เวลาเครื่องที่เริ่มช้ากว่า STALE_AFTER ก่อนแย่งงาน
+                            if now - state["created"] > STALE_AFTER:
+                                orphan.append(d)
+                        elif sh.get("exited") or self._dead(sh["owner"], sh["heartbeat"], now):
+                            orphan.append(d)   # shard เจ้าของตาย/จบไปแล้ว
+                elif c["owner"] == self.owner:
+                    continue                   # รอบนี้ทำไปแล้ว (รวมที่ failed — ไม่วนลองซ้ำในรอบเดียวกัน)
+                elif c["state"] == "failed" and c.get("attempts", 0) < MAX_ATTEMPTS:
+                    retry.append(d)            # มีไฟล์ที่โหลดไม่สำเร็จจากรอบก่อน
+                elif c["state"] == "claimed" and self._dead(c["owner"], c["heartbeat"], now):
+                    stale.append(d)            # คนจองตายกลางทาง (.part ที่ค้างไว้ resume ต่อได้)
+            for reason, pool in (("own", own), ("retry", retry), ("stale", stale), ("orphan", orphan)):
+                if pool:
+                    d = pool[0]
+                    prev = claims.get(str(d), {})
+                    claims[str(d)] = {"owner": self.owner, "state": "claimed", "heartbeat": now,
+                                      "claimed_at": now, "attempts": prev.get("attempts", 0) + 1,
+                                      "previous_owner": prev.get("owner")}
+                    return d, reason
+            return None
+
+    def heartbeat(self, discs_in_flight):
+        now = time.time()
+        with self._locked() as state:
+            state["shards"][str(self.shard)] = {"owner": self.owner, "n": self.n_shards, "heartbeat": now}
+            for d in discs_in_flight:
+                c = state["discs"].get(str(d))
+                if c and c["owner"] == self.owner and c["state"] == "claimed":
+                    c["heartbeat"] = now
+
+    def finish(self, disc: int, failed: int = 0, seconds: float | None = None):
+        now = time.time()
+        with self._locked() as state:
+            c = state["discs"].get(str(disc))
+            if c is None or c["owner"] != self.owner:
+                return          # ถูกคนอื่นรับไปแล้ว (เราเงียบไปนานเกิน STALE_AFTER) — ให้ของเขาเป็นหลัก
+            c.update(state="done" if not failed else "failed", heartbeat=now, finished_at=now,
+                     failed_files=failed, seconds=round(seconds, 1) if seconds is not None else None)
+
+    def release(self):
+        """ปิด process: disc ที่ยังจองค้าง (เช่นโดน Ctrl-C) ปล่อยให้คนอื่นรับต่อได้ทันที"""
+        with self._locked() as state:
+            for c in state["discs"].values():
+                if c["owner"] == self.owner and c["state"] == "claimed":
+                    c["heartbeat"] = 0.0
+            sh = state["shards"].get(str(self.shard))
+            if sh and sh["owner"] == self.owner:
+                sh["heartbeat"] = time.time()
+                sh["exited"] = True
+
+
+def reset_claims(path: Path, discs) -> int:
+    """ลบ claim ของ disc ที่ merge พบว่ายังไม่ครบ → รอบถัดไปมี shard รับไปทำใหม่"""
+    if fcntl is None or not Path(path).exists():
+        return 0
+    cf = ClaimFile(path, [], 0, 1)
+    with cf._locked() as state:
+        n = sum(state["discs"].pop(str(d), None) is not None for d in discs)
+    return n
+
+
+def shard_manifests(out_root: Path, manifest_name: str) -> list[Path]:
+    stem, suffix = os.path.splitext(manifest_name)
+    return sorted(Path(out_root).glob(f"{stem}.shard*of*{suffix}"))
+
+
+def shard_manifest_path(out_root: Path, manifest_name: str, i: int, n: int) -> Path:
+    stem, suffix = os.path.splitext(manifest_name)
+    return Path(out_root) / f"{stem}.{shard_tag(i, n)}{suffix}"
+
+
+def merge_manifests(main_path: Path, parts: list[Path]) -> int:
+    """รวม manifest ของแต่ละ shard เข้า manifest หลัก — แถวที่ done ชนะแถวที่ยังไม่ done
+    ยกเว้นแถว quarantined ของ manifest หลัก: done ของ shard ชนะได้เฉพาะไฟล์ที่โหลดใหม่หลังถูกกัก (mtime ใหม่กว่า)"""
+    from crawl_manifest import CrawlManifest
+    CrawlManifest(main_path).close()        # สร้าง/migrate schema ก่อน
+    db = sqlite3.connect(str(main_path), timeout=30)
+    merged = 0
+    try:
+        for part in parts:
+            CrawlManifest(part).close()
+            db.execute("ATTACH DATABASE ? AS part", (str(part),))
+            cur = db.execute(
+                "INSERT INTO files(url, disc, path, size, mtime, status, remote_size, remote_modified, sha256) "
+                "SELECT url, disc, path, size, mtime, status, remote_size, remote_modified, sha256 FROM part.files "
+                "WHERE true ON CONFLICT(url) DO UPDATE SET path=excluded.path, size=excluded.size, "
+                "mtime=excluded.mtime, status=excluded.status, remote_size=excluded.remote_size, "
+                "remote_modified=excluded.remote_modified, sha256=COALESCE(excluded.sha256, files.sha256) "
+                "WHERE CASE files.status WHEN 'done' THEN excluded.status='done' "
+                "WHEN 'quarantined' THEN excluded.status!='done' "
+                "OR COALESCE(excluded.mtime, 0) > COALESCE(files.mtime, 0) ELSE true END")
+            merged += cur.rowcount
+            db.execute(
+                "INSERT INTO discs SELECT * FROM part.discs WHERE true ON CONFLICT(disc) DO UPDATE SET "
+                "listing_url=excluded.listing_url, etag=excluded.etag, last_modified=excluded.last_modified, "
+                "n_files=excluded.n_files, checked_at=excluded.checked_at "
+                "WHERE excluded.checked_at >= COALESCE(discs.checked_at, 0)")
+            db.commit()
+            db.execute("DETACH DATABASE part")
+    finally:
+        db.close()
+    return merged
+
+
+def remove_manifests(parts: list[Path]):
+    """หลัง merge: manifest ของ shard ล้าสมัยแล้ว (validate_images.py แก้แค่ manifest หลัก) → ลบทิ้ง
+    รอบถัดไป shard เริ่มจากแถวของ manifest หลักแทน (CrawlManifest.seed_disc)"""
+    for part in parts:
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{part}{suffix}").unlink(missing_ok=True)
+
+
+def coverage(manifest_path: Path, discs: list[int], claims: dict | None = None) -> dict:
+    """ต่อ disc: ลิสต์ครบไหม, ไฟล์ done ครบตาม listing ไหม, ไฟล์ที่ done มีอยู่บนดิสก์จริงไหม"""
+    from crawl_manifest import CrawlManifest
+    m = CrawlManifest(manifest_path)
+    out = {}
+    try:
+        for d in discs:
+            row = m.db.execute("SELECT n_files FROM discs WHERE disc=?", (d,)).fetchone()
+            listed = row[0] if row else None
+            rows = m.db.execute("SELECT url, path, size, status FROM files WHERE disc=?", (d,)).fetchall()
+            images = [r for r in rows if "/images/" in r[0]]
+            done = [r for r in images if r[3] == "done"]
+            xml_ok = any(r[3] == "done" for r in rows if "/images/" not in r[0])
+            missing = 0
+            for _, path, size, _ in done:
+                try:
+                    if size is not None and Path(path).stat().st_size != size:
+                        missing += 1
+                except OSError:
+                    missing += 1
+            c = (claims or {}).get(str(d), {})
+            ok = listed is not None and len(done) >= listed and not missing and xml_ok
+            out[d] = {"listed": listed, "done": len(done), "not_done": len(images) - len(done),
+                      "missing_on_disk": missing, "xml": xml_ok, "claim": c.get("state"),
+                      "owner": c.get("owner"), "ok": ok}
+    finally:
+        m.close()
+    return out
+
+
+def print_coverage(cov: dict) -> bool:
+    bad = {d: c for d, c in cov.items() if not c["ok"]}
+    total = sum(c["done"] for c in cov.values())
+    print(f"[MERG] disc ครบ {len(cov) - len(bad)}/{len(cov)}  รูปที่โหลดแล้ว {total}")
+    for d, c in sorted(bad.items()):
+        why = []
+        if c["listed"] is None:
+            why.append("ยังไม่ได้ลิสต์")
+        elif c["done"] < c["listed"]:
+            why.append(f"done {c['done']}/{c['listed']}")
+        if c["missing_on_disk"]:
+            why.append(f"หายจากดิสก์ {c['missing_on_disk']}")
+        if not c["xml"]:
+            why.append("ไม่มี XML")
+        print(f"  [MISS] disc {d}: {', '.join(why)}  (claim={c['claim']} {c['owner'] or ''})")
+    if bad:
+        print("  → รัน --shard/--workers เดิมอีกรอบ: disc ที่ค้างจะถูกรับต่อ (หรือใช้ --disc N ทีละ disc)")
+    return not bad
+
+
+def main():
+    p = argparse.ArgumentParser(description="Show the shared disc-claim file of a sharded crawl")
+    p.add_argument("cmd", choices=("status",))
+    p.add_argument("--out", default="Pills_downloads", help="crawler output root")
+    args = p.parse_args()
+    path = Path(args.out) / CLAIMS_NAME
+    if not path.exists():
+        print(f"[INFO] ไม่มี {path}")
+        return
+    state = json.loads(path.read_text(encoding="utf-8"))
+    now = time.time()
+    for k, sh in sorted(state.get("shards", {}).items(), key=lambda kv: int(kv[0])):
+        age = now - sh["heartbeat"]
+        flag = "exited" if sh.get("exited") else ("STALE" if age > STALE_AFTER else "alive")
+        print(f"[SHRD] {k}/{sh['n']}  {sh['owner']}  heartbeat {age:.0f}s ago  {flag}")
+    counts = {}
+    for c in state.get("discs", {}).values():
+        counts[c["state"]] = counts.get(c["state"], 0) + 1
+    print("[DISC] " + "  ".join(f"{k}={v}" for k, v in sorted(counts.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ควบคุมจำนวนดาวน์โหลดพร้อมกันแบบ AIMD (additive increase / multiplicative decrease)
+
+- ทุก WINDOW วินาที วัด throughput (bytes/s) ของรอบนั้น
+  ไม่มี error และ throughput ดีขึ้น → limit + 1
+  throughput ตกหลังเพิ่ม limit → limit - 1 (ถอยกลับ)
+- เจอ 429 / 5xx / timeout / connection reset → limit * DECREASE (ไม่เกินครั้งละหนึ่ง window)
+  ถ้า server ส่ง Retry-After มา จะหยุดปล่อยงานใหม่จนครบเวลานั้น
+"""
+
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+WINDOW = 2.0          # วินาทีต่อรอบวัด throughput
+IMPROVE = 0.05        # ต้องดีขึ้นอย่างน้อย 5% ถึงนับว่า "ดีขึ้น"
+DECREASE = 0.5        # ตัวคูณตอนโดน throttle
+BACKOFF_BASE = 0.5    # วินาที
+BACKOFF_CAP = 60.0
+
+CONGESTION_STATUS = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After เป็นได้ทั้งจำนวนวินาทีและ HTTP-date"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: float | None = None,
+                  base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> float:
+    """exponential backoff แบบ full jitter; ถ้ามี Retry-After ใช้ค่านั้น"""
+    if retry_after is not None:
+        return min(cap, retry_after)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AdaptiveLimiter:
+    """ใช้แทน asyncio.Semaphore: `async with limiter:` รอบละหนึ่ง request"""
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 64):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.in_flight = 0
+        self._cond = asyncio.Condition()
+        self._pause_until = 0.0
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._window_congested = False
+        self._last_rate: float | None = None
+        self._last_step = 0            # +1 / -1 / 0 = ปรับอะไรไปในรอบก่อน
+        self._last_decrease = 0.0
+
+    async def __aenter__(self):
+        while True:
+            delay = self._pause_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            async with self._cond:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return self
+                await self._cond.wait()
+
+    async def __aexit__(self, *exc):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def record(self, nbytes: int):
+        self._window_bytes += nbytes
+        self._maybe_adjust()
+
+    def congestion(self, retry_after: float | None = None):
+        now = time.monotonic()
+        self._window_congested = True
+        if retry_after:
+            self._pause_until = max(self._pause_until, now + retry_after)
+        if now - self._last_decrease >= WINDOW:
+            self.limit = max(self.min_limit, self.limit * DECREASE)
+            self._last_decrease = now
+            self._last_step = 0
+            self._last_rate = None
+            print(f"    [RATE] throttled → concurrency {int(self.limit)}"
+                  + (f" (pause {retry_after:.0f}s)" if retry_after else ""))
+
+    def _maybe_adjust(self):
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < WINDOW:
+            return
+        rate = self._window_bytes / elapsed
+        old = int(self.limit)
+        if not self._window_congested and self.in_flight >= old - 1:
+            # limit ยังเป็นคอขวดอยู่ (ใช้ slot เกือบเต็ม) ถึงจะลองขยับ
+            if self._last_rate is None or rate > self._last_rate * (1 + IMPROVE):
+                self.limit = min(self.max_limit, self.limit + 1)
+                self._last_step = 1
+            elif self._last_step == 1 and rate < self._last_rate * (1 - IMPROVE):
+                self.limit = max(self.min_limit, self.limit - 1)
+                self._last_step = -1
+            else:
+                self._last_step = 0
+        self._last_rate = rate
+        self._window_start = now
+        self._window_bytes = 0
+        self._window_congested = False
+        if int(self.limit) != old:
+            print(f"    [RATE] {rate / 1e6:.2f} MB/s → concurrency {int(self.limit)}")
+            asyncio.ensure_future(self._notify_all())
+
+    async def _notify_all(self):
+        async with self._cond:
+            self._cond.notify_all()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Manifest ของการ crawl (SQLite ไฟล์เดียวใน output root)
+
+- discs : ETag / Last-Modified ของหน้า images/ ต่อ disc → รอบถัดไปส่ง conditional GET
+- files : URL, path ปลายทาง, size, mtime, status (pending | done | failed | quarantined) ต่อไฟล์
+          quarantined = validate_images.py พบว่าเปิดไม่ได้และย้ายออกแล้ว → ถือว่ายังไม่เสร็จ โหลดใหม่รอบหน้า
+          + ขนาด/วันที่ตามหน้า listing (remote_size, remote_modified) ถ้ามี, sha256 ของเนื้อไฟล์
+
+ใช้แทนการ stat ทีละไฟล์: สถานะของทั้ง disc อ่านได้ใน query เดียว
+"""
+
+import sqlite3
+import time
+from pathlib import Path
+
+MANIFEST_NAME = ".crawl_manifest.sqlite"
+COMMIT_EVERY = 2.0   # วินาที — รวม update หลายไฟล์ไว้ใน transaction เดียว
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS discs (
+    disc          INTEGER PRIMARY KEY,
+    listing_url   TEXT,
+    etag          TEXT,
+    last_modified TEXT,
+    n_files       INTEGER,
+    checked_at    REAL
+);
+CREATE TABLE IF NOT EXISTS files (
+    url    TEXT PRIMARY KEY,
+    disc   INTEGER NOT NULL,
+    path   TEXT NOT NULL,
+    size   INTEGER,
+    mtime  REAL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    remote_size     INTEGER,
+    remote_modified TEXT,
+    sha256          TEXT
+);
+CREATE INDEX IF NOT EXISTS files_disc ON files(disc, status);
+"""
+
+
+class CrawlManifest:
+    def __init__(self, path: Path, readonly: bool = False):
+        self.path = Path(path)
+        self.readonly = readonly
+        if readonly:
+            # --dry-run: อ่านสำเนาในหน่วยความจำ ไม่สร้าง/migrate ไฟล์ และไม่ทิ้ง -wal/-shm ไว้ในโฟลเดอร์
+            self.db = sqlite3.connect(":memory:")
+            if self.path.exists():
+                wal = self.path.with_name(self.path.name + "-wal").exists()
+                uri = f"{self.path.resolve().as_uri()}?{'mode=ro' if wal else 'immutable=1'}"
+                src = sqlite3.connect(uri, uri=True, timeout=30)
+                try:
+                    src.backup(self.db)
+                finally:
+                    src.close()
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(str(self.path), timeout=30)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self._migrate()
+        self._last_commit = time.monotonic()
+
+    def _migrate(self):
+        # manifest ที่สร้างก่อนมีคอลัมน์ size/date จาก listing และ sha256
+        cols = {r[1] for r in self.db.execute("PRAGMA table_info(files)")}
+        for col, typ in (("remote_size", "INTEGER"), ("remote_modified", "TEXT"), ("sha256", "TEXT")):
+            if col not in cols:
+                self.db.execute(f"ALTER TABLE files ADD COLUMN {col} {typ}")
+
+    # ---------- discs ----------
+    def disc_validators(self, disc: int) -> tuple[str | None, str | None]:
+        row = self.db.execute("SELECT etag, last_modified FROM discs WHERE disc=?", (disc,)).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def disc_complete(self, disc: int) -> bool:
+        """ลิสต์แล้ว และทุกไฟล์ที่รู้จักโหลดครบ → ใช้ conditional GET ได้"""
+        row = self.db.execute("SELECT n_files FROM discs WHERE disc=?", (disc,)).fetchone()
+        if row is None or row[0] is None:
+            return False
+        done, not_done = self.db.execute(
+            "SELECT SUM(status='done'), SUM(status!='done') FROM files WHERE disc=?", (disc,)
+        ).fetchone()
+        return not not_done and (done or 0) >= row[0]
+
+    def save_listing(self, disc: int, url: str, etag: str | None, last_modified: str | None, n_files: int):
+        self.db.execute(
+            "INSERT INTO discs(disc, listing_url, etag, last_modified, n_files, checked_at) "
+            "VALUES (?,?,?,?,?,?) ON CONFLICT(disc) DO UPDATE SET listing_url=excluded.listing_url, "
+            "etag=excluded.etag, last_modified=excluded.last_modified, n_files=excluded.n_files, "
+            "checked_at=excluded.checked_at",
+            (disc, url, etag, last_modified, n_files, time.time()),
+        )
+        self.maybe_commit()
+
+    def touch_disc(self, disc: int):
+        self.db.execute("UPDATE discs SET checked_at=? WHERE disc=?", (time.time(), disc))
+        self.maybe_commit()
+
+    # ---------- files ----------
+    def file_states(self, disc: int) -> dict[str, tuple[str, int | None, float | None, str]]:
+        """url -> (path, size, mtime, status) ของทั้ง disc"""
+        rows = self.db.execute("SELECT url, path, size, mtime, status FROM files WHERE disc=?", (disc,))
+        return {r[0]: tuple(r[1:]) for r in rows}
+
+    def add_pending(self, disc: int, url: str, path: Path,
+                    remote_size: int | None = None, remote_modified: str | None = None):
+        self.db.execute(
+            "INSERT INTO files(url, disc, path, status, remote_size, remote_modified) "
+            "VALUES (?,?,?,'pending',?,?) "
+            "ON CONFLICT(url) DO UPDATE SET path=excluded.path, status='pending', "
+            "remote_size=excluded.remote_size, remote_modified=excluded.remote_modified",
+            (url, disc, str(path), remote_size, remote_modified),
+        )
+        self.maybe_commit()
+
+    def mark_done(self, disc: int, url: str, path: Path, size: int, mtime: float,
+                  sha256: str | None = None):
+        self.db.execute(
+            "INSERT INTO files(url, disc, path, size, mtime, status, sha256) VALUES (?,?,?,?,?,'done',?) "
+            "ON CONFLICT(url) DO UPDATE SET path=excluded.path, size=excluded.size, "
+            "mtime=excluded.mtime, status='done', sha256=COALESCE(excluded.sha256, sha256)",
+            (url, disc, str(path), size, mtime, sha256),
+        )
+        self.maybe_commit()
+
+    def set_sha256(self, url: str, digest: str):
+        self.db.execute("UPDATE files SET sha256=? WHERE url=?", (digest, url))
+        self.maybe_commit()
+
+    def set_status(self, url: str, status: str):
+        self.db.execute("UPDATE files SET status=? WHERE url=?", (status, url))
+        self.maybe_commit()
+
+    def verify_disc(self, disc: int) -> int:
+        """เทียบไฟล์ที่ status=done กับดิสก์จริง (มีอยู่ + size ตรง) — ไม่ตรงให้กลับเป็น pending"""
+        bad = []
+        for url, path, size, _ in self.db.execute(
+            "SELECT url, path, size, mtime FROM files WHERE disc=? AND status='done'", (disc,)
+        ).fetchall():
+            try:
+                st = Path(path).stat()
+            except OSError:
+                bad.append(url)
+                continue
+            if size is not None and st.st_size != size:
+                bad.append(url)
+        self.db.executemany("UPDATE files SET status='pending' WHERE url=?", [(u,) for u in bad])
+        self.maybe_commit()
+        return len(bad)
+
+    def seed_disc(self, src: Path, disc: int) -> int:
+        """--shard: ดึงแถวของ disc นี้จาก manifest หลักมาไว้ใน manifest ของ shard
+        (validate_images.py ตั้ง quarantined ไว้ที่ manifest หลักเท่านั้น — แถว done ค้างใน shard ต้องไม่ชนะ)
+        แถว done ของ shard ที่ไฟล์ใหม่กว่า (mtime มากกว่า) ตอนถูกกัก = โหลดใหม่แล้ว → คงไว้"""
+        if self.readonly or not Path(src).exists() or Path(src).resolve() == self.path.resolve():
+            return 0
+        self.db.commit()
+        self.db.execute("ATTACH DATABASE ? AS src", (str(src),))
+        try:
+            cur = self.db.execute(
+                "INSERT INTO files(url, disc, path, size, mtime, status, remote_size, remote_modified, sha256) "
+                "SELECT url, disc, path, size, mtime, status, remote_size, remote_modified, sha256 FROM src.files "
+                "WHERE disc=? ON CONFLICT(url) DO UPDATE SET status='quarantined' "
+                "WHERE excluded.status='quarantined' AND files.status='done' "
+                "AND COALESCE(files.mtime, 0) <= COALESCE(excluded.mtime, 0)", (disc,))
+            self.db.execute(
+                "INSERT INTO discs SELECT * FROM src.discs WHERE disc=? ON CONFLICT(disc) DO NOTHING", (disc,))
+            self.db.commit()
+        finally:
+            self.db.execute("DETACH DATABASE src")
+        return cur.rowcount
+
+    # ---------- transaction ----------
+    def maybe_commit(self):
+        now = time.monotonic()
+        if now - self._last_commit >= COMMIT_EVERY:
+            self.db.commit()
+            self._last_commit = now
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
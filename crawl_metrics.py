@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Telemetry ของ async crawler: counter + histogram (bucket คงที่) ในโปรเซสเดียว
+
+    from crawl_metrics import metrics
+    metrics.inc("http_responses_total", kind="file", status=200)
+    with metrics.timer("listing_seconds"):
+        ...
+
+จบรอบเขียนเป็น JSON (เทียบข้ามรอบ) และ Prometheus text (node_exporter textfile collector)
+"""
+
+import bisect
+import json
+import math
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# วินาที: 1ms .. ~3 นาที (×2 ต่อช่อง)
+LATENCY_BUCKETS = tuple(0.001 * 2 ** i for i in range(18))
+LIVE_EVERY = 1.0          # วินาที (terminal)
+LIVE_EVERY_LOG = 15.0     # วินาที (stdout ไม่ใช่ terminal → พิมพ์เป็นบรรทัด)
+
+HELP = {
+    "http_responses_total": "HTTP responses by request kind and status",
+    "retries_total": "download retries by reason",
+    "bytes_total": "bytes downloaded",
+    "files_total": "files finished by result",
+    "listing_seconds": "time to fetch + parse one images/ listing",
+    "ttfb_seconds": "time to response headers for file requests",
+    "download_seconds": "time to stream one file (one attempt)",
+    "pool_wait_seconds": "time waiting for a free connection in the aiohttp pool",
+    "limiter_wait_seconds": "time waiting for an adaptive-concurrency slot",
+    "disk_wait_seconds": "time the network loop waited on the disk writer",
+    "disc_seconds": "wall time per disc (listing start to last file)",
+    "disc_bytes": "bytes downloaded per disc",
+}
+
+
+def _key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float):
+        self.counts[bisect.bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """ค่าประมาณจากขอบบนของ bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else math.inf
+        return math.inf
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "sum": round(self.sum, 6),
+                "p50": self.quantile(0.5), "p90": self.quantile(0.9), "p99": self.quantile(0.99),
+                "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts))}
+
+
+class Metrics:
+    def __init__(self):
+        self.counters: dict[str, dict[tuple, float]] = {}
+        self.gauges: dict[str, dict[tuple, float]] = {}
+        self.histograms: dict[str, dict[tuple, Histogram]] = {}
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        series = self.counters.setdefault(name, {})
+        k = _key(labels)
+        series[k] = series.get(k, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        self.gauges.setdefault(name, {})[_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        series = self.histograms.setdefault(name, {})
+        k = _key(labels)
+        h = series.get(k)
+        if h is None:
+            h = series[k] = Histogram()
+        h.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def counter(self, name: str, **labels) -> float:
+        if labels:
+            return self.counters.get(name, {}).get(_key(labels), 0)
+        return sum(self.counters.get(name, {}).values())
+
+    # ---------- export ----------
+    def to_json(self) -> dict:
+        def series(d, conv):
+            return [{"labels": dict(k), "value": conv(v)} for k, v in d.items()]
+        return {
+            "started": self.started,
+            "elapsed": time.time() - self.started,
+            "counters": {n: series(s, lambda v: v) for n, s in self.counters.items()},
+            "gauges": {n: series(s, lambda v: v) for n, s in self.gauges.items()},
+            "histograms": {n: series(s, Histogram.to_dict) for n, s in self.histograms.items()},
+        }
+
+    def to_prometheus(self, prefix: str = "pillcrawl_") -> str:
+        def lbl(k, extra=()):
+            pairs = list(k) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{a}="{b}"' for a, b in pairs) + "}"
+        out = []
+        for kind, store in (("counter", self.counters), ("gauge", self.gauges)):
+            for name, s in store.items():
+                out.append(f"# HELP {prefix}{name} {HELP.get(name, name)}")
+                out.append(f"# TYPE {prefix}{name} {kind}")
+                out.extend(f"{prefix}{name}{lbl(k)} {v}" for k, v in s.items())
+        for name, s in self.histograms.items():
+            out.append(f"# HELP {prefix}{name} {HELP.get(name, name)}")
+            out.append(f"# TYPE {prefix}{name} histogram")
+            for k, h in s.items():
+                acc = 0
+                for b, c in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    acc += c
+                    out.append(f"{prefix}{name}_bucket{lbl(k, [('le', b)])} {acc}")
+                out.append(f"{prefix}{name}_sum{lbl(k)} {h.sum}")
+                out.append(f"{prefix}{name}_count{lbl(k)} {h.count}")
+        return "\n".join(out) + "\n"
+
+    def write(self, base: Path):
+        """เขียน base.json และ base.prom"""
+        base = Path(base)
+        base.parent.mkdir(parents=True, exist_ok=True)
+        base.with_suffix(".json").write_text(json.dumps(self.to_json(), indent=2), encoding="utf-8")
+        base.with_suffix(".prom").write_text(self.to_prometheus(), encoding="utf-8")
+
+
+metrics = Metrics()
+
+
+def trace_config():
+    """aiohttp TraceConfig ที่จับเวลารอ connection ว่างใน pool (limit ของ TCPConnector)"""
+    import aiohttp
+
+    async def queued_start(session, ctx, params):
+        ctx.pool_t0 = time.perf_counter()
+
+    async def queued_end(session, ctx, params):
+        metrics.observe("pool_wait_seconds", time.perf_counter() - ctx.pool_t0)
+
+    tc = aiohttp.TraceConfig()
+    tc.on_connection_queued_start.append(queued_start)
+    tc.on_connection_queued_end.append(queued_end)
+    return tc
+
+
+def _ema(prev: float | None, value: float, alpha: float = 0.3) -> float:
+    return value if prev is None else alpha * value + (1 - alpha) * prev
+
+
+def _fmt_eta(sec: float) -> str:
+    if not math.isfinite(sec):
+        return "--:--"
+    sec = int(sec)
+    h, rem = divmod(sec, 3600)
+    return f"{h}:{rem // 60:02d}:{rem % 60:02d}" if h else f"{rem // 60:02d}:{rem % 60:02d}"
+
+
+class LiveProgress:
+    """บรรทัดสถานะ: ไฟล์ที่เสร็จ, MB/s (ช่วงล่าสุด), ETA จากอัตราไฟล์/วินาที"""
+
+    def __init__(self, progress, limiter=None, stream=sys.stdout, label: str = "", tty: bool | None = None):
+        self.progress = progress
+        self.limiter = limiter
+        self.stream = stream
+        self.label = label          # หลาย process เขียนจอเดียวกัน (--workers) → บอกว่าบรรทัดไหนของใคร
+        self.tty = stream.isatty() if tty is None else tty
+        self._last = (time.monotonic(), 0.0, 0)
+        self._bps = None
+        self._fps = None
+
+    def line(self) -> str:
+        now = time.monotonic()
+        t0, b0, f0 = self._last
+        done_bytes = metrics.counter("bytes_total")
+        p = self.progress
+        dt = max(now - t0, 1e-6)
+        # EMA ให้ตัวเลขไม่กระโดดตามไฟล์ใหญ่/เล็ก
+        self._bps = _ema(self._bps, (done_bytes - b0) / dt)
+        self._fps = _ema(self._fps, (p.done - f0) / dt)
+        self._last = (now, done_bytes, p.done)
+        bps, fps = self._bps, self._fps
+        left = p.queued - p.done
+        eta = left / fps if fps > 0 else (0.0 if not left else math.inf)
+        conc = f"  conc {int(self.limiter.limit)}/{self.limiter.in_flight}" if self.limiter else ""
+        return (f"[LIVE]{' ' + self.label if self.label else ''} {p.done}/{p.queued} ไฟล์  {done_bytes / 1e6:,.1f} MB  "
+                f"{bps / 1e6:6.2f} MB/s  ETA {_fmt_eta(eta)}  ผิดพลาด {p.failed}{conc}")
+
+    async def run(self):
+        import asyncio
+        every = LIVE_EVERY if self.tty else LIVE_EVERY_LOG
+        while True:
+            await asyncio.sleep(every)
+            if self.tty:
+                self.stream.write("\r\033[K" + self.line())
+                self.stream.flush()
+            else:
+                print(self.line(), file=self.stream, flush=True)
+
+    def close(self):
+        if self.tty:
+            self.stream.write("\r\033[K")
+            self.stream.flush()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+หาค่า --workers / --batch / --cache ที่เร็วสุดสำหรับเครื่องนี้ด้วย probe run สั้นๆ (train_yolov12.py เป็น subprocess)
+
+probe แต่ละรอบ: ใช้ข้อมูลบางส่วน (--fraction) เทรนแค่ --probe-batches batch แล้วจบ (ไม่ validate)
+วัด images/s + หน่วยความจำผ่าน train_profiler.py (probe.json) — รอบที่ OOM / ล้ม / เกินเวลา ถือว่าใช้ไม่ได้
+
+ค้นหาแบบไล่ทีละแกน (ไม่ลองทุกคู่): batch → workers → cache
+ผลเก็บใน autotune.json ใช้ซ้ำได้ด้วย train_yolov12.py --tuned-config
+
+    python dataset_yolo/train_yolov12.py --data data.yaml --autotune            # tune แล้วเทรนต่อเลย
+    python dataset_yolo/autotune.py --data data.yaml --device cpu --out autotune.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+TRAIN = HERE / "train_yolov12.py"
+
+BATCHES = (8, 16, 32)
+CACHES = ("none", "ram", "disk")
+PROBE_BATCHES = 30
+PROBE_FRACTION = 0.1
+PROBE_TIMEOUT = 600       # วินาทีต่อ probe
+MEM_HEADROOM = 0.85       # ใช้ RAM ได้ไม่เกินสัดส่วนนี้ของเครื่อง
+MIN_GAIN = 0.03           # เร็วขึ้นน้อยกว่านี้ถือว่าเท่ากัน → เลือกค่าที่ประหยัดกว่า
+
+
+def default_workers() -> list[int]:
+    n = os.cpu_count() or 4
+    return sorted({w for w in (0, 2, 4, 8, min(n, 16)) if w <= n})
+
+
+def total_ram_mb() -> float | None:
+    try:
+        import psutil
+        return psutil.virtual_memory().total / 1024 / 1024
+    except ImportError:
+        try:
+            return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 / 1024
+        except (ValueError, OSError, AttributeError):
+            return None
+
+
+def probe(base: dict, batch: int, workers: int, cache: str, workdir: Path, k: int,
+          probe_batches: int, fraction: float, timeout: int) -> dict:
+    name = f"probe_{k:02d}_b{batch}_w{workers}_{cache}"
+    cmd = [sys.executable, str(TRAIN), "--data", base["data"], "--model", base["model"],
+           "--imgsz", str(base["imgsz"]), "--device", base["device"], "--epochs", "1",
+           "--batch", str(batch), "--workers", str(workers), "--project", str(workdir), "--name", name,
+           "--fraction", str(fraction), "--probe-batches", str(probe_batches)]
+    if cache != "none":
+        cmd += ["--cache", cache]
+    if base.get("shards"):
+        cmd += ["--shards"]
+    t0 = time.perf_counter()
+    result = {"batch": batch, "workers": workers, "cache": cache, "ok": False}
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, timeout=timeout)
+        err = proc.stderr[-2000:] if proc.returncode else ""
+        rc = proc.returncode
+    except subprocess.TimeoutExpired:
+        rc, err = None, f"timeout after {timeout}s"
+    result["wall_s"] = round(time.perf_counter() - t0, 1)
+    # Ultralytics อาจวาง run ไว้ใต้ project/ หรือ project/detect/
+    found = list(workdir.glob(f"**/{name}/probe.json"))
+    if rc == 0 and found:
+        result.update(json.loads(found[0].read_text(encoding="utf-8")))
+        result["ok"] = True
+    else:
+        tail = (err or "no probe.json written").strip().splitlines()[-1:] or [""]
+        result["error"] = "OOM" if "out of memory" in (err or "").lower() else tail[0][:200]
+    return result
+
+
+def rss_mb(r: dict) -> float | None:
+    return r.get("rss_with_workers_mb") or r.get("peak_rss_mb")
+
+
+def fits(r: dict, ram_mb: float | None, baseline: dict | None = None, fraction: float = 1.0) -> bool:
+    if not r.get("ok"):
+        return False
+    used = rss_mb(r)
+    if used is not None and r["cache"] == "ram" and fraction < 1:
+        # probe cache รูปแค่ fraction ของ train → ส่วนที่เกินจาก probe ไม่ cache (baseline) ตอนเทรนจริงโต 1/fraction เท่า
+        # ไม่มี baseline → คูณทั้งก้อน (ประเมินเกินไว้ก่อน)
+        base = rss_mb(baseline) if baseline and baseline.get("ok") else None
+        used = (base or 0.0) + max(used - (base or 0.0), 0.0) / fraction
+        r["rss_full_cache_mb"] = round(used, 1)
+    return ram_mb is None or used is None or used <= ram_mb * MEM_HEADROOM
+
+
+def better(a: dict | None, b: dict) -> bool:
+    """b ดีกว่า a ไหม (เร็วกว่าอย่างมีนัย)"""
+    return a is None or b["images_per_s"] > a["images_per_s"] * (1 + MIN_GAIN)
+
+
+def autotune(data: str, model: str, imgsz: int, device: str, batches=BATCHES, workers=None,
+             caches=CACHES, probe_batches: int = PROBE_BATCHES, fraction: float = PROBE_FRACTION,
+             timeout: int = PROBE_TIMEOUT, shards: bool = False, keep: bool = False) -> dict:
+    base = {"data": str(Path(data).resolve()), "model": model, "imgsz": imgsz, "device": str(device),
+            "shards": shards}
+    workers = list(workers or default_workers())
+    if shards:
+        caches = ("none",)                       # cache ของ Ultralytics ใช้กับ shard ไม่ได้
+    ram_mb = total_ram_mb()
+    workdir = Path(tempfile.mkdtemp(prefix="autotune_"))
+    probes = []
+    k = 0
+    t0 = time.perf_counter()
+
+    def run(b, w, c):
+        nonlocal k
+        # เคยลองชุดนี้แล้ว → ใช้ผลเดิม
+        for r in probes:
+            if (r["batch"], r["workers"], r["cache"]) == (b, w, c):
+                return r
+        k += 1
+        r = probe(base, b, w, c, workdir, k, probe_batches, fraction, timeout)
+        probes.append(r)
+        status = (f"{r['images_per_s']:8.1f} img/s  รอ dataloader {r['wait_frac']:.0%}  "
+                  f"RSS {rss_mb(r)} MB"
+                  + (f"  GPU {r['gpu_reserved_mb']} MB" if r.get("gpu_reserved_mb") else "")
+                  if r["ok"] else f"ใช้ไม่ได้: {r.get('error')}")
+        print(f"  [PROBE] batch={b:<3} workers={w:<2} cache={c:<4}  {status}  ({r['wall_s']}s)", flush=True)
+        return r
+
+    try:
+        w0 = min(workers, key=lambda w: abs(w - 4))
+        best = None
+        # 1) batch: เพิ่มไปเรื่อยๆ จน OOM / ไม่เร็วขึ้น
+        for b in sorted(batches):
+            r = run(b, w0, "none")
+            if not fits(r, ram_mb):
+                break
+            if better(best, r):
+                best = r
+        if best is None:
+            raise RuntimeError("ไม่มี probe ที่รันผ่านเลย — ลองลด --imgsz/batch หรือดู error ด้านบน")
+        # 2) workers ที่ batch ที่ดีที่สุด
+        for w in workers:
+            r = run(best["batch"], w, "none")
+            if fits(r, ram_mb) and better(best, r):
+                best = r
+        # 3) cache
+        for c in caches:
+            r = run(best["batch"], best["workers"], c)
+            baseline = run(best["batch"], best["workers"], "none")
+            ok = fits(r, ram_mb, baseline, fraction)
+            if ram_mb and r.get("rss_full_cache_mb") is not None:
+                print(f"  [INFO] cache=ram ทั้ง train ≈ {r['rss_full_cache_mb']:.0f} MB "
+                      f"(ใช้ได้ {ram_mb * MEM_HEADROOM:.0f} MB) → {'พอ' if ok else 'ไม่พอ'}", flush=True)
+            if ok and better(best, r):
+                best = r
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "host": os.uname().nodename if hasattr(os, "uname") else "",
+        "cpu_count": os.cpu_count(),
+        "ram_mb": round(ram_mb, 0) if ram_mb else None,
+        **base,
+        "probe_batches": probe_batches,
+        "fraction": fraction,
+        "seconds": round(time.perf_counter() - t0, 1),
+        "best": {"batch": best["batch"], "workers": best["workers"], "cache": best["cache"],
+                 "images_per_s": best["images_per_s"]},
+        "probes": probes,
+    }
+    return result
+
+
+def save(result: dict, path: Path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+def load_best(path: Path) -> dict:
+    return json.loads(Path(path).read_text(encoding="utf-8"))["best"]
+
+
+def print_result(result: dict, path: Path | None = None):
+    b = result["best"]
+    print(f"[TUNE] เลือก batch={b['batch']} workers={b['workers']} cache={b['cache']}  "
+          f"({b['images_per_s']} img/s, {len(result['probes'])} probe, {result['seconds']}s)"
+          + (f" -> {path}" if path else ""))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Tune workers/batch/cache for train_yolov12.py with short probe runs")
+    p.add_argument("--data", required=True)
+    p.add_argument("--model", default="yolov12s.pt")
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--device", default="0")
+    p.add_argument("--batches", type=int, nargs="+", default=list(BATCHES))
+    p.add_argument("--workers", type=int, nargs="+", default=None)
+    p.add_argument("--caches", nargs="+", choices=CACHES, default=list(CACHES))
+    p.add_argument("--probe-batches", type=int, default=PROBE_BATCHES)
+    p.add_argument("--fraction", type=float, default=PROBE_FRACTION, help="subset of train split per probe")
+    p.add_argument("--timeout", type=int, default=PROBE_TIMEOUT, help="seconds per probe")
+    p.add_argument("--shards", action="store_true", help="--data is a pack_shards.py data.yaml")
+    p.add_argument("--keep", action="store_true", help="keep probe run dirs")
+    p.add_argument("--out", default="autotune.json")
+    args = p.parse_args()
+    result = autotune(args.data, args.model, args.imgsz, args.device, args.batches, args.workers,
+                      args.caches, args.probe_batches, args.fraction, args.timeout, args.shards, args.keep)
+    save(result, Path(args.out))
+    print_result(result, Path(args.out))
+
+
+if __name__ == "__main__":
+    main()
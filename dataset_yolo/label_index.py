@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ดัชนี label ของ YOLO แบบ columnar (NumPy .npz) — อ่าน .txt ทุกไฟล์ครั้งเดียว รอบต่อไปอ่านเฉพาะที่ mtime/size เปลี่ยน
+
+คอลัมน์:
+  ต่อรูป : stems, mtime_ns, size, offsets (box ของรูป i อยู่ที่ offsets[i]:offsets[i+1])
+  ต่อ box: img (index ของรูป), cls, xywh (float32, normalized)
+
+    python dataset_yolo/label_index.py build --root <DATA_ROOT>
+    python dataset_yolo/label_index.py stats --root <DATA_ROOT>      # จำนวนต่อคลาส + histogram ขนาด box
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+INDEX_NAME = "label_index.npz"
+JOBS = min(32, (os.cpu_count() or 4) * 4)
+# ขนาด box = sqrt(w*h) (สัดส่วนของภาพ) แบ่งช่องแบบ log
+SIZE_BINS = np.array([0.0, 0.02, 0.04, 0.08, 0.16, 0.32, 0.64, 1.01], dtype=np.float32)
+
+
+def parse_label(path: str) -> tuple[np.ndarray, np.ndarray, int]:
+    """(cls int16[n], xywh float32[n,4], จำนวนบรรทัดเสีย)"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return parse_label_text(f.read())
+
+
+def parse_label_text(text: str) -> tuple[np.ndarray, np.ndarray, int]:
+    cls, boxes, bad = [], [], 0
+    for line in text.splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        try:
+            c = int(float(parts[0]))
+            xywh = [float(v) for v in parts[1:5]]
+        except ValueError:
+            bad += 1
+            continue
+        if len(xywh) != 4:           # segment/บรรทัดขาด → นับเป็นเสีย
+            bad += 1
+            continue
+        cls.append(c)
+        boxes.append(xywh)
+    return (np.asarray(cls, dtype=np.int16),
+            np.asarray(boxes, dtype=np.float32).reshape(-1, 4), bad)
+
+
+class LabelIndex:
+    def __init__(self, stems, mtime_ns, size, offsets, cls, xywh, bad=None):
+        self.stems = np.asarray(stems, dtype=str)
+        self.mtime_ns = np.asarray(mtime_ns, dtype=np.int64)
+        self.size = np.asarray(size, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.cls = np.asarray(cls, dtype=np.int16)
+        self.xywh = np.asarray(xywh, dtype=np.float32).reshape(-1, 4)
+        self.bad = np.zeros(len(self.stems), np.int32) if bad is None else np.asarray(bad, np.int32)
+        # box → index ของรูป (คำนวณจาก offsets ไม่ต้องเก็บ)
+        self.img = np.repeat(np.arange(len(self.stems), dtype=np.int32), np.diff(self.offsets))
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [0], [], np.zeros((0, 4), np.float32))
+
+    # ---------- I/O ----------
+    @classmethod
+    def load(cls, path: Path):
+        with np.load(path, allow_pickle=False) as z:
+            return cls(z["stems"], z["mtime_ns"], z["size"], z["offsets"], z["cls"], z["xywh"], z["bad"])
+
+    def save(self, path: Path):
+        tmp = path.with_name(path.stem + ".tmp.npz")
+        np.savez(tmp, stems=self.stems, mtime_ns=self.mtime_ns, size=self.size,
+                 offsets=self.offsets, cls=self.cls, xywh=self.xywh, bad=self.bad)
+        os.replace(tmp, path)
+
+    # ---------- queries ----------
+    def __len__(self):
+        return len(self.stems)
+
+    def n_boxes(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def class_counts(self, nc: int, images: np.ndarray | None = None) -> np.ndarray:
+        """จำนวน box ต่อคลาส (เฉพาะรูปใน images ถ้าให้มา — bool mask ต่อรูป)"""
+        c = self.cls if images is None else self.cls[images[self.img]]
+        return np.bincount(c[(c >= 0) & (c < nc)], minlength=nc)
+
+    def images_per_class(self, nc: int) -> np.ndarray:
+        ok = (self.cls >= 0) & (self.cls < nc)
+        pairs = np.unique(self.img[ok].astype(np.int64) * nc + self.cls[ok])
+        return np.bincount(pairs % nc, minlength=nc)
+
+    def size_histogram(self, nc: int, bins: np.ndarray = SIZE_BINS) -> np.ndarray:
+        """[nc, len(bins)-1] จำนวน box ต่อคลาสต่อช่องขนาด sqrt(w*h)"""
+        ok = (self.cls >= 0) & (self.cls < nc)
+        s = np.sqrt(np.clip(self.xywh[ok, 2] * self.xywh[ok, 3], 0, None))
+        b = np.clip(np.searchsorted(bins, s, side="right") - 1, 0, len(bins) - 2)
+        nb = len(bins) - 1
+        return np.bincount(self.cls[ok].astype(np.int64) * nb + b, minlength=nc * nb).reshape(nc, nb)
+
+    def rarest_class(self, nc: int) -> np.ndarray:
+        """คลาสที่หายากสุด (นับทั้ง dataset) ในแต่ละรูป — รูปไม่มี box = -1 (ใช้เป็นกลุ่ม stratify)"""
+        if nc <= 0:              # ไม่มี classes.txt และทุก label ว่าง → ทุกรูปอยู่กลุ่ม -1
+            return np.full(len(self.stems), -1, np.int64)
+        counts = self.class_counts(nc)
+        order = np.argsort(counts, kind="stable")          # rank 0 = หายากสุด
+        rank = np.empty(nc, np.int64)
+        rank[order] = np.arange(nc)
+        ok = (self.cls >= 0) & (self.cls < nc)
+        box_rank = np.where(ok, rank[np.clip(self.cls, 0, nc - 1)], nc)
+        out = np.full(len(self.stems), nc, np.int64)
+        np.minimum.at(out, self.img, box_rank)
+        return np.where(out < nc, order[np.minimum(out, nc - 1)], -1)
+
+
+def _scan(labels_dir: Path) -> list[tuple[str, int, int]]:
+    out = []
+    with os.scandir(labels_dir) as it:
+        for e in it:
+            if e.name.lower().endswith(".txt") and e.is_file():
+                st = e.stat()
+                out.append((e.name, st.st_mtime_ns, st.st_size))
+    out.sort()
+    return out
+
+
+def build_index(root: Path, jobs: int = JOBS, index_path: Path | None = None,
+                verbose: bool = True) -> LabelIndex:
+    """อัปเดต index ใต้ root/labels (ไฟล์ชั้นเดียว) — อ่านเฉพาะ .txt ที่ใหม่/เปลี่ยน แล้วเซฟ"""
+    root = Path(root)
+    labels_dir = root / "labels"
+    index_path = index_path or root / INDEX_NAME
+    t0 = time.perf_counter()
+    old = LabelIndex.load(index_path) if index_path.exists() else LabelIndex.empty()
+    prev = {s: i for i, s in enumerate(old.stems.tolist())}
+
+    files = _scan(labels_dir)
+    stems = [os.path.splitext(n)[0].lower() for n, _, _ in files]
+    todo = []
+    for k, ((name, mt, sz), stem) in enumerate(zip(files, stems)):
+        i = prev.get(stem)
+        if i is None or old.mtime_ns[i] != mt or old.size[i] != sz:
+            todo.append(k)
+
+    parsed = {}
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+            for k, res in zip(todo, ex.map(lambda k: parse_label(str(labels_dir / files[k][0])), todo)):
+                parsed[k] = res
+
+    cls_parts, box_parts, counts, bad = [], [], [], []
+    for k, stem in enumerate(stems):
+        if k in parsed:
+            c, b, nbad = parsed[k]
+        else:
+            i = prev[stem]
+            a, z = old.offsets[i], old.offsets[i + 1]
+            c, b, nbad = old.cls[a:z], old.xywh[a:z], old.bad[i]
+        cls_parts.append(c)
+        box_parts.append(b)
+        counts.append(len(c))
+        bad.append(nbad)
+    offsets = np.zeros(len(stems) + 1, np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    idx = LabelIndex(
+        stems, [f[1] for f in files], [f[2] for f in files], offsets,
+        np.concatenate(cls_parts) if cls_parts else np.zeros(0, np.int16),
+        np.concatenate(box_parts) if box_parts else np.zeros((0, 4), np.float32),
+        bad,
+    )
+    idx.save(index_path)
+    if verbose:
+        removed = len(set(prev) - set(stems))
+        print(f"[INDEX] {len(stems)} label, {len(idx.cls)} box  อ่านใหม่ {len(todo)}  "
+              f"ลบออก {removed}  บรรทัดเสีย {int(idx.bad.sum())}  "
+              f"({time.perf_counter() - t0:.2f}s) -> {index_path}")
+    return idx
+
+
+def load_names(root: Path) -> list[str]:
+    p = Path(root) / "classes.txt"
+    if p.exists():
+        return [l.strip() for l in p.read_text(encoding="utf-8").splitlines() if l.strip()]
+    return []
+
+
+def print_stats(idx: LabelIndex, names: list[str]):
+    nc = len(names) or (int(idx.cls.max()) + 1 if len(idx.cls) else 0)
+    names = names or [str(i) for i in range(nc)]
+    t0 = time.perf_counter()
+    boxes = idx.class_counts(nc)
+    imgs = idx.images_per_class(nc)
+    hist = idx.size_histogram(nc)
+    dt = time.perf_counter() - t0
+    out_of_range = int(((idx.cls < 0) | (idx.cls >= nc)).sum())
+    width = max((len(n) for n in names), default=4)
+    edges = " ".join(f"<{e:.2f}" for e in SIZE_BINS[1:-1]) + " >=.64"
+    print(f"{'class':<{width}}  {'boxes':>7} {'images':>7}   size sqrt(w*h): {edges}")
+    for i, n in enumerate(names):
+        print(f"{n:<{width}}  {boxes[i]:>7} {imgs[i]:>7}   " + " ".join(f"{v:>5}" for v in hist[i]))
+    empty = int((idx.n_boxes() == 0).sum())
+    print(f"[STATS] {len(idx)} รูป, {len(idx.cls)} box, ไม่มี box {empty}, class นอกช่วง {out_of_range}, "
+          f"คลาสที่ไม่มีเลย {int((boxes == 0).sum())}  (คำนวณ {dt * 1e3:.1f} ms)")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Columnar index of YOLO label files")
+    p.add_argument("cmd", choices=("build", "stats"))
+    p.add_argument("--root", required=True, help="dataset root (labels/ ชั้นเดียว + classes.txt)")
+    p.add_argument("--jobs", type=int, default=JOBS)
+    p.add_argument("--index", help=f"index path (default: ROOT/{INDEX_NAME})")
+    args = p.parse_args()
+    root = Path(args.root)
+    index_path = Path(args.index) if args.index else None
+    if not (root / "labels").is_dir():
+        sys.exit(f"[ERR ] ไม่พบ {root / 'labels'}")
+    idx = build_index(root, args.jobs, index_path)
+    if args.cmd == "stats":
+        print_stats(idx, load_names(root))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+หารูปที่เกือบซ้ำกัน (ถ่ายซ้ำ / บีบอัดใหม่ / crop เล็กน้อย) ใน images/ ด้วย perceptual hash
+
+- hash: pHash (DCT 32x32 → 8x8) + dHash (9x8) ขนาด 64 bit ต่อรูป คำนวณด้วย process pool
+  เก็บเป็น uint64 ใน near_dup_hashes.npz — รอบต่อไปคำนวณเฉพาะรูปที่ mtime/size เปลี่ยน
+- ค้นหา: multi-index hashing — แบ่ง pHash เป็น t+1 ช่วง, คู่ที่ต่างกัน ≤ t bit ต้องมีอย่างน้อยหนึ่งช่วงตรงกันเป๊ะ
+  (pigeonhole) → เทียบเฉพาะรูปที่อยู่ bucket เดียวกัน, Hamming distance ด้วย popcount แบบ vectorized
+- คู่ที่ผ่าน (pHash ≤ t และ dHash ≤ t_d) → รวมกลุ่มแบบ connected components (label propagation ใน NumPy)
+
+    python dataset_yolo/near_duplicates.py --root <DATA_ROOT> [--threshold 4 --dhash-threshold 8]
+ใช้กับ split_yolo_dataset.py --dedup-groups / --drop-redundant
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+HASH_NAME = "near_dup_hashes.npz"
+GROUPS_NAME = "near_duplicates.json"
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+THRESHOLD = 4            # pHash: bit ที่ต่างได้
+DHASH_THRESHOLD = 8      # dHash: ยืนยันซ้ำอีกชั้น (รูปยาต่างชนิดบนพื้นหลังเดียวกันอาจ pHash ใกล้กัน)
+SMALL_BUCKET = 64        # bucket เล็กกว่านี้ใช้วิธี offset แบบ vectorized, ใหญ่กว่าเทียบเป็น block
+BLOCK_CELLS = 8_000_000  # จำนวนคู่ต่อ block ตอนเทียบ bucket ใหญ่
+JOBS = os.cpu_count() or 4
+
+_DCT = None
+
+
+def _dct_matrix(n: int = 32) -> np.ndarray:
+    k = np.arange(n)
+    m = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2 / n)
+    m[0] /= np.sqrt(2)
+    return m.astype(np.float32)
+
+
+def _bits_to_u64(bits: np.ndarray) -> int:
+    return int(np.packbits(bits.astype(np.uint8)).view(">u8")[0])
+
+
+def hash_image(path: str):
+    """(phash, dhash, w*h) — รันใน process ลูก; อ่านไม่ได้ → None"""
+    global _DCT
+    from PIL import Image, ImageOps
+    try:
+        with Image.open(path) as im:
+            w, h = im.size
+            im.draft("L", (64, 64))         # JPEG: decode แบบย่อ เร็วกว่าหลายเท่า
+            im = ImageOps.exif_transpose(im).convert("L")
+            if _DCT is None:
+                _DCT = _dct_matrix()
+            a = np.asarray(im.resize((32, 32), Image.LANCZOS), np.float32)
+            dct = (_DCT @ a @ _DCT.T)[:8, :8].ravel()
+            ph = _bits_to_u64(dct > np.median(dct[1:]))
+            d = np.asarray(im.resize((9, 8), Image.LANCZOS), np.int16)
+            dh = _bits_to_u64((d[:, 1:] > d[:, :-1]).ravel())
+            return ph, dh, w * h
+    except Exception:
+        return None
+
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], np.int8)
+
+
+def _popcount64_lut(x: np.ndarray) -> np.ndarray:
+    """NumPy < 2.0: นับ bit ทีละ byte — คืน shape เดียวกับ x (รวม block 2 มิติของ _block_pairs)"""
+    return _POPCOUNT8[np.ascontiguousarray(x).view(np.uint8)].reshape(*x.shape, 8).sum(-1, dtype=np.int8)
+
+
+def popcount64(x: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):                  # NumPy >= 2.0
+        return np.bitwise_count(x).astype(np.int8)
+    return _popcount64_lut(x)
+
+
+def _scan_images(images_dir: Path):
+    out = []
+    if not images_dir.is_dir():
+        return out
+    with os.scandir(images_dir) as it:
+        for e in it:
+            if os.path.splitext(e.name)[1].lower() in IMG_EXTS and e.is_file():
+                st = e.stat()
+                out.append((e.name, st.st_mtime_ns, st.st_size))
+    out.sort()
+    return out
+
+
+def build_hashes(root: Path, jobs: int = JOBS, verbose: bool = True) -> dict:
+    """อัปเดต near_dup_hashes.npz ของ root/images (ชั้นเดียว) คืน dict ของคอลัมน์"""
+    root = Path(root)
+    path = root / HASH_NAME
+    t0 = time.perf_counter()
+    old = {}
+    if path.exists():
+        with np.load(path, allow_pickle=False) as z:
+            for i, n in enumerate(z["names"].tolist()):
+                old[n] = (int(z["mtime_ns"][i]), int(z["size"][i]), z["phash"][i], z["dhash"][i], int(z["area"][i]))
+    files = _scan_images(root / "images")
+    todo = [k for k, (n, mt, sz) in enumerate(files) if n not in old or old[n][:2] != (mt, sz)]
+    fresh = {}
+    if todo:
+        paths = [str(root / "images" / files[k][0]) for k in todo]
+        with ProcessPoolExecutor(max_workers=max(1, jobs)) as ex:
+            for k, res in zip(todo, ex.map(hash_image, paths, chunksize=max(1, min(256, len(paths) // (jobs * 4) or 1)))):
+                fresh[k] = res
+    names, mtime, size, ph, dh, area = [], [], [], [], [], []
+    bad = 0
+    for k, (n, mt, sz) in enumerate(files):
+        if k in fresh:
+            if fresh[k] is None:
+                bad += 1
+                continue
+            p, d, a = fresh[k]
+        else:
+            p, d, a = old[n][2:]
+        names.append(n)
+        mtime.append(mt)
+        size.append(sz)
+        ph.append(p)
+        dh.append(d)
+        area.append(a)
+    cols = {"names": np.asarray(names, dtype=str), "mtime_ns": np.asarray(mtime, np.int64),
+            "size": np.asarray(size, np.int64), "phash": np.asarray(ph, np.uint64),
+            "dhash": np.asarray(dh, np.uint64), "area": np.asarray(area, np.int64)}
+    tmp = root / (HASH_NAME[:-4] + ".tmp.npz")
+    np.savez(tmp, **cols)
+    os.replace(tmp, path)
+    if verbose:
+        print(f"[HASH] {len(names)} รูป  hash ใหม่ {len(todo)}  อ่านไม่ได้ {bad}  "
+              f"({time.perf_counter() - t0:.2f}s) -> {path}")
+    return cols
+
+
+def _chunks(t: int) -> list[tuple[int, int]]:
+    """แบ่ง 64 bit เป็น t+1 ช่วง (shift, width)"""
+    m = t + 1
+    widths = [64 // m + (1 if i < 64 % m else 0) for i in range(m)]
+    out, shift = [], 0
+    for w in widths:
+        out.append((shift, w))
+        shift += w
+    return out
+
+
+def close_pairs(h: np.ndarray, t: int) -> tuple[np.ndarray, int]:
+    """คู่ (i, j), i<j ที่ Hamming distance ≤ t (ครบทุกคู่) + จำนวนคู่ที่ต้องเทียบจริง"""
+    parts = []
+    n = len(h)
+    compared = 0
+    for shift, width in _chunks(t):
+        key = (h >> np.uint64(shift)) & np.uint64((1 << width) - 1)
+        order = np.argsort(key, kind="stable")
+        ks = key[order]
+        # ขอบเขต bucket
+        starts = np.flatnonzero(np.r_[True, ks[1:] != ks[:-1]])
+        sizes = np.diff(np.r_[starts, n])
+        # bucket เล็ก: จับคู่ตำแหน่ง i กับ i+d ที่ key เท่ากัน (ไล่ d แทนการวนทีละ bucket)
+        small_max = int(min(sizes.max(initial=1), SMALL_BUCKET))
+        big = set(np.flatnonzero(sizes > SMALL_BUCKET).tolist())
+        in_big = np.zeros(n, bool)
+        for b in big:
+            in_big[starts[b]:starts[b] + sizes[b]] = True
+        for d in range(1, small_max):
+            same = (ks[d:] == ks[:-d]) & ~in_big[d:]
+            i = np.flatnonzero(same)
+            if i.size:
+                a, b = order[i], order[i + d]
+                compared += i.size
+                ok = popcount64(h[a] ^ h[b]) <= t      # กรองทันที ไม่เก็บคู่ที่ไกลไว้ทั้งก้อน
+                parts.append(np.stack([a[ok], b[ok]], 1))
+        # bucket ใหญ่ (เช่น รูปพื้นหลังล้วน): เทียบทุกคู่ใน bucket เป็น block แล้วกรองด้วย distance ทันที
+        for b in big:
+            idx = order[starts[b]:starts[b] + sizes[b]]
+            compared += len(idx) * (len(idx) - 1) // 2
+            parts.append(_block_pairs(h, idx, t))
+    if not parts:
+        return np.zeros((0, 2), np.int64), compared
+    pairs = np.concatenate(parts).astype(np.int64)
+    pairs.sort(1)
+    return np.unique(pairs, axis=0), compared    # คู่เดียวกันอาจเจอจากหลายช่วง
+
+
+def _block_pairs(h: np.ndarray, idx: np.ndarray, t: int) -> np.ndarray:
+    k = len(idx)
+    hv = h[idx]
+    step = max(1, BLOCK_CELLS // k)
+    out = []
+    for a in range(0, k, step):
+        z = min(k, a + step)
+        dist = popcount64(hv[a:z, None] ^ hv[None, :])
+        ii, jj = np.nonzero(dist <= t)
+        ii += a
+        m = ii < jj
+        if m.any():
+            out.append(np.stack([idx[ii[m]], idx[jj[m]]], 1))
+    return np.concatenate(out) if out else np.zeros((0, 2), np.int64)
+
+
+def connected_components(n: int, pairs: np.ndarray) -> np.ndarray:
+    """label ของแต่ละ node = index ที่เล็กสุดในกลุ่ม (min-label propagation + pointer jumping)"""
+    labels = np.arange(n)
+    if not len(pairs):
+        return labels
+    a, b = pairs[:, 0], pairs[:, 1]
+    while True:
+        m = np.minimum(labels[a], labels[b])
+        new = labels.copy()
+        np.minimum.at(new, a, m)
+        np.minimum.at(new, b, m)
+        np.minimum.at(new, labels, new)   # ดึง root ของกลุ่มลงตาม
+        new = new[new]
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+
+def find_groups(root: Path, jobs: int = JOBS, threshold: int = THRESHOLD,
+                dhash_threshold: int = DHASH_THRESHOLD, verbose: bool = True) -> list[list[str]]:
+    """กลุ่มรูปเกือบซ้ำ (ขนาด ≥ 2) เป็น stem ตัวเล็ก — สมาชิกแรกของแต่ละกลุ่มคือรูปที่ควรเก็บ (ใหญ่สุด)"""
+    cols = build_hashes(root, jobs, verbose)
+    t0 = time.perf_counter()
+    ph, dh = cols["phash"], cols["dhash"]
+    cand, compared = close_pairs(ph, threshold)
+    pairs = cand[popcount64(dh[cand[:, 0]] ^ dh[cand[:, 1]]) <= dhash_threshold]
+    labels = connected_components(len(ph), pairs)
+    sizes = np.bincount(labels, minlength=len(ph))
+    grouped = np.flatnonzero(sizes[labels] > 1)
+    stems = [os.path.splitext(n)[0].lower() for n in cols["names"].tolist()]
+    by_label: dict[int, list[int]] = {}
+    for k in grouped.tolist():
+        by_label.setdefault(int(labels[k]), []).append(k)
+    area = cols["area"]
+    groups = [[stems[k] for k in sorted(ks, key=lambda k: (-area[k], stems[k]))] for ks in by_label.values()]
+    groups.sort(key=lambda g: g[0])
+    if verbose:
+        redundant = sum(len(g) - 1 for g in groups)
+        print(f"[NEAR] คู่ที่เทียบ {compared}  คู่ที่ซ้ำ {len(pairs)}  กลุ่ม {len(groups)}  "
+              f"ใหญ่สุด {max((len(g) for g in groups), default=0)}  รูปที่ซ้ำเกิน {redundant}  "
+              f"({time.perf_counter() - t0:.2f}s, pHash ≤{threshold} dHash ≤{dhash_threshold})")
+    return groups
+
+
+def main():
+    p = argparse.ArgumentParser(description="Find near-duplicate images with perceptual hashes")
+    p.add_argument("--root", required=True, help="dataset root (images/ ชั้นเดียว)")
+    p.add_argument("--jobs", type=int, default=JOBS)
+    p.add_argument("--threshold", type=int, default=THRESHOLD, help="max pHash Hamming distance")
+    p.add_argument("--dhash-threshold", type=int, default=DHASH_THRESHOLD, help="max dHash Hamming distance")
+    p.add_argument("--out", help=f"groups JSON (default: ROOT/{GROUPS_NAME})")
+    args = p.parse_args()
+    root = Path(args.root)
+    groups = find_groups(root, args.jobs, args.threshold, args.dhash_threshold)
+    out = Path(args.out) if args.out else root / GROUPS_NAME
+    out.write_text(json.dumps({"threshold": args.threshold, "dhash_threshold": args.dhash_threshold,
+                               "groups": groups}, ensure_ascii=False, indent=1), encoding="utf-8")
+    print(f"[OK] Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+แพ็ก split ที่ได้จาก split_yolo_dataset.py (images/{split}, labels/{split}) เป็นไฟล์ shard ก้อนใหญ่ไม่กี่ไฟล์
+
+    shards/train-00000.bin ...   : [ไบต์รูป (jpg/png ตามต้นฉบับ) | ข้อความ label] ต่อกันไปเรื่อยๆ
+    shards/train.index.npz       : ต่อรูป name, shard, offset, img_len, lbl_len, h, w
+                                   + box แบบ columnar (box_off, cls, xywh) ให้ dataset ไม่ต้อง parse ซ้ำ
+    shards/data.yaml             : ใช้กับ train_yolov12.py --shards
+
+อ่านกลับด้วย ShardReader: mmap ทั้ง shard แล้วคืน memoryview ของรูป (ไม่ copy) — ไม่มีการ open/stat ต่อรูป
+
+    python dataset_yolo/pack_shards.py --data <DATA_ROOT>/data.yaml --out <DATA_ROOT>/shards
+"""
+
+import argparse
+import io
+import mmap
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from label_index import parse_label_text
+from prepare_resized_cache import SPLITS, list_split, load_data_yaml, write_data_yaml
+
+SHARD_MB = 1024
+JOBS = min(32, (os.cpu_count() or 4) * 4)
+READ_AHEAD = 2          # อ่านล่วงหน้าได้ไม่เกิน READ_AHEAD × jobs ไฟล์ (กันหน่วยความจำบวม)
+EXIF_ORIENTATION = 0x0112
+
+
+def image_size(data: bytes) -> tuple[int, int]:
+    """(h, w) จาก header — สลับด้านถ้า EXIF หมุน 90/270 องศา (แบบ exif_size ของ Ultralytics)"""
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as im:
+        w, h = im.size
+        try:
+            if im.getexif().get(EXIF_ORIENTATION) in (6, 8):
+                w, h = h, w
+        except Exception:
+            pass
+    return h, w
+
+
+def _read_pair(pair):
+    img, lbl = pair
+    try:
+        data = img.read_bytes()
+        text = lbl.read_bytes() if lbl else b""
+        h, w = image_size(data)
+    except Exception as e:       # รูปเสีย → ข้าม (Ultralytics ก็ตัดทิ้งตอนตรวจ label เหมือนกัน)
+        print(f"  [ERR ] {img}: {type(e).__name__}: {e}", file=sys.stderr)
+        return None
+    return img.name, data, text, h, w
+
+
+def _read_ordered(ex, pairs, depth: int):
+    """เหมือน ex.map(_read_pair, pairs) แต่มีงานค้างไม่เกิน depth ชิ้น
+    (ex.map ส่งทุกไฟล์เข้า pool ทันที → ถ้าเขียนช้ากว่าอ่าน ไบต์ของรูปจะกองในหน่วยความจำทั้ง split)"""
+    pending = deque()
+    it = iter(pairs)
+    for p in it:
+        pending.append(ex.submit(_read_pair, p))
+        if len(pending) >= depth:
+            break
+    while pending:
+        item = pending.popleft().result()
+        p = next(it, None)
+        if p is not None:
+            pending.append(ex.submit(_read_pair, p))
+        yield item
+
+
+def pack_split(src_root: Path, rel: str, out_dir: Path, split: str, shard_bytes: int, jobs: int) -> dict:
+    pairs = list_split(src_root, rel)
+    names, shard, offset, img_len, lbl_len, hs, ws = [], [], [], [], [], [], []
+    cls_parts, box_parts, counts = [], [], []
+    k, pos, f = 0, 0, None
+    written = []
+    t0 = time.perf_counter()
+
+    def open_shard(k):
+        path = out_dir / f"{split}-{k:05d}.bin.tmp"
+        written.append(path)
+        return open(path, "wb")
+
+    try:
+        f = open_shard(k)
+        # อ่านไฟล์เล็กแบบขนาน (คืนผลตามลำดับ) แล้วเขียนต่อท้าย shard ทีละรายการ
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+            for i, item in enumerate(_read_ordered(ex, pairs, READ_AHEAD * max(1, jobs)), 1):
+                if item is None:
+                    continue
+                name, data, text, h, w = item
+                if pos and pos + len(data) + len(text) > shard_bytes:
+                    f.close()
+                    k, pos = k + 1, 0
+                    f = open_shard(k)
+                f.write(data)
+                f.write(text)
+                names.append(name)
+                shard.append(k)
+                offset.append(pos)
+                img_len.append(len(data))
+                lbl_len.append(len(text))
+                hs.append(h)
+                ws.append(w)
+                pos += len(data) + len(text)
+                c, b, _ = parse_label_text(text.decode("utf-8", errors="replace"))
+                cls_parts.append(c)
+                box_parts.append(b)
+                counts.append(len(c))
+                if i % 2000 == 0:
+                    print(f"    [PROG] {split} {i}/{len(pairs)}")
+        f.close()
+    except BaseException:
+        if f:
+            f.close()
+        for p in written:
+            p.unlink(missing_ok=True)
+        raise
+
+    # ลบ shard เก่าของ split นี้ที่เกินจำนวนใหม่ แล้วค่อยเปลี่ยนชื่อ .tmp → .bin
+    for old in out_dir.glob(f"{split}-*.bin"):
+        old.unlink()
+    for p in written:
+        os.replace(p, p.with_suffix(""))
+    box_off = np.zeros(len(names) + 1, np.int64)
+    np.cumsum(counts, out=box_off[1:])
+    tmp = out_dir / f"{split}.index.tmp.npz"
+    np.savez(tmp, names=np.asarray(names, dtype=str), shard=np.asarray(shard, np.int32),
+             offset=np.asarray(offset, np.int64), img_len=np.asarray(img_len, np.int64),
+             lbl_len=np.asarray(lbl_len, np.int64), h=np.asarray(hs, np.int32), w=np.asarray(ws, np.int32),
+             box_off=box_off,
+             cls=np.concatenate(cls_parts) if cls_parts else np.zeros(0, np.int16),
+             xywh=np.concatenate(box_parts) if box_parts else np.zeros((0, 4), np.float32))
+    os.replace(tmp, out_dir / f"{split}.index.npz")
+    total = sum(img_len) + sum(lbl_len)
+    dt = time.perf_counter() - t0
+    print(f"[PACK] {split}: {len(names)} รูป → {len(written)} shard, {total / 1e6:.1f} MB "
+          f"({dt:.1f}s, {len(names) / max(dt, 1e-9):.0f} ไฟล์/วินาที)")
+    return {"images": len(names), "shards": len(written), "bytes": total}
+
+
+class ShardReader:
+    """อ่าน sample จาก shard ผ่าน mmap — เปิด map แบบ lazy ต่อ process (ส่งข้าม DataLoader worker ได้)"""
+
+    def __init__(self, shard_dir, split: str):
+        self.dir = Path(shard_dir)
+        self.split = split
+        with np.load(self.dir / f"{split}.index.npz", allow_pickle=False) as z:
+            for key in ("names", "shard", "offset", "img_len", "lbl_len", "h", "w", "box_off", "cls", "xywh"):
+                setattr(self, key, z[key])
+        self._maps = {}
+        self._pid = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_maps"] = {}           # mmap pickle ไม่ได้ → worker เปิดใหม่เอง
+        state["_pid"] = None
+        return state
+
+    def _map(self, k: int) -> mmap.mmap:
+        if self._pid != os.getpid():  # หลัง fork อย่าใช้ map ของ parent
+            self._maps, self._pid = {}, os.getpid()
+        m = self._maps.get(k)
+        if m is None:
+            with open(self.dir / f"{self.split}-{k:05d}.bin", "rb") as f:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[k] = m
+        return m
+
+    def image_bytes(self, i: int) -> memoryview:
+        a = int(self.offset[i])
+        return memoryview(self._map(int(self.shard[i])))[a:a + int(self.img_len[i])]
+
+    def label_text(self, i: int) -> str:
+        a = int(self.offset[i]) + int(self.img_len[i])
+        return bytes(self._map(int(self.shard[i]))[a:a + int(self.lbl_len[i])]).decode("utf-8")
+
+    def boxes(self, i: int) -> tuple[np.ndarray, np.ndarray]:
+        a, z = self.box_off[i], self.box_off[i + 1]
+        return self.cls[a:z], self.xywh[a:z]
+
+    def decode(self, i: int) -> np.ndarray:
+        """รูป BGR uint8 แบบเดียวกับ cv2.imread (ไม่มี cv2 → ใช้ PIL)"""
+        buf = np.frombuffer(self.image_bytes(i), np.uint8)
+        try:
+            import cv2
+        except ImportError:
+            from PIL import Image, ImageOps
+            with Image.open(io.BytesIO(buf)) as im:
+                return np.asarray(ImageOps.exif_transpose(im).convert("RGB"))[:, :, ::-1].copy()
+        return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+    def close(self):
+        for m in self._maps.values():
+            m.close()
+        self._maps = {}
+
+
+def main():
+    p = argparse.ArgumentParser(description="Pack YOLO splits into large mmap-able shard files")
+    p.add_argument("--data", required=True, help="data.yaml of the split dataset")
+    p.add_argument("--out", help="shard directory (default: <dataset root>/shards)")
+    p.add_argument("--shard-mb", type=int, default=SHARD_MB, help="target shard size")
+    p.add_argument("--jobs", type=int, default=JOBS, help="threads reading loose files")
+    args = p.parse_args()
+
+    data_path = Path(args.data).resolve()
+    cfg = load_data_yaml(data_path)
+    src_root = Path(cfg.get("path") or data_path.parent)
+    if not src_root.is_absolute():
+        src_root = (data_path.parent / src_root).resolve()
+    out_dir = Path(args.out) if args.out else src_root / "shards"
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    splits = []
+    for split in SPLITS:
+        rel = cfg.get(split)
+        if not rel:
+            continue
+        if not isinstance(rel, str):
+            print(f"  [SKIP] {split}: รองรับเฉพาะ path โฟลเดอร์เดียว ({rel!r})")
+            continue
+        pack_split(src_root, rel, out_dir, split, args.shard_mb * 1024 * 1024, args.jobs)
+        # Ultralytics ตรวจว่า path ของ train/val มีอยู่จริง → สร้างโฟลเดอร์ว่างไว้ให้ผ่าน
+        (out_dir / "images" / split).mkdir(parents=True, exist_ok=True)
+        splits.append(split)
+    if not splits:
+        sys.exit("[ERR ] ไม่พบ split ใน data.yaml")
+    write_data_yaml(out_dir / "data.yaml", out_dir, splits, cfg.get("names", []))
+    print(f"[OK] Wrote data.yaml -> {out_dir / 'data.yaml'}  (train_yolov12.py --shards)")
+
+
+if __name__ == "__main__":
+    main()
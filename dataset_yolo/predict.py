@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inference บน CPU ด้วย ONNX Runtime: export best.pt → ONNX (INT8 ได้), รันเป็น batch
+โดย decode/letterbox รูปใน thread pool ซ้อนกับการรันโมเดล แล้วคืนผลเป็นชื่อยาตาม data.yaml
+
+    python dataset_yolo/predict.py --weights runs/detect/pill_yolov12/weights/best.pt \\
+        --data dataset_medicines/data.yaml --source some/dir --batch 8 --int8 --out preds.jsonl
+    find imgs -name '*.jpg' | python dataset_yolo/predict.py --onnx best.onnx --source - ...
+
+สรุปท้ายรอบ: images/s และ latency ต่อรูป p50/p90/p99 (ตั้งแต่เริ่ม decode จนได้ผล)
+"""
+
+import argparse
+import ast
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+PAD_COLOR = 114
+EXIF_ORIENTATION = 0x0112
+CONF = 0.25
+IOU = 0.45
+MAX_DET = 100
+PRE_WORKERS = min(8, os.cpu_count() or 4)
+PREFETCH = 2            # จำนวน batch ที่เตรียมล่วงหน้าระหว่างโมเดลรัน
+
+
+# ---------- export ----------
+def export_onnx(weights: Path, imgsz: int, int8: bool = False, opset: int | None = None) -> Path:
+    """best.pt → best.onnx (batch แบบ dynamic) และ best.int8.onnx ถ้า int8 — ข้ามถ้าไฟล์ใหม่กว่า .pt อยู่แล้ว"""
+    weights = Path(weights)
+    onnx_path = weights.with_suffix(".onnx")
+    if not onnx_path.exists() or onnx_path.stat().st_mtime < weights.stat().st_mtime:
+        from ultralytics import YOLO
+        kw = dict(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if opset:
+            kw["opset"] = opset
+        onnx_path = Path(YOLO(str(weights)).export(**kw))
+        print(f"[EXPORT] {weights} → {onnx_path}")
+    return quantize_int8(onnx_path) if int8 else onnx_path
+
+
+def quantize_int8(onnx_path: Path) -> Path:
+    """x.onnx → x.int8.onnx — ข้ามถ้าไฟล์ใหม่กว่า .onnx อยู่แล้ว"""
+    onnx_path = Path(onnx_path)
+    q_path = onnx_path.with_suffix(".int8.onnx")
+    if not q_path.exists() or q_path.stat().st_mtime < onnx_path.stat().st_mtime:
+        # dynamic quantization: น้ำหนัก INT8, activation คำนวณ scale ตอนรัน → ไม่ต้องมีชุด calibration
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(onnx_path), str(q_path), weight_type=QuantType.QUInt8)
+        print(f"[INT8] {onnx_path.name} → {q_path.name} "
+              f"({onnx_path.stat().st_size / 1e6:.1f} → {q_path.stat().st_size / 1e6:.1f} MB)")
+    return q_path
+
+
+def load_names(data_yaml: str | None, session=None) -> list[str]:
+    if data_yaml:
+        import yaml
+        names = yaml.safe_load(Path(data_yaml).read_text(encoding="utf-8")).get("names", [])
+        return [names[k] for k in sorted(names)] if isinstance(names, dict) else list(names)
+    # Ultralytics เก็บ names ไว้ใน metadata ของ ONNX เป็น str ของ dict
+    if session is not None:
+        meta = session.get_modelmeta().custom_metadata_map
+        if "names" in meta:
+            d = ast.literal_eval(meta["names"])
+            return [d[k] for k in sorted(d)]
+    return []
+
+
+# ---------- pre/post ----------
+def decode_image(data: bytes, imgsz: int) -> tuple[np.ndarray, tuple[int, int]]:
+    """bytes → RGB uint8 ที่ย่อระหว่าง decode ได้ (JPEG draft) + ขนาดจริงหลัง exif transpose (w, h)"""
+    from PIL import Image, ImageOps
+    with Image.open(io.BytesIO(data)) as im:
+        w0, h0 = im.size
+        try:
+            if im.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+                w0, h0 = h0, w0
+        except Exception:
+            pass
+        im.draft("RGB", (imgsz, imgsz))
+        im = ImageOps.exif_transpose(im)
+        if im.mode != "RGB":
+            im = im.convert("RGB")
+        return np.asarray(im), (w0, h0)
+
+
+def letterbox(img: np.ndarray, imgsz: int) -> tuple[np.ndarray, float, int, int]:
+    """ย่อด้านยาวเป็น imgsz แล้วเติมขอบเป็นสี่เหลี่ยมจัตุรัส → (CHW float32 0..1, r, pad_x, pad_y)"""
+    from PIL import Image
+    h, w = img.shape[:2]
+    r = imgsz / max(h, w)
+    nw, nh = max(1, round(w * r)), max(1, round(h * r))
+    if (nw, nh) != (w, h):
+        img = np.asarray(Image.fromarray(img).resize((nw, nh), Image.BILINEAR))
+    px, py = (imgsz - nw) // 2, (imgsz - nh) // 2
+    out = np.full((imgsz, imgsz, 3), PAD_COLOR, np.uint8)
+    out[py:py + nh, px:px + nw] = img
+    return np.ascontiguousarray(out.transpose(2, 0, 1), dtype=np.float32) / 255.0, r, px, py
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou: float) -> np.ndarray:
+    """greedy NMS (xyxy) — คืน index ที่เก็บไว้ เรียงตาม score"""
+    order = scores.argsort()[::-1]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        ious = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[ious <= iou]
+    return np.asarray(keep, dtype=np.int64)
+
+
+class Detector:
+    """ONNX Runtime session + pre/post-process ของ YOLO detect (output [B, 4+nc, N])"""
+
+    def __init__(self, onnx_path, names=None, imgsz: int = 640, conf: float = CONF, iou: float = IOU,
+                 max_det: int = MAX_DET, threads: int = 0):
+        import onnxruntime as ort
+        so = ort.SessionOptions()
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            so.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(onnx_path), so, providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        # batch ตายตัว (export ไม่ dynamic) → ต้องเติม batch ให้เต็ม
+        self.fixed_batch = inp.shape[0] if isinstance(inp.shape[0], int) else None
+        if isinstance(inp.shape[2], int):
+            imgsz = inp.shape[2]
+        self.imgsz = imgsz
+        self.names = names or load_names(None, self.session)
+        self.conf, self.iou, self.max_det = conf, iou, max_det
+
+    def preprocess(self, data: bytes):
+        img, (w0, h0) = decode_image(data, self.imgsz)
+        tensor, r, px, py = letterbox(img, self.imgsz)
+        # พิกัดบนภาพ letterbox → ภาพต้นฉบับ (รวมการย่อจาก JPEG draft)
+        scale = w0 / img.shape[1] / r
+        return tensor, (px, py, scale, w0, h0)
+
+    def infer(self, tensors: list[np.ndarray]) -> np.ndarray:
+        batch = np.stack(tensors)
+        n = len(tensors)
+        if self.fixed_batch and n < self.fixed_batch:
+            batch = np.concatenate([batch, np.zeros((self.fixed_batch - n,) + batch.shape[1:], batch.dtype)])
+        return self.session.run(None, {self.input_name: batch})[0][:n]
+
+    def postprocess(self, pred: np.ndarray, meta) -> list[dict]:
+        px, py, scale, w0, h0 = meta
+        p = pred.T                                    # [N, 4+nc]
+        cls_scores = p[:, 4:]
+        cls = cls_scores.argmax(1)
+        score = cls_scores[np.arange(len(p)), cls]
+        m = score >= self.conf
+        if not m.any():
+            return []
+        p, cls, score = p[m], cls[m], score[m]
+        xy, wh = p[:, :2], p[:, 2:4]
+        boxes = np.concatenate([xy - wh / 2, xy + wh / 2], 1)
+        # NMS แยกคลาส: เลื่อน box ของแต่ละคลาสออกจากกันแล้วทำครั้งเดียว
+        keep = nms(boxes + cls[:, None] * (self.imgsz + 1.0), score, self.iou)[:self.max_det]
+        boxes = boxes[keep]
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - px) * scale).clip(0, w0)
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - py) * scale).clip(0, h0)
+        out = []
+        for b, c, s in zip(boxes, cls[keep], score[keep]):
+            c = int(c)
+            out.append({"cls": c, "name": self.names[c] if c < len(self.names) else str(c),
+                        "conf": round(float(s), 4), "box": [round(float(v), 1) for v in b]})
+        return out
+
+    def __call__(self, images: list[bytes]) -> list[list[dict]]:
+        pre = [self.preprocess(d) for d in images]
+        preds = self.infer([t for t, _ in pre])
+        return [self.postprocess(p, m) for p, (_, m) in zip(preds, pre)]
+
+
+# ---------- pipeline ----------
+def iter_sources(source: str):
+    if source == "-":
+        for line in sys.stdin:
+            line = line.strip()
+            if line:
+                yield Path(line)
+        return
+    p = Path(source)
+    if p.is_dir():
+        with os.scandir(p) as it:
+            names = sorted(e.name for e in it if os.path.splitext(e.name)[1].lower() in IMG_EXTS)
+        for n in names:
+            yield p / n
+    elif p.suffix.lower() == ".txt":
+        for line in p.read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                yield Path(line.strip())
+    else:
+        yield p
+
+
+def _batches(it, n):
+    batch = []
+    for x in it:
+        batch.append(x)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_pipeline(det: Detector, paths, batch: int, workers: int, out, warmup: int = 1):
+    """decode/letterbox ของ batch ถัดไปทำใน thread pool ขณะที่โมเดลรัน batch ปัจจุบัน"""
+    def prep(path):
+        t0 = time.perf_counter()
+        try:
+            tensor, meta = det.preprocess(path.read_bytes())
+        except Exception as e:
+            return path, None, None, t0, f"{type(e).__name__}: {e}"
+        return path, tensor, meta, t0, None
+
+    if warmup:
+        dummy = np.zeros((det.fixed_batch or 1, 3, det.imgsz, det.imgsz), np.float32)
+        for _ in range(warmup):
+            det.session.run(None, {det.input_name: dummy})
+
+    latencies, infer_ms = [], []
+    n_img = n_err = n_det = 0
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        pending = deque()
+        batches = _batches(paths, batch)
+
+        def submit_next():
+            b = next(batches, None)
+            if b is not None:
+                pending.append([ex.submit(prep, p) for p in b])
+
+        for _ in range(PREFETCH):
+            submit_next()
+        while pending:
+            items = [f.result() for f in pending.popleft()]
+            submit_next()
+            ok = [x for x in items if x[4] is None]
+            for path, _, _, _, err in items:
+                if err:
+                    n_err += 1
+                    print(f"  [ERR ] {path}: {err}", file=sys.stderr)
+            if not ok:
+                continue
+            t0 = time.perf_counter()
+            preds = det.infer([x[1] for x in ok])
+            infer_ms.append((time.perf_counter() - t0) * 1e3)
+            for (path, _, meta, t_in, _), pred in zip(ok, preds):
+                dets = det.postprocess(pred, meta)
+                lat = (time.perf_counter() - t_in) * 1e3
+                latencies.append(lat)
+                n_img += 1
+                n_det += len(dets)
+                if out is not None:
+                    out.write(json.dumps({"image": str(path), "detections": dets, "ms": round(lat, 2)},
+                                         ensure_ascii=False) + "\n")
+    wall = time.perf_counter() - t_start
+    return {"images": n_img, "errors": n_err, "detections": n_det, "seconds": wall,
+            "images_per_s": n_img / wall if wall else 0.0,
+            "latency_ms": percentiles(latencies), "infer_ms_per_batch": percentiles(infer_ms)}
+
+
+def percentiles(xs) -> dict:
+    if not xs:
+        return {}
+    a = np.asarray(xs)
+    return {"p50": round(float(np.percentile(a, 50)), 2), "p90": round(float(np.percentile(a, 90)), 2),
+            "p99": round(float(np.percentile(a, 99)), 2), "mean": round(float(a.mean()), 2)}
+
+
+def main():
+    p = argparse.ArgumentParser(description="Batched CPU inference for the pill detector (ONNX Runtime)")
+    g = p.add_mutually_exclusive_group(required=True)
+    g.add_argument("--weights", help="best.pt (exported to ONNX next to it)")
+    g.add_argument("--onnx", help="already exported .onnx")
+    p.add_argument("--data", help="data.yaml for class names (default: ONNX metadata)")
+    p.add_argument("--source", required=True, help="image dir, image file, .txt list, or - for stdin paths")
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--int8", action="store_true", help="dynamic INT8 quantization (onnxruntime)")
+    p.add_argument("--batch", type=int, default=8)
+    p.add_argument("--conf", type=float, default=CONF)
+    p.add_argument("--iou", type=float, default=IOU)
+    p.add_argument("--max-det", type=int, default=MAX_DET)
+    p.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads (0 = all cores)")
+    p.add_argument("--pre-workers", type=int, default=PRE_WORKERS, help="decode/letterbox threads")
+    p.add_argument("--out", help="write detections as JSON lines (default: stdout unless --quiet)")
+    p.add_argument("--quiet", action="store_true", help="only print the summary")
+    p.add_argument("--summary-json", help="write the timing summary to this file")
+    args = p.parse_args()
+
+    if args.weights:
+        onnx_path = export_onnx(Path(args.weights), args.imgsz, args.int8)
+    else:
+        onnx_path = Path(args.onnx)
+        if args.int8 and ".int8" not in onnx_path.name:
+            onnx_path = quantize_int8(onnx_path)
+
+    det = Detector(onnx_path, None, args.imgsz, args.conf, args.iou, args.max_det, args.threads)
+    if args.data:
+        det.names = load_names(args.data)
+    print(f"[MODEL] {onnx_path}  imgsz={det.imgsz}  classes={len(det.names)}  batch={args.batch}"
+          + (f" (fixed {det.fixed_batch})" if det.fixed_batch else ""), file=sys.stderr)
+
+    out = None
+    if args.out:
+        out = open(args.out, "w", encoding="utf-8")
+    elif not args.quiet:
+        out = sys.stdout
+    try:
+        stats = run_pipeline(det, iter_sources(args.source), args.batch, args.pre_workers, out)
+    finally:
+        if out is not None and out is not sys.stdout:
+            out.close()
+
+    lat = stats["latency_ms"]
+    print(f"[DONE] {stats['images']} รูป ({stats['errors']} ผิดพลาด), {stats['detections']} detection, "
+          f"{stats['seconds']:.2f}s = {stats['images_per_s']:.1f} images/s", file=sys.stderr)
+    if lat:
+        inf = stats["infer_ms_per_batch"]
+        print(f"[LAT ] ต่อรูป p50 {lat['p50']} ms  p90 {lat['p90']} ms  p99 {lat['p99']} ms  |  "
+              f"โมเดลต่อ batch p50 {inf['p50']} ms  p99 {inf['p99']} ms", file=sys.stderr)
+    if args.summary_json:
+        Path(args.summary_json).write_text(json.dumps(stats, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
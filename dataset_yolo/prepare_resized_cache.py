@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ย่อรูปของทุก split ไว้ล่วงหน้า (decode → exif transpose → RGB → letterbox เป็น imgsz) ด้วย process pool
+แล้วแปลงพิกัด label ให้ตรง เขียนเป็น dataset ใหม่พร้อม data.yaml — เทรนแล้วไม่ต้อง decode รูปต้นฉบับความละเอียดสูงทุก epoch
+
+    python dataset_yolo/prepare_resized_cache.py --data <DATA_ROOT>/data.yaml --imgsz 640
+    python dataset_yolo/train_yolov12.py --data <DATA_ROOT>_640/data.yaml --imgsz 640
+
+รันซ้ำได้: ทำใหม่เฉพาะรูป/label ที่ mtime หรือ size เปลี่ยน (ดู resize_manifest.json ในโฟลเดอร์ปลายทาง)
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+SPLITS = ("train", "val", "test")
+MANIFEST_NAME = "resize_manifest.json"
+PAD_COLOR = (114, 114, 114)   # สีเดียวกับ letterbox ของ Ultralytics
+JPEG_QUALITY = 95
+JOBS = os.cpu_count() or 4
+
+
+def load_data_yaml(path: Path) -> dict:
+    import yaml
+    return yaml.safe_load(Path(path).read_text(encoding="utf-8")) or {}
+
+
+def write_data_yaml(path: Path, root: Path, splits: list, names):
+    if isinstance(names, dict):
+        names = [names[k] for k in sorted(names)]
+    lines = [f'path: "{root}"']
+    for s in splits:
+        lines.append(f'{s}: "images/{s}"')
+    lines.append(f"nc: {len(names)}")
+    lines.append("names:")
+    for i, n in enumerate(names):
+        n = str(n).replace('"', '\\"')
+        lines.append(f'  {i}: "{n}"')
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def letterbox_params(w0: int, h0: int, imgsz: int, pad: bool):
+    """(ขนาดหลังย่อ nw, nh, ขนาดภาพปลายทาง W, H, offset ซ้าย, offset บน)"""
+    r = imgsz / max(w0, h0)
+    nw, nh = max(1, round(w0 * r)), max(1, round(h0 * r))
+    if not pad:
+        return nw, nh, nw, nh, 0, 0
+    return nw, nh, imgsz, imgsz, (imgsz - nw) // 2, (imgsz - nh) // 2
+
+
+def convert_label(text: str, w0, h0, nw, nh, W, H, dx, dy) -> str:
+    """แปลงพิกัด normalized จากภาพต้นฉบับ → ภาพ letterbox (box: cls x y w h, polygon: cls x1 y1 ...)"""
+    sx, sy = nw / W, nh / H
+    ox, oy = dx / W, dy / H
+    out = []
+    for line in text.splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        c, vals = parts[0], [float(v) for v in parts[1:]]
+        if len(vals) == 4:
+            x, y, w, h = vals
+            vals = [x * sx + ox, y * sy + oy, w * sx, h * sy]
+        else:
+            vals = [v * sx + ox if i % 2 == 0 else v * sy + oy for i, v in enumerate(vals)]
+        out.append(c + " " + " ".join(f"{v:.6f}" for v in vals))
+    return "\n".join(out) + ("\n" if out else "")
+
+
+def process_one(job):
+    """(src_img, src_lbl|None, dst_img, dst_lbl, imgsz, pad, quality) → (w0, h0) — รันใน process ลูก"""
+    src_img, src_lbl, dst_img, dst_lbl, imgsz, pad, quality = job
+    from PIL import Image, ImageOps
+    with Image.open(src_img) as im:
+        # JPEG: ให้ libjpeg ย่อระหว่าง decode (1/2, 1/4, 1/8) เท่าที่ยังไม่เล็กกว่าขนาดเป้าหมาย
+        # ต้องดูจากด้านยาวหลัง exif transpose → ขอเป็นสี่เหลี่ยมจัตุรัสไว้ก่อน
+        im.draft("RGB", (imgsz, imgsz))
+        im = ImageOps.exif_transpose(im)
+        if im.mode != "RGB":
+            im = im.convert("RGB")
+        # ขนาด "ต้นฉบับ" สำหรับ label = ขนาดหลัง transpose (draft ย่อแต่สัดส่วนเท่าเดิม)
+        w0, h0 = im.size
+        nw, nh, W, H, dx, dy = letterbox_params(w0, h0, imgsz, pad)
+        im = im.resize((nw, nh), Image.BILINEAR if nw < w0 else Image.LANCZOS)
+        if (W, H) != (nw, nh):
+            canvas = Image.new("RGB", (W, H), PAD_COLOR)
+            canvas.paste(im, (dx, dy))
+            im = canvas
+        tmp = dst_img + ".tmp"
+        im.save(tmp, "JPEG", quality=quality)
+        os.replace(tmp, dst_img)
+    text = Path(src_lbl).read_text(encoding="utf-8") if src_lbl else ""
+    tmp = dst_lbl + ".tmp"
+    Path(tmp).write_text(convert_label(text, w0, h0, nw, nh, W, H, dx, dy), encoding="utf-8")
+    os.replace(tmp, dst_lbl)
+    return w0, h0
+
+
+def _stat_key(p: Path | None):
+    if p is None:
+        return None
+    st = p.stat()
+    return [st.st_mtime_ns, st.st_size]
+
+
+def list_split(src_root: Path, rel: str):
+    """(image, label|None) ของ split — label อยู่ที่ labels/ คู่กับ images/ แบบ Ultralytics"""
+    img_dir = src_root / rel
+    parts = Path(rel).parts
+    lbl_rel = Path(*["labels" if p == "images" else p for p in parts])
+    lbl_dir = src_root / lbl_rel
+    pairs = []
+    with os.scandir(img_dir) as it:
+        for e in sorted(it, key=lambda e: e.name):
+            if os.path.splitext(e.name)[1].lower() in IMG_EXTS and e.is_file():
+                lbl = lbl_dir / (os.path.splitext(e.name)[0] + ".txt")
+                pairs.append((Path(e.path), lbl if lbl.exists() else None))
+    return pairs
+
+
+def main():
+    p = argparse.ArgumentParser(description="Pre-resize a YOLO dataset to imgsz (letterbox) for faster training")
+    p.add_argument("--data", required=True, help="source data.yaml")
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--out", help="output dataset root (default: <source root>_<imgsz>)")
+    p.add_argument("--jobs", type=int, default=JOBS, help="worker processes")
+    p.add_argument("--quality", type=int, default=JPEG_QUALITY, help="JPEG quality of cached images")
+    p.add_argument("--no-pad", action="store_true",
+                   help="resize long side only (no square padding); use with rect training")
+    p.add_argument("--force", action="store_true", help="ignore manifest and rebuild everything")
+    args = p.parse_args()
+
+    data_path = Path(args.data).resolve()
+    cfg = load_data_yaml(data_path)
+    src_root = Path(cfg.get("path") or data_path.parent)
+    if not src_root.is_absolute():
+        src_root = (data_path.parent / src_root).resolve()
+    out_root = Path(args.out) if args.out else src_root.with_name(f"{src_root.name}_{args.imgsz}")
+    pad = not args.no_pad
+    splits = [s for s in SPLITS if cfg.get(s)]
+    print(f"[INFO] {src_root} → {out_root}  imgsz={args.imgsz} pad={pad} splits={splits}")
+
+    manifest_path = out_root / MANIFEST_NAME
+    old = {}
+    if manifest_path.exists() and not args.force:
+        m = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if m.get("imgsz") == args.imgsz and m.get("pad") == pad and m.get("quality") == args.quality:
+            old = m.get("files", {})
+        else:
+            print("[INFO] imgsz/pad/quality เปลี่ยน → ทำใหม่ทั้งหมด")
+
+    t0 = time.perf_counter()
+    files, jobs, keep = {}, [], 0
+    for split in splits:
+        rel = cfg[split]
+        if not isinstance(rel, str):
+            print(f"  [SKIP] {split}: รองรับเฉพาะ path โฟลเดอร์เดียว ({rel!r})")
+            splits = [s for s in splits if s != split]
+            continue
+        img_out = out_root / "images" / split
+        lbl_out = out_root / "labels" / split
+        img_out.mkdir(parents=True, exist_ok=True)
+        lbl_out.mkdir(parents=True, exist_ok=True)
+        for img, lbl in list_split(src_root, rel):
+            key = f"{split}/{img.name}"
+            state = [_stat_key(img), _stat_key(lbl)]
+            dst_img = img_out / (img.stem + ".jpg")
+            dst_lbl = lbl_out / (img.stem + ".txt")
+            files[key] = state
+            if old.get(key) == state and dst_img.exists() and dst_lbl.exists():
+                keep += 1
+                continue
+            jobs.append((str(img), str(lbl) if lbl else None, str(dst_img), str(dst_lbl),
+                         args.imgsz, pad, args.quality))
+    t_list = time.perf_counter() - t0
+
+    # ไฟล์ที่ต้นทางหายไป → ลบออกจาก dataset ปลายทาง (ไม่อย่างนั้นยังถูกใช้เทรน)
+    removed = 0
+    for key in set(old) - set(files):
+        split, name = key.split("/", 1)
+        stem = os.path.splitext(name)[0]
+        for d, ext in (("images", ".jpg"), ("labels", ".txt")):
+            (out_root / d / split / (stem + ext)).unlink(missing_ok=True)
+        removed += 1
+
+    print(f"[PLAN] ทำใหม่ {len(jobs)}  ใช้ของเดิม {keep}  ลบ {removed}  (list {t_list:.2f}s)")
+    t1 = time.perf_counter()
+    failed = 0
+    if jobs:
+        chunk = max(1, min(64, len(jobs) // (args.jobs * 8) or 1))
+        with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as ex:
+            results = ex.map(_safe_process, jobs, chunksize=chunk)
+            for i, (job, res) in enumerate(zip(jobs, results), 1):
+                if isinstance(res, str):
+                    failed += 1
+                    print(f"  [ERR ] {job[0]}: {res}", file=sys.stderr)
+                    files.pop(f"{Path(job[2]).parent.name}/{Path(job[0]).name}", None)
+                if i % 500 == 0:
+                    rate = i / (time.perf_counter() - t1)
+                    print(f"    [PROG] {i}/{len(jobs)}  {rate:.1f} รูป/วินาที")
+    dt = time.perf_counter() - t1
+
+    tmp = manifest_path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps({"source": str(src_root), "imgsz": args.imgsz, "pad": pad,
+                               "quality": args.quality, "files": files}), encoding="utf-8")
+    os.replace(tmp, manifest_path)
+    write_data_yaml(out_root / "data.yaml", out_root, splits, cfg.get("names", []))
+
+    done = len(jobs) - failed
+    print(f"[OK] Wrote data.yaml -> {out_root / 'data.yaml'}")
+    if done:
+        print(f"[TIME] {done} รูปใน {dt:.1f}s = {done / dt:.1f} รูป/วินาที "
+              f"({args.jobs} process)")
+    print(f"[DONE] ผิดพลาด {failed}")
+
+
+def _safe_process(job):
+    try:
+        return process_one(job)
+    except Exception as e:       # รูปเสีย/อ่านไม่ได้ → รายงานแล้วข้าม ไม่ล้มทั้ง pool
+        return f"{type(e).__name__}: {e}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP service สำหรับจำแนกเม็ดยา: โหลดโมเดล (ONNX Runtime) ครั้งเดียว แล้วรวม request ที่เข้ามาพร้อมกัน
+เป็น micro-batch ภายในเวลาที่กำหนด (--window-ms) + LRU cache ผลลัพธ์ตาม sha256 ของรูป + hash ของโมเดล
+
+    python dataset_yolo/serve.py --onnx best.onnx --data data.yaml --port 8080 --window-ms 5 --max-batch 16
+    curl --data-binary @pill.jpg http://127.0.0.1:8080/predict
+
+GET /stats : จำนวน request, cache hit, ขนาด batch เฉลี่ย, latency p50/p99     GET /health
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from aiohttp import web
+
+from predict import (CONF, IOU, MAX_DET, PRE_WORKERS, Detector, export_onnx, load_names, percentiles,
+                     quantize_int8)
+
+WINDOW_MS = 5.0
+MAX_BATCH = 16
+CACHE_SIZE = 10000
+MAX_BODY_MB = 32
+LAT_KEEP = 5000          # เก็บ latency ล่าสุดไว้คิด percentile
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for buf in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(buf)
+    return h.hexdigest()
+
+
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.data: OrderedDict = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        v = self.data.get(key)
+        if v is None:
+            self.misses += 1
+            return None
+        self.data.move_to_end(key)
+        self.hits += 1
+        return v
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+
+class MicroBatcher:
+    """รอ request แรก แล้วรวมตัวถัดไปจนครบ max_batch หรือหมดเวลา window — infer ทีละ batch ใน thread แยก"""
+
+    def __init__(self, det: Detector, window_ms: float, max_batch: int):
+        self.det = det
+        self.window = window_ms / 1000
+        self.max_batch = max(1, det.fixed_batch or max_batch)
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.infer_pool = ThreadPoolExecutor(max_workers=1)   # ONNX Runtime ใช้ทุก core อยู่แล้ว
+        self.batch_sizes = deque(maxlen=LAT_KEEP)
+        self.infer_ms = deque(maxlen=LAT_KEEP)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        self.infer_pool.shutdown(wait=False)
+
+    async def submit(self, tensor, meta) -> list[dict]:
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((tensor, meta, fut))
+        return await fut
+
+    def _run_batch(self, items):
+        t0 = time.perf_counter()
+        preds = self.det.infer([t for t, _, _ in items])
+        out = [self.det.postprocess(p, m) for p, (_, m, _) in zip(preds, items)]
+        return out, (time.perf_counter() - t0) * 1e3
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(items) < self.max_batch:
+                left = deadline - loop.time()
+                if left <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(), left))
+                except asyncio.TimeoutError:
+                    break
+            # ของที่ค้างในคิวอยู่แล้วไม่ต้องรอ window ซ้ำ
+            while len(items) < self.max_batch and not self.queue.empty():
+                items.append(self.queue.get_nowait())
+            try:
+                results, ms = await loop.run_in_executor(self.infer_pool, self._run_batch, items)
+            except Exception as e:
+                for _, _, fut in items:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            self.batch_sizes.append(len(items))
+            self.infer_ms.append(ms)
+            for (_, _, fut), res in zip(items, results):
+                if not fut.done():
+                    fut.set_result(res)
+
+
+class PillService:
+    def __init__(self, det: Detector, model_hash: str, window_ms: float, max_batch: int,
+                 cache_size: int, pre_workers: int):
+        self.det = det
+        self.model_key = f"{model_hash}:{det.imgsz}:{det.conf}:{det.iou}:{det.max_det}"
+        self.batcher = MicroBatcher(det, window_ms, max_batch)
+        self.cache = LRUCache(cache_size)
+        self.pre_pool = ThreadPoolExecutor(max_workers=max(1, pre_workers))
+        self.inflight: dict[str, asyncio.Future] = {}
+        self.latencies = deque(maxlen=LAT_KEEP)
+        self.requests = self.errors = self.coalesced = 0
+
+    async def detect(self, data: bytes) -> tuple[list[dict], str]:
+        digest = hashlib.sha256(data).hexdigest()
+        key = (self.model_key, digest)
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit, "cache"
+        # รูปเดียวกันที่กำลังประมวลผลอยู่ → รอผลเดียวกัน ไม่ infer ซ้ำ
+        while (pending := self.inflight.get(digest)) is not None:
+            try:
+                res = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise            # request นี้เองถูกยกเลิก
+                continue             # เจ้าของงานถูกยกเลิก (client หลุด) → รอเจ้าของใหม่ หรือทำเองข้างล่าง
+            self.coalesced += 1
+            return res, "coalesced"
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self.inflight[digest] = fut
+        try:
+            tensor, meta = await loop.run_in_executor(self.pre_pool, self.det.preprocess, data)
+            dets = await self.batcher.submit(tensor, meta)
+            self.cache.put(key, dets)
+            fut.set_result(dets)
+            return dets, "model"
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()          # ไม่ให้ asyncio เตือน "exception was never retrieved"
+            raise
+        finally:
+            if not fut.done():
+                fut.cancel()         # CancelledError ข้าม except Exception → ปลดคนที่รอ shield อยู่ ไม่ให้ค้าง
+            self.inflight.pop(digest, None)
+
+    # ---------- handlers ----------
+    async def h_predict(self, request):
+        t0 = time.perf_counter()
+        self.requests += 1
+        data = await request.read()
+        if not data:
+            raise web.HTTPBadRequest(text="empty body (send image bytes)")
+        try:
+            dets, source = await self.detect(data)
+        except Exception as e:
+            self.errors += 1
+            return web.json_response({"error": f"{type(e).__name__}: {e}"}, status=422)
+        ms = (time.perf_counter() - t0) * 1e3
+        self.latencies.append(ms)
+        return web.json_response({"detections": dets, "source": source, "ms": round(ms, 2)})
+
+    async def h_health(self, request):
+        return web.json_response({"ok": True, "model": self.model_key})
+
+    async def h_stats(self, request):
+        b = self.batcher
+        return web.json_response({
+            "requests": self.requests, "errors": self.errors, "coalesced": self.coalesced,
+            "cache": {"hits": self.cache.hits, "misses": self.cache.misses, "size": len(self.cache.data)},
+            "batches": len(b.batch_sizes),
+            "mean_batch": round(float(np.mean(b.batch_sizes)), 2) if b.batch_sizes else 0.0,
+            "window_ms": b.window * 1000, "max_batch": b.max_batch,
+            "latency_ms": percentiles(self.latencies), "infer_ms_per_batch": percentiles(b.infer_ms),
+        })
+
+    async def h_reset(self, request):
+        self.latencies.clear()
+        self.batcher.batch_sizes.clear()
+        self.batcher.infer_ms.clear()
+        self.requests = self.errors = self.coalesced = 0
+        self.cache.hits = self.cache.misses = 0
+        if request.query.get("cache") == "1":
+            self.cache.data.clear()
+        return web.json_response({"ok": True})
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=MAX_BODY_MB * 1024 * 1024)
+        app.router.add_post("/predict", self.h_predict)
+        app.router.add_get("/health", self.h_health)
+        app.router.add_get("/stats", self.h_stats)
+        app.router.add_post("/reset", self.h_reset)
+
+        async def on_startup(app):
+            self.batcher.start()
+
+        async def on_cleanup(app):
+            await self.batcher.stop()
+            self.pre_pool.shutdown(wait=False)
+
+        app.on_startup.append(on_startup)
+        app.on_cleanup.append(on_cleanup)
+        return app
+
+
+def main():
+    p = argparse.ArgumentParser(description="Pill detector HTTP service with micro-batching and result cache")
+    g = p.add_mutually_exclusive_group(required=True)
+    g.add_argument("--weights", help="best.pt (exported to ONNX next to it)")
+    g.add_argument("--onnx", help="exported .onnx")
+    p.add_argument("--data", help="data.yaml for class names (default: ONNX metadata)")
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--int8", action="store_true", help="dynamic INT8 quantization (onnxruntime)")
+    p.add_argument("--conf", type=float, default=CONF)
+    p.add_argument("--iou", type=float, default=IOU)
+    p.add_argument("--max-det", type=int, default=MAX_DET)
+    p.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads")
+    p.add_argument("--pre-workers", type=int, default=PRE_WORKERS, help="decode/letterbox threads")
+    p.add_argument("--window-ms", type=float, default=WINDOW_MS, help="max wait to fill a batch")
+    p.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    p.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="LRU entries (0 = off)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8080)
+    args = p.parse_args()
+
+    if args.weights:
+        onnx_path = export_onnx(Path(args.weights), args.imgsz, args.int8)
+    else:
+        onnx_path = Path(args.onnx)
+        if args.int8 and ".int8" not in onnx_path.name:
+            onnx_path = quantize_int8(onnx_path)
+    det = Detector(onnx_path, None, args.imgsz, args.conf, args.iou, args.max_det, args.threads)
+    if args.data:
+        det.names = load_names(args.data)
+    model_hash = file_sha256(onnx_path)[:16]
+    svc = PillService(det, model_hash, args.window_ms, args.max_batch, args.cache_size, args.pre_workers)
+    print(f"[SERVE] http://{args.host}:{args.port}/predict  model={onnx_path.name} ({model_hash})  "
+          f"window={args.window_ms}ms max_batch={svc.batcher.max_batch} cache={args.cache_size} "
+          f"pid={os.getpid()}", file=sys.stderr, flush=True)
+    web.run_app(svc.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ต่อ shard จาก pack_shards.py เข้ากับ Ultralytics: dataset อ่านรูปจาก mmap แทนไฟล์เดี่ยว
+ใช้ผ่าน train_yolov12.py --shards (model.train(trainer=ShardDetectionTrainer, ...))
+
+label/shape อ่านจาก index ตอนสร้าง dataset → ไม่มีการ stat/เปิดไฟล์ .txt ต่อรูป
+ตำแหน่งใน shard เก็บไว้ใน label ("shard_idx") — rect mode (val เสมอ) เรียง im_files/labels ใหม่ตามสัดส่วนภาพ
+"""
+
+import math
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+
+from pack_shards import ShardReader
+
+
+class ShardYOLODataset(YOLODataset):
+    def __init__(self, *args, shard_dir=None, split="train", **kwargs):
+        self.reader = ShardReader(shard_dir, split)
+        # cache ram/disk ของ Ultralytics อ่านจาก path ของไฟล์ → ปิดไว้ (mmap ใช้ page cache ของ OS อยู่แล้ว)
+        kwargs["cache"] = False
+        super().__init__(*args, **kwargs)
+
+    def get_img_files(self, img_path):
+        # ชื่อเสมือน (ใช้แสดงผล/plot เท่านั้น) — ลำดับตรงกับ index ของ shard
+        files = [str(Path(img_path) / n) for n in self.reader.names.tolist()]
+        if self.fraction < 1:
+            files = files[: round(len(files) * self.fraction)]
+        return files
+
+    def get_labels(self):
+        labels = []
+        for i, f in enumerate(self.im_files):
+            cls, xywh = self.reader.boxes(i)
+            labels.append({
+                "im_file": f,
+                "shape": (int(self.reader.h[i]), int(self.reader.w[i])),
+                "cls": cls.astype(np.float32).reshape(-1, 1),
+                "bboxes": np.ascontiguousarray(xywh, dtype=np.float32),
+                "segments": [],
+                "keypoints": None,
+                "normalized": True,
+                "bbox_format": "xywh",
+                "shard_idx": i,
+            })
+        self.label_files = [f.rsplit(".", 1)[0] + ".txt" for f in self.im_files]
+        return labels
+
+    def load_image(self, i, rect_mode=True):
+        """เหมือน BaseDataset.load_image แต่ decode จาก memoryview ของ shard"""
+        im, f = self.ims[i], self.im_files[i]
+        if im is not None:
+            return self.ims[i], self.im_hw0[i], self.im_hw[i]
+        # set_rectangle() เรียง labels ใหม่ → i ไม่ใช่ตำแหน่งใน shard แล้ว
+        im = self.reader.decode(self.labels[i]["shard_idx"])
+        if im is None:
+            raise FileNotFoundError(f"Image decode failed (shard): {f}")
+        h0, w0 = im.shape[:2]
+        if rect_mode:
+            r = self.imgsz / max(h0, w0)
+            if r != 1:
+                w, h = (min(math.ceil(w0 * r), self.imgsz), min(math.ceil(h0 * r), self.imgsz))
+                im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+        elif not (h0 == w0 == self.imgsz):
+            im = cv2.resize(im, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+        if self.augment:
+            # buffer สำหรับ mosaic แบบเดียวกับต้นฉบับ
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = im, (h0, w0), im.shape[:2]
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+        return im, (h0, w0), im.shape[:2]
+
+    def update_labels_info(self, label):
+        label.pop("shard_idx", None)
+        return super().update_labels_info(label)
+
+
+class ShardDetectionTrainer(DetectionTrainer):
+    def build_dataset(self, img_path, mode="train", batch=None):
+        model = getattr(self.model, "module", self.model)
+        gs = max(int(model.stride.max() if model is not None else 0), 32)
+        # data.yaml ของ shard: path = โฟลเดอร์ shard, train/val = images/<split> (โฟลเดอร์ว่าง)
+        split = Path(img_path).name
+        shard_dir = Path(img_path).parent.parent
+        return ShardYOLODataset(
+            img_path=img_path,
+            shard_dir=shard_dir,
+            split=split,
+            imgsz=self.args.imgsz,
+            batch_size=batch,
+            augment=mode == "train",
+            hyp=self.args,
+            rect=self.args.rect or mode == "val",
+            single_cls=self.args.single_cls or False,
+            stride=gs,
+            pad=0.0 if mode == "train" else 0.5,
+            prefix=f"{mode}: ",
+            task=self.args.task,
+            classes=self.args.classes,
+            data=self.data,
+            fraction=self.args.fraction if mode == "train" else 1.0,
+        )
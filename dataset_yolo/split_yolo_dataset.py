@@ -2,11 +2,21 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import shutil
 import random
 import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:       # Windows
+    fcntl = None
+
 # ========= CONFIG =========
 DATA_ROOT   = Path("/media/banky/New Volume/Phamatics/dataset_yolo/dataset_medicines")
 
@@ -19,16 +29,38 @@ NOTES_JSON  = DATA_ROOT / "notes.json"   # (optional) {"categories":[{"id":0,"na
 SPLIT = {"train": 0.8, "val": 0.1, "test": 0.1}
 
 RANDOM_SEED = 42
-FILE_MODE   = "copy"  # copy | symlink | hardlink
+FILE_MODE   = "auto"  # auto (reflink → hardlink → copy) | copy | reflink | symlink | hardlink
+JOBS        = min(32, (os.cpu_count() or 4) * 4)   # I/O-bound → เธรดมากกว่าจำนวนคอร์ได้
+SPLIT_MANIFEST = DATA_ROOT / "split_manifest.json"  # stem → split ของรอบก่อน (ใช้กับ --incremental)
+FICLONE     = 0x40049409  # ioctl reflink (btrfs/xfs) — Linux
 IMG_EXTS    = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}  # จะใช้ .lower() ตรวจ
 DATA_YAML   = DATA_ROOT / "data.yaml"
 # =========================
 
+def configure(root: Path):
+    """ชี้ DATA_ROOT ไปที่อื่น (จาก --root) แล้วคำนวณ path ที่ขึ้นกับมันใหม่"""
+    global DATA_ROOT, IMAGES_DIR, LABELS_DIR, CLASSES_TXT, NOTES_JSON, DATA_YAML, SPLIT_MANIFEST
+    DATA_ROOT = Path(root)
+    IMAGES_DIR = DATA_ROOT / "images"
+    LABELS_DIR = DATA_ROOT / "labels"
+    CLASSES_TXT = DATA_ROOT / "classes.txt"
+    NOTES_JSON = DATA_ROOT / "notes.json"
+    DATA_YAML = DATA_ROOT / "data.yaml"
+    SPLIT_MANIFEST = DATA_ROOT / "split_manifest.json"
+
+def _scan_names(d: Path, exts):
+    # os.scandir ใช้ d_type จาก readdir → ไม่ต้อง stat ทีละไฟล์ (ช้ามากบน USB)
+    if not d.is_dir():
+        return []
+    with os.scandir(d) as it:
+        return sorted(e.name for e in it
+                      if os.path.splitext(e.name)[1].lower() in exts and e.is_file())
+
 def list_images_flat(d: Path):
-    return sorted([p for p in d.iterdir() if p.is_file() and p.suffix.lower() in IMG_EXTS])
+    return [d / n for n in _scan_names(d, IMG_EXTS)]
 
 def list_labels_flat(d: Path):
-    return sorted([p for p in d.iterdir() if p.is_file() and p.suffix.lower() == ".txt"])
+    return [d / n for n in _scan_names(d, {".txt"})]
 
 def load_class_names():
     # จาก classes.txt (บรรทัดละ 1 ชื่อ)
@@ -48,21 +80,118 @@ def load_class_names():
             pass
     return []
 
-def safe_put(src: Path, dst: Path, mode: str):
-    dst.parent.mkdir(parents=True, exist_ok=True)
-    if dst.exists():
-        return
+def reflink(src: Path, dst: Path):
+    if fcntl is None:
+        raise OSError("reflink not supported on this platform")
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            dst.unlink(missing_ok=True)
+            raise
+    shutil.copystat(src, dst)
+
+def probe_mode(src: Path, dst_dir: Path) -> str:
+    """ลองครั้งเดียวว่า filesystem ปลายทางทำ reflink / hardlink ได้ไหม (แทนการลองซ้ำทุกไฟล์)"""
+    test = dst_dir / f".probe_{os.getpid()}"
+    for mode, fn in (("reflink", reflink), ("hardlink", os.link)):
+        try:
+            fn(src, test)
+            return mode
+        except OSError:
+            continue
+        finally:
+            test.unlink(missing_ok=True)
+    return "copy"
+
+def safe_put(src: Path, dst: Path, mode: str, check_exists: bool = True) -> str:
+    """วาง src ที่ dst ตาม mode — คืนวิธีที่ใช้จริง ("skip" ถ้ามีอยู่แล้ว)"""
+    if check_exists and dst.exists():
+        return "skip"
     if mode == "symlink":
         try:
-            dst.symlink_to(src); return
+            dst.symlink_to(src); return "symlink"
+        except Exception:
+            pass
+    if mode == "reflink":
+        try:
+            reflink(src, dst); return "reflink"
         except Exception:
             pass
-    if mode == "hardlink":
+    if mode in ("hardlink", "reflink"):
         try:
-            os.link(src, dst); return
+            os.link(src, dst); return "hardlink"
         except Exception:
             pass
     shutil.copy2(src, dst)
+    return "copy"
+
+def hash_split(stem: str, seed: int, ratios: dict) -> str:
+    """split ของ stem ใหม่แบบ deterministic (ไม่ขึ้นกับลำดับ/จำนวนไฟล์อื่น)"""
+    h = hashlib.sha1(f"{seed}:{stem}".encode("utf-8")).digest()
+    u = int.from_bytes(h[:8], "big") / 2**64
+    total = sum(ratios.values()) or 1.0
+    acc = 0.0
+    names = [k for k, v in ratios.items() if v > 0]
+    for name in names:
+        acc += ratios[name] / total
+        if u < acc:
+            return name
+    return names[-1]
+
+def stratified_assign(groups: dict, seed: int, ratios: dict, assign: dict) -> dict:
+    """เติม split ให้ stem ที่ยังไม่มีใน assign ทีละกลุ่ม (คลาสหายากสุดของรูป)
+    โดยเลือก split ที่ขาดมากสุดเทียบกับสัดส่วนเป้าหมายของกลุ่มนั้น — stem เดิมไม่ถูกย้าย"""
+    names = [k for k, v in ratios.items() if v > 0]
+    total = sum(ratios[k] for k in names) or 1.0
+    for g in sorted(groups):
+        stems = groups[g]
+        have = {k: 0 for k in names}
+        for st in stems:
+            if st in assign and assign[st] in have:
+                have[assign[st]] += 1
+        new = sorted((st for st in stems if st not in assign),
+                     key=lambda st: hashlib.sha1(f"{seed}:{st}".encode("utf-8")).digest())
+        n = sum(have.values())
+        for st in new:
+            n += 1
+            k = max(names, key=lambda k: (ratios[k] / total * n - have[k], ratios[k]))
+            assign[st] = k
+            have[k] += 1
+    return assign
+
+def print_class_balance(idx, stems_by_split: dict, nc: int):
+    """สัดส่วน box ต่อคลาสในแต่ละ split + คลาสที่ไม่มีใน val/test"""
+    import numpy as np
+    pos = {st: i for i, st in enumerate(idx.stems.tolist())}
+    for split, stems in stems_by_split.items():
+        mask = np.zeros(len(idx), bool)
+        mask[[pos[st] for st in stems if st in pos]] = True
+        counts = idx.class_counts(nc, mask)
+        missing = [i for i in range(nc) if counts[i] == 0]
+        print(f"[CLASS] {split:5s} box {int(counts.sum()):>7}  คลาสที่ไม่มี {len(missing)}"
+              + (f" {missing[:12]}{'...' if len(missing) > 12 else ''}" if missing else ""))
+
+def load_assignment(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return data.get("assign", {})
+
+def scan_assignment() -> dict:
+    """ไม่มี split manifest (split ครั้งแรกทำก่อนมี --incremental) → อ่าน stem → split จาก images/<split>/ ที่วางไว้แล้ว"""
+    assign = {}
+    for split in ("train", "val", "test"):
+        for n in _scan_names(IMAGES_DIR / split, IMG_EXTS):
+            assign.setdefault(os.path.splitext(n)[0].lower(), split)
+    return assign
+
+def save_assignment(path: Path, assign: dict, seed: int):
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps({"seed": seed, "split": SPLIT, "assign": assign},
+                              ensure_ascii=False, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
 
 def write_yaml(names, has_test):
     lines = []
@@ -79,8 +208,28 @@ def write_yaml(names, has_test):
     DATA_YAML.write_text("\n".join(lines), encoding="utf-8")
     print(f"[OK] Wrote data.yaml -> {DATA_YAML}")
 
-def main():
-    random.seed(RANDOM_SEED)
+def parse_args():
+    p = argparse.ArgumentParser(description="Split flat images/ + labels/ into YOLO train/val/test")
+    p.add_argument("--root", default=str(DATA_ROOT), help="dataset root (มี images/ labels/ ชั้นเดียว)")
+    p.add_argument("--jobs", type=int, default=JOBS, help="threads for placing files")
+    p.add_argument("--mode", choices=("auto", "copy", "reflink", "hardlink", "symlink"), default=FILE_MODE)
+    p.add_argument("--seed", type=int, default=RANDOM_SEED)
+    p.add_argument("--stratify", action="store_true",
+                   help="class-stratified split via label_index (group = rarest class in image)")
+    p.add_argument("--incremental", action="store_true",
+                   help=f"keep previous assignment ({SPLIT_MANIFEST.name}); only place new stems")
+    p.add_argument("--dedup-groups", action="store_true",
+                   help="keep near-duplicate images (near_duplicates.py) in the same split")
+    p.add_argument("--drop-redundant", action="store_true",
+                   help="place only the largest image of each near-duplicate group (implies --dedup-groups)")
+    return p.parse_args()
+
+def main(root=None, jobs=JOBS, mode=FILE_MODE, seed=RANDOM_SEED, incremental=False, stratify=False,
+         dedup_groups=False, drop_redundant=False):
+    if root is not None:
+        configure(root)
+    timings = {}
+    t0 = time.perf_counter()
 
     # 1) รวบรวมไฟล์ (ชั้นเดียว)
     imgs = list_images_flat(IMAGES_DIR)
@@ -100,60 +249,173 @@ def main():
     matched_stems = sorted(img_stems & lbl_stems)
     only_images   = sorted(img_stems - lbl_stems)
     only_labels   = sorted(lbl_stems - img_stems)
+    timings["list"] = time.perf_counter() - t0
 
     print(f"[INFO] images: {len(imgs)}, labels: {len(lbls)}")
     print(f"[INFO] matched pairs: {len(matched_stems)}")
     print(f"[INFO] only-images (no txt): {len(only_images)}")
     print(f"[INFO] only-labels (no img): {len(only_labels)}")
 
-    # 3) สร้างคู่ (img, lbl)
-    pairs = [(img_map[s], lbl_map[s]) for s in matched_stems]
-    random.shuffle(pairs)
-
-    # 4) split
-    n = len(pairs)
-    n_train = int(n * SPLIT.get("train", 0))
-    n_val   = int(n * SPLIT.get("val", 0))
-    n_test  = n - n_train - n_val if SPLIT.get("test", 0) > 0 else 0
-
-    train_set = pairs[:n_train]
-    val_set   = pairs[n_train:n_train+n_val]
-    test_set  = pairs[n_train+n_val:] if n_test > 0 else []
-
-    print(f"[SPLIT] train={len(train_set)}, val={len(val_set)}, test={len(test_set)}")
-
-    # 5) สร้างโครงปลายทาง
-    for split in ["train", "val"] + (["test"] if n_test > 0 else []):
-        (DATA_ROOT / "images" / split).mkdir(parents=True, exist_ok=True)
-        (DATA_ROOT / "labels" / split).mkdir(parents=True, exist_ok=True)
-
-    # 6) คัดลอก/ลิงก์
-    def place(split_name, items):
-        img_out = DATA_ROOT / "images" / split_name
-        lbl_out = DATA_ROOT / "labels" / split_name
-        for img, lbl in items:
-            safe_put(img, img_out / img.name, FILE_MODE)
-            safe_put(lbl, lbl_out / lbl.name, FILE_MODE)
-
-    place("train", train_set)
-    place("val",   val_set)
-    if test_set:
-        place("test", test_set)
-
-    # 7) เขียน data.yaml
+    # 3) กำหนด split ต่อ stem
+    t1 = time.perf_counter()
+    prev = load_assignment(SPLIT_MANIFEST) if incremental else {}
+    if incremental and not SPLIT_MANIFEST.exists():
+        # ห้าม hash ใหม่ทุก stem: split เดิมอาจมาจาก random shuffle → รูปจะย้าย/ซ้ำข้าม split
+        prev = scan_assignment()
+        print(f"[INCR] ไม่พบ {SPLIT_MANIFEST.name} → ใช้ split เดิมจาก images/<split>/ ({len(prev)} stem)")
+
+    # รูปเกือบซ้ำ: สุ่ม split ให้ตัวแทนกลุ่มตัวเดียว แล้วสมาชิกที่เหลือตามไป (กันรูปเดียวกันหลุดไปทั้ง train และ val)
+    # ตัวแทน = สมาชิกที่เคยมี split แล้ว (incremental) ไม่งั้นรูปที่ใหญ่สุด
+    members = {}
+    if dedup_groups or drop_redundant:
+        from near_duplicates import find_groups
+        matched = set(matched_stems)
+        for g in find_groups(DATA_ROOT, jobs):
+            g = [s for s in g if s in matched]
+            if len(g) > 1:
+                rep = next((s for s in g if s in prev), g[0])
+                members[rep] = [s for s in g if s != rep]
+    follower = {s for others in members.values() for s in others}
+    assign_stems = [s for s in matched_stems if s not in follower]
+    splits = [k for k in ("train", "val", "test") if SPLIT.get(k, 0) > 0 or k != "test"]
+    idx = None
+    if stratify:
+        # อ่านเนื้อ label ผ่าน index (อ่านใหม่เฉพาะไฟล์ที่ mtime/size เปลี่ยน)
+        from label_index import build_index
+        idx = build_index(DATA_ROOT, jobs)
+        nc = len(load_class_names()) or (int(idx.cls.max()) + 1 if len(idx.cls) else 0)
+        rare = dict(zip(idx.stems.tolist(), idx.rarest_class(nc).tolist()))
+        groups = {}
+        for s in assign_stems:
+            groups.setdefault(rare.get(s, -1), []).append(s)
+        assign = dict(prev)
+        n_new = sum(1 for s in assign_stems if s not in prev)
+        stratified_assign(groups, seed, SPLIT, assign)
+        print(f"[STRAT] {len(groups)} กลุ่ม (คลาสหายากสุดต่อรูป), stem ใหม่ {n_new}")
+        splits = sorted(set(splits) | set(assign.values()), key=["train", "val", "test"].index)
+    elif incremental:
+        # stem เดิมอยู่ split เดิมเสมอ, stem ใหม่ใช้ hash → ไม่มีไฟล์ย้ายข้าม split
+        assign = dict(prev)
+        new = [s for s in assign_stems if s not in prev]
+        for s in new:
+            assign[s] = hash_split(s, seed, SPLIT)
+        print(f"[INCR] เดิม {len(prev)} stem, ใหม่ {len(new)}, "
+              f"หายจากต้นทาง {len(set(prev) - set(matched_stems))} (ไม่ลบออกจาก split)")
+        splits = sorted(set(splits) | set(assign.values()), key=["train", "val", "test"].index)
+    else:
+        random.seed(seed)
+        stems = list(assign_stems)
+        random.shuffle(stems)
+        n = len(stems)
+        n_train = int(n * SPLIT.get("train", 0))
+        n_val   = int(n * SPLIT.get("val", 0))
+        n_test  = n - n_train - n_val if SPLIT.get("test", 0) > 0 else 0
+        assign = {}
+        for s in stems[:n_train]:
+            assign[s] = "train"
+        for s in stems[n_train:n_train + n_val]:
+            assign[s] = "val"
+        for s in (stems[n_train + n_val:] if n_test > 0 else []):
+            assign[s] = "test"
+    if members:
+        n_follow = dropped = leaks = 0
+        for rep, others in members.items():
+            split = assign.get(rep)
+            for s in others:
+                if s in prev:
+                    # อยู่ split เดิมต่อ (ไม่ย้ายไฟล์) — ถ้าคนละ split กับตัวแทนคือรั่วจากรอบก่อน
+                    leaks += prev[s] != split
+                elif split is None:
+                    continue
+                elif drop_redundant:
+                    dropped += 1
+                else:
+                    assign[s] = split
+                    n_follow += 1
+        print(f"[NEAR] {len(members)} กลุ่ม  สมาชิกตามตัวแทน {n_follow}  ตัดทิ้ง {dropped}"
+              + (f"  [WARN] {leaks} stem เดิมอยู่คนละ split กับกลุ่ม (ไม่ย้าย)" if leaks else ""))
+    counts = {k: 0 for k in splits}
+    for s in matched_stems:
+        if s in assign:
+            counts[assign[s]] += 1
+    timings["assign"] = time.perf_counter() - t1
+    print("[SPLIT] " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+    if idx is not None:
+        by_split = {k: [] for k in splits}
+        for s in matched_stems:
+            if s in assign:
+                by_split[assign[s]].append(s)
+        print_class_balance(idx, by_split, nc)
+
+    # 4) สร้างโครงปลายทาง + อ่านชื่อที่มีอยู่แล้วครั้งเดียวต่อโฟลเดอร์ (แทน exists() ทีละไฟล์)
+    t2 = time.perf_counter()
+    existing = {}
+    for split in splits:
+        for kind in ("images", "labels"):
+            d = DATA_ROOT / kind / split
+            d.mkdir(parents=True, exist_ok=True)
+            with os.scandir(d) as it:
+                existing[(kind, split)] = {e.name for e in it}
+
+    tasks = []
+    for s in matched_stems:
+        split = assign.get(s)
+        if split is None:
+            continue
+        img, lbl = img_map[s], lbl_map[s]
+        if img.name not in existing[("images", split)]:
+            tasks.append((img, DATA_ROOT / "images" / split / img.name))
+        if lbl.name not in existing[("labels", split)]:
+            tasks.append((lbl, DATA_ROOT / "labels" / split / lbl.name))
+
+    # 5) คัดลอก/ลิงก์แบบขนาน
+    if mode == "auto" and tasks:
+        mode = probe_mode(tasks[0][0], tasks[0][1].parent)
+        print(f"[MODE] filesystem รองรับ: {mode}")
+    used = {}
+    nbytes = 0
+    if tasks:
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+            futs = [ex.submit(safe_put, src, dst, mode, False) for src, dst in tasks]
+            for i, f in enumerate(futs, 1):
+                try:
+                    how = f.result()
+                except OSError as e:
+                    print(f"  [ERR ] {tasks[i - 1][0]}: {e}", file=sys.stderr)
+                    how = "error"
+                used[how] = used.get(how, 0) + 1
+                if how == "copy":
+                    nbytes += tasks[i - 1][0].stat().st_size
+                if i % 2000 == 0:
+                    print(f"    [PROG] {i}/{len(tasks)}")
+    timings["place"] = time.perf_counter() - t2
+
+    save_assignment(SPLIT_MANIFEST, assign, seed)
+
+    # 6) เขียน data.yaml
+    has_test = "test" in splits and counts.get("test", 0) > 0
     names = load_class_names()
     if names:
-        write_yaml(names, has_test=(len(test_set) > 0))
+        write_yaml(names, has_test=has_test)
     else:
         DATA_YAML.write_text(
             f'path: "{str(DATA_ROOT)}"\ntrain: "images/train"\nval: "images/val"\n'
-            + ('test: "images/test"\n' if len(test_set) > 0 else '')
+            + ('test: "images/test"\n' if has_test else '')
             + "nc: 0\nnames: []\n",
             encoding="utf-8"
         )
         print(f"[OK] Wrote data.yaml (empty names) -> {DATA_YAML}")
 
+    total = time.perf_counter() - t0
+    skipped = 2 * sum(counts.values()) - len(tasks)
+    print(f"[TIME] list {timings['list']:.2f}s  assign {timings['assign']:.2f}s  "
+          f"place {timings['place']:.2f}s  รวม {total:.2f}s  (jobs={jobs})")
+    print(f"[PLACE] วางใหม่ {len(tasks)} ไฟล์ " + " ".join(f"{k}={v}" for k, v in sorted(used.items()))
+          + f"  ข้าม (มีอยู่แล้ว) {skipped}"
+          + (f"  copy {nbytes / 1e6:.1f} MB ({nbytes / 1e6 / max(timings['place'], 1e-9):.1f} MB/s)" if nbytes else ""))
     print("[DONE] Split complete.")
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(args.root, args.jobs, args.mode, args.seed, args.incremental, args.stratify,
+         args.dedup_groups, args.drop_redundant)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Profiler การเทรนผ่าน callback ของ Ultralytics (เปิดด้วย train_yolov12.py --profile)
+
+ต่อ batch: เวลารอ dataloader (batch_end ก่อนหน้า → batch_start) กับเวลาคำนวณ (batch_start → batch_end)
+ต่อ epoch: เวลา train / val, images/s, RSS สูงสุดของ process หลัก + RSS รวมของ dataloader worker
+
+ไฟล์ใน run dir: profile_batches.csv, profile_epochs.csv, profile.json (เขียนทุกท้าย epoch)
+ถ้าเวลารอ dataloader เกิน STARVED_FRAC ของเวลาต่อ step → แจ้งว่า --workers ป้อนไม่ทัน
+
+max_batches (ใช้โดย autotune.py): ครบจำนวน batch (หรือหมด epoch แรกก่อนครบ) แล้วเขียน probe.json
+และจบ process ทันที (ไม่รอ val)
+"""
+
+import csv
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+STARVED_FRAC = 0.25      # สัดส่วนเวลารอ dataloader ต่อ step ที่ถือว่า GPU/CPU รอข้อมูล
+SKIP_FIRST = 1           # batch แรกของ epoch รวมเวลาเปิด worker → ไม่นับในสรุป
+
+
+def _rss_mb() -> tuple[float, float | None]:
+    """(peak RSS ของ process หลัก, RSS ปัจจุบันรวม child process เช่น dataloader worker) เป็น MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / 1024 / (1024 if sys.platform == "darwin" else 1)   # macOS เป็น byte, Linux เป็น KB
+    try:
+        import psutil
+        me = psutil.Process()
+        total = me.memory_info().rss
+        for c in me.children(recursive=True):
+            try:
+                total += c.memory_info().rss
+            except psutil.Error:
+                pass
+        total /= 1024 * 1024
+    except ImportError:      # ไม่มี psutil → ไม่รู้ RSS ของ worker
+        return peak_mb, None
+    return peak_mb, total
+
+
+class TrainProfiler:
+    def __init__(self, workers: int | None = None, sync_cuda: bool = True, max_batches: int = 0):
+        self.workers = workers
+        self.sync_cuda = sync_cuda
+        self.max_batches = max_batches
+        self._t_created = time.perf_counter()
+        self._t_first = None
+        self.batches = []        # (epoch, i, wait_ms, compute_ms, t)
+        self.epochs = []
+        self._t_prev = None
+        self._t_start = None
+        self._i = 0
+        self._epoch_t0 = None
+        self._train_end = None
+        self._t_fit0 = None
+
+    # ---------- helpers ----------
+    def _sync(self, trainer):
+        # CUDA ทำงานแบบ async → ต้อง sync ก่อนจับเวลา ไม่งั้นเวลาคำนวณไปโผล่ใน "รอ dataloader"
+        if not self.sync_cuda:
+            return
+        dev = getattr(trainer, "device", None)
+        if dev is not None and getattr(dev, "type", "") == "cuda":
+            import torch
+            torch.cuda.synchronize(dev)
+
+    # ---------- callbacks ----------
+    def on_train_start(self, trainer):
+        self._t_fit0 = time.perf_counter()
+
+    def on_train_epoch_start(self, trainer):
+        self._sync(trainer)
+        self._epoch_t0 = self._t_prev = time.perf_counter()
+        self._i = 0
+
+    def on_train_batch_start(self, trainer):
+        now = time.perf_counter()
+        if self._t_first is None:
+            self._t_first = now
+        self._t_start = now
+        self._wait = now - (self._t_prev or now)
+
+    def on_train_batch_end(self, trainer):
+        self._sync(trainer)
+        now = time.perf_counter()
+        self.batches.append((trainer.epoch + 1, self._i, self._wait * 1e3,
+                             (now - self._t_start) * 1e3, now - self._t_fit0))
+        self._t_prev = now
+        self._i += 1
+        if self.max_batches and len(self.batches) >= self.max_batches:
+            self._end_probe(trainer)
+
+    def on_train_epoch_end(self, trainer):
+        self._train_end = time.perf_counter()
+        if self.max_batches:
+            # ข้อมูลชุดย่อย (--fraction) มี batch ไม่ถึง max_batches → epoch หมดก่อน: สรุปจาก batch ที่มี
+            self._end_probe(trainer)
+
+    def _end_probe(self, trainer):
+        self.write_probe(trainer)
+        sys.stdout.flush()
+        os._exit(0)               # probe จบแค่นี้: ข้าม val/เซฟ checkpoint (worker ของ DataLoader ปิดตาม parent)
+
+    def on_fit_epoch_end(self, trainer):
+        now = time.perf_counter()
+        ep = trainer.epoch + 1
+        rows = [b for b in self.batches if b[0] == ep]
+        steady = rows[SKIP_FIRST:] or rows
+        wait = sum(b[2] for b in steady)
+        comp = sum(b[3] for b in steady)
+        n_img = len(trainer.train_loader.dataset) if getattr(trainer, "train_loader", None) else 0
+        train_s = (self._train_end or now) - self._epoch_t0
+        peak, total = _rss_mb()
+        self.epochs.append({
+            "epoch": ep,
+            "batches": len(rows),
+            "train_s": round(train_s, 3),
+            "val_s": round(now - (self._train_end or now), 3),
+            "epoch_s": round(now - self._epoch_t0, 3),
+            "images_per_s": round(n_img / train_s, 2) if train_s else 0.0,
+            "wait_ms_median": round(statistics.median(b[2] for b in steady), 2) if steady else 0.0,
+            "compute_ms_median": round(statistics.median(b[3] for b in steady), 2) if steady else 0.0,
+            "first_batch_wait_ms": round(rows[0][2], 1) if rows else 0.0,
+            "wait_frac": round(wait / (wait + comp), 4) if wait + comp else 0.0,
+            "peak_rss_mb": round(peak, 1),
+            "rss_with_workers_mb": round(total, 1) if total is not None else None,
+        })
+        self.write(Path(trainer.save_dir))
+
+    def on_train_end(self, trainer):
+        self.write(Path(trainer.save_dir))
+        self.print_summary(Path(trainer.save_dir))
+
+    # ---------- output ----------
+    def summary(self) -> dict:
+        if not self.epochs:
+            return {}
+        steady = self.epochs[1:] or self.epochs     # epoch แรกมี warmup/สร้าง cache
+        frac = statistics.mean(e["wait_frac"] for e in steady)
+        return {
+            "epochs": len(self.epochs),
+            "images_per_s": round(statistics.mean(e["images_per_s"] for e in steady), 2),
+            "epoch_s": round(statistics.mean(e["epoch_s"] for e in steady), 2),
+            "train_s": round(statistics.mean(e["train_s"] for e in steady), 2),
+            "val_s": round(statistics.mean(e["val_s"] for e in steady), 2),
+            "wait_frac": round(frac, 4),
+            "wait_ms_median": round(statistics.median(e["wait_ms_median"] for e in steady), 2),
+            "compute_ms_median": round(statistics.median(e["compute_ms_median"] for e in steady), 2),
+            "peak_rss_mb": max(e["peak_rss_mb"] for e in self.epochs),
+            "max_rss_with_workers_mb": max((e["rss_with_workers_mb"] for e in self.epochs
+                                            if e["rss_with_workers_mb"] is not None), default=None),
+            "workers": self.workers,
+            "starved": frac > STARVED_FRAC,
+        }
+
+    def write(self, save_dir: Path):
+        save_dir.mkdir(parents=True, exist_ok=True)
+        with open(save_dir / "profile_batches.csv", "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["epoch", "batch", "wait_ms", "compute_ms", "t_s"])
+            w.writerows((e, i, round(a, 3), round(c, 3), round(t, 3)) for e, i, a, c, t in self.batches)
+        if self.epochs:
+            with open(save_dir / "profile_epochs.csv", "w", newline="", encoding="utf-8") as f:
+                w = csv.DictWriter(f, fieldnames=list(self.epochs[0]))
+                w.writeheader()
+                w.writerows(self.epochs)
+        tmp = save_dir / "profile.json.tmp"
+        tmp.write_text(json.dumps({"summary": self.summary(), "epochs": self.epochs}, indent=2),
+                       encoding="utf-8")
+        os.replace(tmp, save_dir / "profile.json")
+
+    def write_probe(self, trainer):
+        """สรุปแบบสั้นสำหรับ probe run: images/s จาก batch ที่พ้นช่วงเปิด worker แล้ว"""
+        steady = self.batches[SKIP_FIRST:] or self.batches
+        step_s = sum(b[2] + b[3] for b in steady) / 1e3
+        wait = sum(b[2] for b in steady)
+        peak, total = _rss_mb()
+        gpu_mb = None
+        dev = getattr(trainer, "device", None)
+        if dev is not None and getattr(dev, "type", "") == "cuda":
+            import torch
+            gpu_mb = round(torch.cuda.max_memory_reserved(dev) / 1024 / 1024, 1)
+        bs = int(getattr(trainer, "batch_size", 0) or 0)
+        probe = {
+            "batches": len(self.batches),
+            "batch_size": bs,
+            "images_per_s": round(bs * len(steady) / step_s, 2) if step_s else 0.0,
+            "wait_frac": round(wait / (step_s * 1e3), 4) if step_s else 0.0,
+            "setup_s": round((self._t_first or self._t_created) - self._t_created, 2),
+            "peak_rss_mb": round(peak, 1),
+            "rss_with_workers_mb": round(total, 1) if total is not None else None,
+            "gpu_reserved_mb": gpu_mb,
+        }
+        save_dir = Path(trainer.save_dir)
+        save_dir.mkdir(parents=True, exist_ok=True)
+        (save_dir / "probe.json").write_text(json.dumps(probe, indent=2), encoding="utf-8")
+        return probe
+
+    def print_summary(self, save_dir: Path):
+        s = self.summary()
+        if not s:
+            return
+        print("\n=== Training profile ===")
+        print(f"Images/s  : {s['images_per_s']}   epoch {s['epoch_s']}s (train {s['train_s']}s, val {s['val_s']}s)")
+        print(f"Per batch : รอ dataloader {s['wait_ms_median']} ms  คำนวณ {s['compute_ms_median']} ms  "
+              f"(รอ {s['wait_frac']:.0%} ของเวลา step)")
+        workers_rss = s["max_rss_with_workers_mb"]
+        print(f"Peak RSS  : {s['peak_rss_mb']} MB"
+              + (f" (รวม worker สูงสุด {workers_rss} MB)" if workers_rss is not None else " (ติดตั้ง psutil เพื่อดู RSS ของ worker)"))
+        if s["starved"]:
+            print(f"[WARN] dataloader ป้อนไม่ทัน (--workers={self.workers}): รอเกิน {STARVED_FRAC:.0%} ของเวลา step "
+                  f"→ เพิ่ม --workers, ใช้ --cache, prepare_resized_cache.py หรือ --shards")
+        print(f"Timeline  : {save_dir / 'profile.json'}")
+
+    def attach(self, model):
+        for name in ("on_train_start", "on_train_epoch_start", "on_train_batch_start",
+                     "on_train_batch_end", "on_train_epoch_end", "on_fit_epoch_end", "on_train_end"):
+            model.add_callback(name, getattr(self, name))
+        return self
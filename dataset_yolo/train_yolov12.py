@@ -3,8 +3,12 @@
 
 import argparse
 import os
+import sys
 from pathlib import Path
 
+# โมดูลเสริมในโฟลเดอร์เดียวกัน (shard_dataset, train_profiler, autotune)
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
 # ถ้าไม่ได้ใช้ virtualenv แนะนำให้อัปเดต pip/setuptools ก่อน:
 # python -m pip install -U pip setuptools wheel
 # pip install -U ultralytics
@@ -27,11 +31,36 @@ def main():
                         help="Early stopping patience (epochs without val improvement).")
     parser.add_argument("--resume", action="store_true",
                         help="Resume training from last checkpoint in the same run.")
-    parser.add_argument("--cache", action="store_true",
-                        help="Cache images in RAM/disk for faster training.")
+    parser.add_argument("--cache", nargs="?", const="ram", default=None, choices=("ram", "disk", "none"),
+                        help="Cache images in RAM/disk for faster training (--cache alone = ram).")
     parser.add_argument("--workers", type=int, default=4, help="Dataloader workers.")
+    parser.add_argument("--shards", action="store_true",
+                        help="--data is shards/data.yaml from pack_shards.py (read images via mmap).")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record dataloader wait vs compute per batch, images/s, RSS (profile.json in run dir).")
+    parser.add_argument("--fraction", type=float, default=1.0, help="Fraction of the train split to use.")
+    parser.add_argument("--autotune", action="store_true",
+                        help="Probe workers/batch/cache with short runs first, then train with the fastest.")
+    parser.add_argument("--tuned-config", type=str, default=None,
+                        help="autotune.json to apply (written here when used with --autotune).")
+    parser.add_argument("--probe-batches", type=int, default=0, help=argparse.SUPPRESS)  # ใช้โดย autotune.py
     args = parser.parse_args()
 
+    # หา/โหลดค่า workers/batch/cache ที่เหมาะกับเครื่อง (autotune.py)
+    if args.autotune or args.tuned_config:
+        import autotune
+        if args.autotune:
+            tuned_path = Path(args.tuned_config or Path(args.project) / args.name / "autotune.json")
+            result = autotune.autotune(args.data, args.model, args.imgsz, args.device, shards=args.shards)
+            autotune.save(result, tuned_path)
+            autotune.print_result(result, tuned_path)
+            best = result["best"]
+        else:
+            best = autotune.load_best(Path(args.tuned_config))
+            print(f"[TUNE] ใช้ค่าจาก {args.tuned_config}: batch={best['batch']} "
+                  f"workers={best['workers']} cache={best['cache']}")
+        args.batch, args.workers, args.cache = best["batch"], best["workers"], best["cache"]
+
     # ป้องกัน tmp เต็มบนพาธ system: ชี้ TMPDIR ไปพาร์ทิชันใหญ่ได้ (ถ้าต้องการ)
     # os.environ.setdefault("TMPDIR", "/media/banky/New Volume/Phamatics/tmp")
 
@@ -43,6 +72,10 @@ def main():
     # โหลดโมเดล (รองรับทั้ง pretrained family และ checkpoint)
     model = YOLO(args.model)
 
+    if args.profile or args.probe_batches:
+        from train_profiler import TrainProfiler
+        TrainProfiler(workers=args.workers, max_batches=args.probe_batches).attach(model)
+
     # ถ้าอยากให้ deterministic มากขึ้น
     # tip: การตั้งค่า deterministic จะช้าลงเล็กน้อย แต่ reproducible
     # from ultralytics.utils import torch_utils
@@ -65,8 +98,19 @@ def main():
         verbose=True
     )
 
-    if args.cache:
-        train_kwargs["cache"] = True
+    if args.cache and args.cache != "none":
+        train_kwargs["cache"] = args.cache
+    if args.fraction < 1:
+        train_kwargs["fraction"] = args.fraction
+    if args.probe_batches:
+        # probe ของ autotune: ไม่ต้อง plot/validate (process จบเองเมื่อครบจำนวน batch)
+        train_kwargs.update(plots=False, val=False)
+
+    # อ่านรูปจาก shard (pack_shards.py) แทนไฟล์เดี่ยว — cache ของ Ultralytics ใช้ไม่ได้กับ shard
+    if args.shards:
+        from shard_dataset import ShardDetectionTrainer
+        train_kwargs["trainer"] = ShardDetectionTrainer
+        train_kwargs.pop("cache", None)
 
     # เริ่มเทรน
     if args.resume:
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+งานดิสก์ของ async downloader (open / write / mkdir / rename / stat) ย้ายไปทำใน thread pool
+
+event loop แค่อ่าน socket แล้วส่ง chunk ต่อ — ถ้าดิสก์ (USB/NTFS) ค้าง
+socket อื่นยังวิ่งต่อได้ ต่อไฟล์มี write ค้างได้ไม่เกิน MAX_PENDING chunk (คิวมีขอบเขต)
+chunk ของไฟล์เดียวกันเขียนตามลำดับเสมอ (ต่อคิวกัน) — ถ้า process ตายกลางทาง .part จะไม่มีรูเป็นศูนย์
+ก่อน st_size จึง resume จาก st_size ได้ถูกต้อง; ไฟล์คนละไฟล์ยังเขียนขนานกันใน thread pool
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+DISK_THREADS = 4
+MAX_PENDING = 4       # chunk ที่รอเขียนได้ต่อไฟล์
+
+_HAS_PWRITE = hasattr(os, "pwrite")
+FALLOC_FL_KEEP_SIZE = 1
+_libc = None
+if sys.platform.startswith("linux"):
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        _libc.fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong]
+    except (OSError, AttributeError):
+        _libc = None
+
+
+def preallocate(fd: int, offset: int, length: int):
+    """จองพื้นที่ล่วงหน้าโดยไม่เปลี่ยน st_size (ขนาด .part ยังใช้เป็นจุด resume ได้) — ทำไม่ได้ก็ข้าม"""
+    if _libc is None or length <= 0:
+        return
+    _libc.fallocate(fd, FALLOC_FL_KEEP_SIZE, offset, length)
+
+
+def _write_at(fd: int, data: bytes, pos: int):
+    view = memoryview(data)
+    while view:
+        if _HAS_PWRITE:
+            n = os.pwrite(fd, view, pos)
+        else:
+            os.lseek(fd, pos, os.SEEK_SET)
+            n = os.write(fd, view)
+        view = view[n:]
+        pos += n
+
+
+def _open_part(path: Path, offset: int, expected: int | None) -> int:
+    flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0)
+    if not offset:
+        flags |= os.O_TRUNC
+    fd = os.open(path, flags, 0o644)
+    if expected is not None:
+        preallocate(fd, offset, expected - offset)
+    return fd
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _make_dirs(dirs: list[Path]):
+    for d in dirs:
+        d.mkdir(parents=True, exist_ok=True)
+
+
+class PartFile:
+    """ไฟล์ที่กำลังเขียน — write() คืนทันทีถ้ายังมีที่ในคิว ไม่งั้นรอ chunk เก่าสุดเขียนเสร็จ
+    แต่ละ chunk รอ chunk ก่อนหน้าก่อนค่อยเขียน (ลำดับเดียวกับที่ได้จาก socket)"""
+
+    def __init__(self, writer: "DiskWriter", fd: int, offset: int):
+        self.writer = writer
+        self.fd = fd
+        self.pos = offset
+        self.written = 0
+        self._pending: deque[asyncio.Future] = deque()
+
+    async def _write_after(self, prev: asyncio.Future | None, data: bytes, pos: int):
+        if prev is not None:
+            await prev            # chunk ก่อนหน้าล้ม → chunk นี้ไม่เขียน (ไม่ให้มีข้อมูลข้ามรู)
+        await self.writer.run(_write_at, self.fd, data, pos)
+
+    async def write(self, data: bytes):
+        if len(self._pending) >= self.writer.max_pending:
+            await self._pending.popleft()
+        prev = self._pending[-1] if self._pending else None
+        fut = asyncio.ensure_future(self._write_after(prev, data, self.pos))
+        self._pending.append(fut)
+        self.pos += len(data)
+        self.written += len(data)
+
+    async def close(self):
+        err = None
+        while self._pending:
+            try:
+                await self._pending.popleft()
+            except Exception as e:
+                err = err or e
+        await self.writer.run(os.close, self.fd)
+        if err:
+            raise err
+
+
+class DiskWriter:
+    def __init__(self, threads: int = DISK_THREADS, max_pending: int = MAX_PENDING):
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix="disk")
+        self.max_pending = max_pending
+        self.loop = asyncio.get_running_loop()
+        self._dirs: set[Path] = set()
+
+    async def run(self, fn, *args):
+        return await self.loop.run_in_executor(self.pool, fn, *args)
+
+    async def ensure_dirs(self, dirs):
+        """mkdir เฉพาะโฟลเดอร์ที่ยังไม่เคยสร้างในรอบนี้ รวมเป็น call เดียว"""
+        todo = [d for d in dict.fromkeys(dirs) if d not in self._dirs]
+        if todo:
+            await self.run(_make_dirs, todo)
+            self._dirs.update(todo)
+
+    async def size(self, path: Path) -> int:
+        return await self.run(_file_size, path)
+
+    async def open(self, path: Path, offset: int, expected: int | None = None) -> PartFile:
+        fd = await self.run(_open_part, path, offset, expected)
+        return PartFile(self, fd, offset)
+
+    def close(self):
+        self.pool.shutdown(wait=True)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+แยก href (+ วันที่/ขนาด ถ้ามี) จากหน้า directory listing แบบ Apache/nginx
+
+parser ให้เลือก:
+  "fast" (ค่าเริ่มต้น) — regex สแกนเฉพาะ <a href> และข้อความหลัง anchor ไม่สร้าง DOM
+  "lxml"               — lxml.html (ต้องติดตั้ง lxml)
+  "bs4"                — BeautifulSoup html.parser แบบเดิม (ช้าสุด ใช้เทียบ/สำรอง)
+
+ทุกตัวคืน list[Entry] ลำดับเดียวกับในหน้า
+"""
+
+import html as htmlmod
+import re
+from dataclasses import dataclass
+from urllib.parse import urljoin
+
+DEFAULT_PARSER = "fast"
+
+_ANCHOR = re.compile(
+    r"""<a\s[^>]*?href\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))[^>]*>.*?</a\s*>""",
+    re.I | re.S,
+)
+_TAG = re.compile(r"<[^>]+>")
+_DATE = re.compile(
+    r"(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2})?"      # 2015-03-10 12:34
+    r"|\d{2}-[A-Za-z]{3}-\d{4} \d{2}:\d{2}(?::\d{2})?)"  # 10-Mar-2015 12:34
+)
+_SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:i?B)?\s*$", re.I)
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+@dataclass
+class Entry:
+    url: str
+    size: int | None = None        # bytes (ประมาณ ถ้า listing แสดงเป็น 1.2M)
+    size_exact: bool = False       # True = listing แสดงเป็นจำนวน byte ตรงๆ
+    modified: str | None = None    # ตามที่ listing แสดง เช่น "2015-03-10 12:34"
+
+
+def _columns(tail: str) -> tuple[int | None, bool, str | None]:
+    """อ่านวันที่/ขนาดจากข้อความหลัง anchor (ทั้งแบบ <pre> และแบบ <table>)"""
+    text = htmlmod.unescape(_TAG.sub(" ", tail))
+    m = _DATE.search(text)
+    if not m:
+        return None, False, None
+    modified = m.group(1)
+    size = None
+    exact = False
+    for tok in text[m.end():].split():
+        sm = _SIZE.match(tok)
+        if sm:
+            num, unit = sm.group(1), sm.group(2).upper()
+            size = int(float(num) * _UNITS[unit])
+            exact = unit == "" and "." not in num
+            break
+        if tok == "-":
+            break
+    return size, exact, modified
+
+
+def _keep(href: str) -> bool:
+    return bool(href) and not (href.startswith("#") or href.startswith("?"))
+
+
+def parse_fast(html: str, base_url: str) -> list[Entry]:
+    entries = []
+    matches = list(_ANCHOR.finditer(html))
+    for i, m in enumerate(matches):
+        href = htmlmod.unescape(m.group(1) or m.group(2) or m.group(3) or "")
+        if not _keep(href):
+            continue
+        # คอลัมน์วันที่/ขนาดอยู่ระหว่าง anchor นี้กับ anchor ถัดไป (ตัดที่ท้ายบรรทัด/ท้ายแถว)
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(html)
+        tail = html[m.end():end]
+        cut = re.search(r"\n|</tr", tail, re.I)
+        if cut:
+            tail = tail[:cut.start()]
+        entries.append(Entry(urljoin(base_url, href), *_columns(tail)))
+    return entries
+
+
+def parse_lxml(html: str, base_url: str) -> list[Entry]:
+    import lxml.html
+    root = lxml.html.fromstring(html)
+    entries = []
+    for a in root.iter("a"):
+        href = a.get("href")
+        if not href or not _keep(href):
+            continue
+        row = a.getparent()
+        if row is not None and row.tag == "td" and row.getparent() is not None:
+            cells = row.itersiblings()
+            tail = " ".join(c.text_content() for c in cells)
+        else:
+            tail = (a.tail or "").split("\n", 1)[0]
+        entries.append(Entry(urljoin(base_url, href), *_columns(tail)))
+    return entries
+
+
+def parse_bs4(html: str, base_url: str) -> list[Entry]:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    entries = []
+    for a in soup.find_all("a", href=True):
+        href = a["href"]
+        if not _keep(href):
+            continue
+        entries.append(Entry(urljoin(base_url, href)))
+    return entries
+
+
+PARSERS = {"fast": parse_fast, "lxml": parse_lxml, "bs4": parse_bs4}
+
+
+def parse_listing(html: str, base_url: str, parser: str = DEFAULT_PARSER) -> list[Entry]:
+    return PARSERS[parser](html, base_url)
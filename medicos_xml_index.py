@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+อ่าน MedicosConsultantsExport_{N}.xml แบบ streaming (iterparse, memory คงที่)
+แล้วรวมเป็น index เดียว (SQLite) ทุก disc: ชื่อไฟล์รูป → ชื่อยา, NDC, imprint, shape, color, size
+
+    python medicos_xml_index.py update  --root Pills_downloads
+    python medicos_xml_index.py lookup  00002-3228-30_391E1C80.jpg
+    python medicos_xml_index.py classes --out-dir dataset_yolo/dataset_medicines --min-images 5
+
+update ทำเฉพาะ XML ที่ขนาด/mtime เปลี่ยนจากรอบก่อน (disc ใหม่ = เพิ่มเฉพาะ disc นั้น)
+รูปอ้างอิงชื่อเดียวกันอยู่ได้หลาย disc → key คือ (disc, filename); lookup คืนแถวของ disc เลขน้อยสุด
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+try:  # lxml เร็วกว่าเกือบเท่าตัว ถ้ามีก็ใช้
+    from lxml.etree import iterparse
+except ImportError:
+    from xml.etree.ElementTree import iterparse
+
+ROOT = Path("Pills_downloads")
+INDEX_NAME = ".pill_index.sqlite"
+XML_GLOB = "PillProjectDisc*/MedicosConsultantsExport_*.xml"
+RECORD_TAG = "image"           # 1 record ต่อ <Image> (เทียบแบบไม่สนตัวพิมพ์/namespace)
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tif", ".tiff", ".webp")
+BATCH = 5000
+
+# ชื่อ tag ที่พบในแต่ละ export (เรียงตามลำดับที่อยากได้) — ตัวพิมพ์เล็กทั้งหมด
+FIELDS = {
+    "drug":    ("proprietaryname", "medicinename", "drugname", "genericname", "name"),
+    "ndc":     ("ndc11", "ndc9", "ndc"),
+    "imprint": ("imprint",),
+    "shape":   ("shape",),
+    "color":   ("color",),
+    "size":    ("size",),
+}
+COLUMNS = ("filename", "stem", "disc") + tuple(FIELDS)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pills (
+    filename TEXT NOT NULL,
+    stem     TEXT NOT NULL,
+    disc     INTEGER NOT NULL,
+    drug     TEXT,
+    ndc      TEXT,
+    imprint  TEXT,
+    shape    TEXT,
+    color    TEXT,
+    size     TEXT,
+    PRIMARY KEY (disc, filename)
+);
+CREATE INDEX IF NOT EXISTS pills_filename ON pills(filename);
+CREATE INDEX IF NOT EXISTS pills_stem ON pills(stem);
+CREATE INDEX IF NOT EXISTS pills_drug ON pills(drug);
+CREATE TABLE IF NOT EXISTS sources (
+    disc       INTEGER PRIMARY KEY,
+    xml_path   TEXT NOT NULL,
+    size       INTEGER NOT NULL,
+    mtime      REAL NOT NULL,
+    n_records  INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+"""
+
+
+def _local(tag) -> str:
+    if not isinstance(tag, str):        # comment / PI (lxml)
+        return ""
+    return tag.rsplit("}", 1)[-1].lower()
+
+
+def iter_records(xml_path: Path):
+    """yield dict ต่อ 1 รูป — ตัด element ที่อ่านแล้วทิ้งทันที memory จึงไม่โตตามขนาดไฟล์"""
+    stack = []
+    for event, elem in iterparse(str(xml_path), events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+        stack.pop()
+        if _local(elem.tag) != RECORD_TAG:
+            continue
+        values: dict[str, str] = {}
+        files: list[str] = []
+        for child in elem.iter():
+            if child is elem:
+                continue
+            text = (child.text or "").strip()
+            if not text:
+                continue
+            if text.lower().endswith(IMAGE_EXTS):
+                files.append(text.replace("\\", "/").rsplit("/", 1)[-1])
+                continue
+            values.setdefault(_local(child.tag), text)
+        rec = {field: next((values[a] for a in aliases if a in values), None)
+               for field, aliases in FIELDS.items()}
+        for name in dict.fromkeys(files):
+            yield dict(rec, filename=name)
+        if stack:
+            stack[-1].remove(elem)
+        else:
+            elem.clear()
+
+
+def disc_of(xml_path: Path) -> int:
+    m = re.search(r"_(\d+)\.xml$", xml_path.name, re.I)
+    if not m:
+        raise ValueError(f"ไม่รู้ว่า {xml_path.name} เป็นของ disc ไหน")
+    return int(m.group(1))
+
+
+class PillIndex:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self._migrate()
+        self.db.executescript(SCHEMA)
+
+    def _migrate(self):
+        # index รุ่นแรก key แค่ filename → รูปที่อยู่หลาย disc ถูกย้ายไป disc ที่ index ทีหลังสุด: สร้างใหม่ทั้งหมด
+        pk = [r[1] for r in sorted(self.db.execute("PRAGMA table_info(pills)"), key=lambda r: r[5]) if r[5]]
+        if pk == ["filename"]:
+            self.db.executescript("DROP TABLE pills; DROP TABLE IF EXISTS sources;")
+            print("[INFO] index รุ่นเก่า (key = filename) → index ทุก XML ใหม่")
+
+    def close(self):
+        self.db.close()
+
+    def update(self, xml_paths, force: bool = False) -> dict[int, int]:
+        """index XML ที่ใหม่/เปลี่ยน → {disc: จำนวน record}"""
+        known = {r[0]: (r[1], r[2]) for r in self.db.execute("SELECT disc, size, mtime FROM sources")}
+        changed = {}
+        for xml_path in sorted(xml_paths):
+            disc = disc_of(xml_path)
+            st = xml_path.stat()
+            if not force and known.get(disc) == (st.st_size, st.st_mtime):
+                continue
+            t0 = time.perf_counter()
+            n = self._index_one(disc, xml_path, st)
+            changed[disc] = n
+            print(f"[IDX ] disc {disc}: {n} รูป  ({time.perf_counter() - t0:.1f}s)")
+        return changed
+
+    def _index_one(self, disc: int, xml_path: Path, st) -> int:
+        # ชื่อซ้ำใน XML เดียวกัน → เก็บ record แรก
+        sql = f"INSERT OR IGNORE INTO pills({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        with self.db:   # ทั้ง disc เป็น transaction เดียว — ค้างกลางทางก็ไม่เหลือครึ่งๆ
+            self.db.execute("DELETE FROM pills WHERE disc=?", (disc,))
+            batch = []
+            for rec in iter_records(xml_path):
+                rec["stem"] = rec["filename"].rsplit(".", 1)[0].lower()
+                rec["disc"] = disc
+                batch.append(tuple(rec[c] for c in COLUMNS))
+                if len(batch) >= BATCH:
+                    self.db.executemany(sql, batch)
+                    batch.clear()
+            self.db.executemany(sql, batch)
+            n = self.db.execute("SELECT COUNT(*) FROM pills WHERE disc=?", (disc,)).fetchone()[0]
+            self.db.execute(
+                "INSERT OR REPLACE INTO sources(disc, xml_path, size, mtime, n_records, indexed_at) "
+                "VALUES (?,?,?,?,?,?)",
+                (disc, str(xml_path), st.st_size, st.st_mtime, n, time.time()),
+            )
+        return n
+
+    def lookup(self, name: str) -> dict | None:
+        """ค้นด้วยชื่อไฟล์เต็ม หรือ stem (ไม่สนตัวพิมพ์/นามสกุล)"""
+        cols = ", ".join(COLUMNS)
+        row = self.db.execute(f"SELECT {cols} FROM pills WHERE filename=? ORDER BY disc", (name,)).fetchone()
+        if row is None:
+            stem = Path(name).stem.lower() if Path(name).suffix.lower() in IMAGE_EXTS else name.lower()
+            row = self.db.execute(f"SELECT {cols} FROM pills WHERE stem=? ORDER BY disc", (stem,)).fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def drug_counts(self) -> list[tuple[str, int]]:
+        return self.db.execute(
+            "SELECT drug, COUNT(DISTINCT filename) FROM pills WHERE drug IS NOT NULL GROUP BY drug ORDER BY drug"
+        ).fetchall()
+
+
+def write_classes(names: list[str], out_dir: Path):
+    """เขียน classes.txt + notes.json ในรูปแบบเดียวกับที่ export จาก Label Studio"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / "classes.txt").write_text("\n".join(names), encoding="utf-8")
+    notes = {
+        "categories": [{"id": i, "name": n} for i, n in enumerate(names)],
+        "info": {"year": time.localtime().tm_year, "version": "1.0", "contributor": "medicos_xml_index"},
+    }
+    (out_dir / "notes.json").write_text(json.dumps(notes, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"[OK] {len(names)} classes -> {out_dir / 'classes.txt'}, {out_dir / 'notes.json'}")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Streaming index of MedicosConsultantsExport XML files")
+    p.add_argument("--root", default=str(ROOT), help="crawler output root (Pills_downloads)")
+    p.add_argument("--index", help=f"index path (default: ROOT/{INDEX_NAME})")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    u = sub.add_parser("update", help="index new/changed XML exports")
+    u.add_argument("--force", action="store_true", help="re-index every XML")
+    lk = sub.add_parser("lookup", help="print index rows for image filenames/stems")
+    lk.add_argument("names", nargs="+")
+    c = sub.add_parser("classes", help="write classes.txt/notes.json from indexed drug names")
+    c.add_argument("--out-dir", required=True)
+    c.add_argument("--min-images", type=int, default=1, help="drop drugs with fewer images")
+    c.add_argument("--filter", nargs="*", default=[], help="keep drugs containing any of these words")
+    args = p.parse_args()
+
+    root = Path(args.root)
+    index = PillIndex(Path(args.index) if args.index else root / INDEX_NAME)
+    try:
+        if args.cmd == "update":
+            xmls = list(root.glob(XML_GLOB))
+            changed = index.update(xmls, force=args.force)
+            print(f"[DONE] XML {len(xmls)} ไฟล์, index ใหม่ {len(changed)} disc")
+        elif args.cmd == "lookup":
+            missing = 0
+            for name in args.names:
+                row = index.lookup(name)
+                if row is None:
+                    missing += 1
+                    print(f"[MISS] {name}", file=sys.stderr)
+                else:
+                    print(json.dumps(row, ensure_ascii=False))
+            sys.exit(1 if missing else 0)
+        elif args.cmd == "classes":
+            words = [w.lower() for w in args.filter]
+            names = [d for d, n in index.drug_counts()
+                     if n >= args.min_images and (not words or any(w in d.lower() for w in words))]
+            write_classes(names, Path(args.out_dir))
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
-import os, time
+import os, sys, time
 from urllib.parse import urljoin, urlparse
 import requests
-from bs4 import BeautifulSoup
+
+from listing_parser import parse_listing
 
 BASE = "https://data.lhncbc.nlm.nih.gov/public/Pills/"
 DISC_NO = 1
@@ -10,8 +11,8 @@ DISC_URL = urljoin(BASE, f"PillProjectDisc{DISC_NO}/")
 ALLXML_URL = urljoin(BASE, "ALLXML/")
 XML_NAME = f"MedicosConsultantsExport_{DISC_NO}.xml"
 
-OUT_DIR = f"Pills_downloads/PillProjectDisc{DISC_NO}"
-os.makedirs(OUT_DIR, exist_ok=True)
+OUT_ROOT = "Pills_downloads"
+OUT_DIR = f"{OUT_ROOT}/PillProjectDisc{DISC_NO}"
 
 UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
       "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -25,18 +26,74 @@ HEADERS = {
 TIMEOUT = 60
 SLEEP = 0.25
 RETRY = 3
+PART_SUFFIX = ".part"
 IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tif", ".tiff", ".webp")
 
+def configure(base: str = BASE, disc_no: int = DISC_NO, out_root: str = OUT_ROOT, sleep: float = SLEEP):
+    """ตั้งค่า global ใหม่จาก CLI (เช่นชี้ไปเซิร์ฟเวอร์จำลองใน benchmarks/)"""
+    global BASE, DISC_NO, DISC_URL, ALLXML_URL, XML_NAME, OUT_DIR, SLEEP
+    BASE = base if base.endswith("/") else base + "/"
+    DISC_NO = disc_no
+    DISC_URL = urljoin(BASE, f"PillProjectDisc{DISC_NO}/")
+    ALLXML_URL = urljoin(BASE, "ALLXML/")
+    XML_NAME = f"MedicosConsultantsExport_{DISC_NO}.xml"
+    OUT_DIR = os.path.join(out_root, f"PillProjectDisc{DISC_NO}")
+    SLEEP = sleep
+    HEADERS["Referer"] = BASE
+
+def parse_args_from_cli():
+    import argparse
+    p = argparse.ArgumentParser(description="Sequential downloader for one PillProjectDisc")
+    p.add_argument("--base", default=BASE, help="server root (default: NLM Pills)")
+    p.add_argument("--disc", type=int, default=DISC_NO)
+    p.add_argument("--out", default=OUT_ROOT, help="output root directory")
+    p.add_argument("--sleep", type=float, default=SLEEP, help="delay between files (seconds)")
+    return p.parse_args()
+
+def parse_content_range(value):
+    """'bytes 100-199/1000' -> (100, 1000), 'bytes */1000' -> (None, 1000)"""
+    if not value or not value.startswith("bytes "):
+        return None, None
+    span, _, total = value[6:].partition("/")
+    start = int(span.split("-")[0]) if span and span != "*" else None
+    return start, (int(total) if total.isdigit() else None)
+
 def download(url: str, out_path: str, sess: requests.Session) -> bool:
+    """โหลดลง out_path + ".part" แล้ว rename เมื่อขนาดครบ (รอบถัดไป resume ด้วย Range)"""
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    part = out_path + PART_SUFFIX
     for i in range(RETRY):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = dict(HEADERS, **{"Accept-Encoding": "identity"})
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
         try:
-            with sess.get(url, headers=HEADERS, stream=True, timeout=TIMEOUT) as r:
-                if r.status_code != 200:
+            with sess.get(url, headers=headers, stream=True, timeout=TIMEOUT) as r:
+                if r.status_code == 416 and offset:
+                    _, total = parse_content_range(r.headers.get("Content-Range"))
+                    if total == offset:
+                        os.replace(part, out_path)
+                        return True
+                    os.remove(part)
+                    raise RuntimeError("range not satisfiable → restart")
+                if r.status_code == 206:
+                    start, _ = parse_content_range(r.headers.get("Content-Range"))
+                    if start != offset:
+                        os.remove(part)
+                        raise RuntimeError("unexpected Content-Range → restart")
+                elif r.status_code == 200:
+                    offset = 0
+                else:
                     raise RuntimeError(f"status={r.status_code}")
-                with open(out_path, "wb") as f:
+                length = r.headers.get("Content-Length")
+                expected = offset + int(length) if length and length.isdigit() else None
+                with open(part, "ab" if offset else "wb") as f:
                     for chunk in r.iter_content(1024*64):
                         if chunk: f.write(chunk)
+            size = os.path.getsize(part)
+            if expected is not None and size != expected:
+                raise RuntimeError(f"short read {size}/{expected} bytes")
+            os.replace(part, out_path)
             return True
         except Exception as e:
             print(f"  [retry {i+1}/{RETRY}] {os.path.basename(out_path)} -> {e}")
@@ -52,13 +109,7 @@ def list_links(url: str, sess: requests.Session):
             r = sess.get(u, headers=HEADERS, timeout=TIMEOUT)
             if r.status_code != 200 or not r.text:
                 continue
-            soup = BeautifulSoup(r.text, "html.parser")
-            for a in soup.find_all("a", href=True):
-                href = a["href"]
-                if href.startswith("#") or href.startswith("?"): 
-                    continue
-                full = urljoin(url, href)
-                files.append(full)
+            files = [e.url for e in parse_listing(r.text, url)]
             if files:
                 break
         except requests.RequestException:
@@ -66,6 +117,7 @@ def list_links(url: str, sess: requests.Session):
     return files
 
 def main():
+    os.makedirs(OUT_DIR, exist_ok=True)
     sess = requests.Session()
 
     # 1) ดาวน์โหลด XML (ลองที่โฟลเดอร์โครงการก่อน แล้วค่อย fallback ALLXML)
@@ -112,4 +164,7 @@ def main():
     print("\n✅ เสร็จสิ้น — ดูไฟล์ที่:", os.path.abspath(OUT_DIR))
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        args = parse_args_from_cli()
+        configure(args.base, args.disc, args.out, args.sleep)
     main()
\ No newline at end of file
@@ -1,11 +1,23 @@
 #!/usr/bin/env python3
-import asyncio, os, time, sys
+import asyncio, json, os, time, sys
+from dataclasses import dataclass
 from urllib.parse import urljoin, urlparse
 from pathlib import Path
 
 import aiohttp
 from aiohttp import ClientSession, TCPConnector, ClientTimeout
-from bs4 import BeautifulSoup
+
+from blob_store import BLOB_DIR, BlobStore, hash_file, new_hasher, print_report
+from blob_store import report as dedup_report
+from crawl_claims import (CLAIMS_NAME, HEARTBEAT_EVERY, ClaimFile, coverage, home_shard,
+                          merge_manifests, parse_shard, print_coverage, remove_manifests, reset_claims,
+                          shard_manifest_path, shard_manifests, shard_tag)
+from crawl_control import (AdaptiveLimiter, CONGESTION_STATUS, backoff_delay,
+                           parse_retry_after)
+from crawl_metrics import LiveProgress, metrics, trace_config
+from crawl_manifest import CrawlManifest, MANIFEST_NAME
+from disk_writer import DiskWriter, DISK_THREADS
+from listing_parser import DEFAULT_PARSER, PARSERS, Entry, parse_listing
 
 # ========= ปรับค่าได้ =========
 BASE = "https://data.lhncbc.nlm.nih.gov/public/Pills/"
@@ -20,9 +32,15 @@ HEADERS = {
 }
 TIMEOUT = ClientTimeout(total=0, connect=30, sock_connect=30, sock_read=120)  # no global total timeout
 CHUNK = 1024 * 256                       # 256KB/ชิ้น (ใหญ่ขึ้น = เร็วขึ้น)
-CONC_IMAGE = 16                          # ดาว์นโหลดรูปพร้อมกันกี่ไฟล์ (แนะนำ 12–24)
+CONC_IMAGE = 16                          # ดาว์นโหลดรูปพร้อมกันกี่ไฟล์ตอนเริ่ม (ปรับเองอัตโนมัติ)
+CONC_MIN, CONC_MAX = 2, 64               # ขอบเขตที่ตัวปรับ AIMD ขยับได้
 RETRY = 3                                # ครั้งที่ retry ต่อไฟล์
-PER_JOB_DELAY = 0.0                      # delay เล็กน้อยต่อไฟล์ (สุภาพกับ server)
+LIST_AHEAD = 2                           # ลิสต์ images/ ของ disc ถัดไปล่วงหน้ากี่ disc
+METRICS_NAME = "crawl_metrics"           # OUT/crawl_metrics.json + .prom
+QUEUE_FACTOR = 4                         # ขนาดคิวงาน = concurrency * QUEUE_FACTOR (คุม memory)
+LISTING_PARSER = DEFAULT_PARSER          # fast | lxml | bs4 (ดู listing_parser.py)
+PARSE_IN_THREAD = 256 * 1024             # หน้า listing ใหญ่กว่านี้ (bytes) parse ใน thread
+PART_SUFFIX = ".part"                    # ไฟล์ที่ยังโหลดไม่ครบ (resume ด้วย HTTP Range)
 IMAGE_EXTS = (".jpg",".jpeg",".png",".gif",".bmp",".tif",".tiff",".webp")
 # เลือกโหลดชุดเดียวหรือช่วง
 DISC = None                              # เช่น 7  (ตั้งค่านี้ หรือใช้ START/END ข้างล่าง)
@@ -37,144 +55,631 @@ def parse_args_from_cli():
     g.add_argument("--disc", type=int, help="single disc number (e.g., 7)")
     g.add_argument("--range", nargs=2, type=int, metavar=("START","END"), help="disc range inclusive")
     p.add_argument("--out", default=str(OUT_ROOT), help="output root directory")
-    p.add_argument("--concurrency", type=int, default=CONC_IMAGE, help="parallel image downloads")
+    p.add_argument("--base", default=BASE, help="server root (default: NLM Pills; e.g. a local stand-in)")
+    p.add_argument("--concurrency", type=int, default=CONC_IMAGE,
+                   help="initial parallel image downloads (adjusted at runtime)")
+    p.add_argument("--max-concurrency", type=int, default=CONC_MAX,
+                   help="upper bound for adaptive concurrency (= --concurrency to pin it)")
     p.add_argument("--retry", type=int, default=RETRY, help="retries per file")
     p.add_argument("--chunk", type=int, default=CHUNK, help="chunk size in bytes")
+    p.add_argument("--disk-threads", type=int, default=DISK_THREADS,
+                   help="threads for file writes/renames (keeps disk stalls off the event loop)")
+    p.add_argument("--parser", choices=sorted(PARSERS), default=LISTING_PARSER,
+                   help="directory-listing parser")
+    p.add_argument("--no-dedup", action="store_true",
+                   help=f"store every copy instead of hardlinking identical files to OUT/{BLOB_DIR}")
+    p.add_argument("--metrics", help="metrics output base path; writes .json and .prom "
+                                     "(default: OUT/crawl_metrics)")
+    p.add_argument("--manifest", help=f"crawl manifest path (default: OUT/{MANIFEST_NAME})")
+    p.add_argument("--verify", action="store_true",
+                   help="re-list every disc and re-download files missing/size-mismatched on disk")
+    p.add_argument("--dry-run", action="store_true",
+                   help="list discs and print what would be downloaded, without downloading")
+    p.add_argument("--shard", type=parse_shard, metavar="I/N",
+                   help=f"crawl shard I of N (0-based, e.g. one per machine); discs are claimed through "
+                        f"OUT/{CLAIMS_NAME} so shards that die are picked up by the others")
+    p.add_argument("--workers", type=int, default=1,
+                   help="local crawler processes, each with its own session/connector "
+                        "(with --shard I/N they run as shards I*K..I*K+K-1 of N*K)")
+    p.add_argument("--merge", action="store_true",
+                   help="merge per-shard manifests into the main manifest and check every disc is complete")
     args = p.parse_args()
     return args
 
-async def fetch_text(session: ClientSession, url: str) -> str | None:
+async def fetch_text(session: ClientSession, url: str,
+                     headers: dict | None = None) -> tuple[str | None, int, dict]:
+    """คืน (text, status, response headers) — status 304 = ไม่เปลี่ยนตั้งแต่ครั้งก่อน (text=None)"""
     for i in range(RETRY):
         try:
-            async with session.get(url) as r:
+            async with session.get(url, headers=headers) as r:
+                metrics.inc("http_responses_total", kind="listing", status=r.status)
+                if r.status == 304:
+                    return None, 304, r.headers.copy()
                 if r.status != 200:
                     # list ผ่าน index.html เท่านั้น
-                    await asyncio.sleep(0.4*(i+1))
+                    retry_after = parse_retry_after(r.headers.get("Retry-After"))
+                    await asyncio.sleep(backoff_delay(i, retry_after))
                     continue
-                return await r.text()
-        except Exception:
-            await asyncio.sleep(0.4*(i+1))
-    return None
+                return await r.text(), 200, r.headers.copy()
+        except Exception as e:
+            metrics.inc("http_responses_total", kind="listing", status=type(e).__name__)
+            await asyncio.sleep(backoff_delay(i))
+    return None, 0, {}
+
+@dataclass
+class Listing:
+    entries: list[Entry]
+    etag: str | None = None
+    last_modified: str | None = None
+    not_modified: bool = False
 
-async def list_links(session: ClientSession, url: str) -> list[str]:
+async def list_links(session: ClientSession, url: str,
+                     etag: str | None = None, last_modified: str | None = None) -> Listing:
+    with metrics.timer("listing_seconds"):
+        return await _list_links(session, url, etag, last_modified)
+
+async def _list_links(session: ClientSession, url: str,
+                      etag: str | None, last_modified: str | None) -> Listing:
     # ทั้ง dir/ และ dir/index.html
+    cond = {}
+    if etag:
+        cond["If-None-Match"] = etag
+    if last_modified:
+        cond["If-Modified-Since"] = last_modified
     for candidate in (url, urljoin(url, "index.html")):
-        html = await fetch_text(session, candidate)
+        html, status, headers = await fetch_text(session, candidate, cond or None)
+        if status == 304:
+            return Listing([], etag, last_modified, not_modified=True)
         if not html:
             continue
-        soup = BeautifulSoup(html, "html.parser")
-        links = []
-        for a in soup.find_all("a", href=True):
-            href = a["href"]
-            if href.startswith("#") or href.startswith("?"):
-                continue
-            links.append(urljoin(url, href))
-        if links:
-            return links
-    return []
-
-async def download(session: ClientSession, url: str, out_path: Path, sem: asyncio.Semaphore) -> bool:
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    async with sem:
-        for i in range(RETRY):
+        # หน้าใหญ่ (images/ หลายพันไฟล์) parse ใน thread — ไม่ให้ loop ค้างระหว่างนั้น
+        if len(html) > PARSE_IN_THREAD:
+            entries = await asyncio.to_thread(parse_listing, html, url, LISTING_PARSER)
+        else:
+            entries = parse_listing(html, url, LISTING_PARSER)
+        if entries:
+            return Listing(entries, headers.get("ETag"), headers.get("Last-Modified"))
+    return Listing([])
+
+def part_path(out_path: Path) -> Path:
+    return out_path.with_name(out_path.name + PART_SUFFIX)
+
+def parse_content_range(value: str | None) -> tuple[int | None, int | None]:
+    """'bytes 100-199/1000' -> (100, 1000), 'bytes */1000' -> (None, 1000)"""
+    if not value or not value.startswith("bytes "):
+        return None, None
+    span, _, total = value[6:].partition("/")
+    start = int(span.split("-")[0]) if span and span != "*" else None
+    return start, (int(total) if total.isdigit() else None)
+
+class TransferError(Exception):
+    def __init__(self, msg: str, congested: bool = False, retry_after: float | None = None,
+                 reason: str = "other"):
+        super().__init__(msg)
+        self.reason = reason          # ป้ายกำกับของ retries_total
+        self.congested = congested
+        self.retry_after = retry_after
+
+async def fetch_part(session: ClientSession, url: str, part: Path,
+                     limiter: AdaptiveLimiter, writer: DiskWriter) -> str | None:
+    """request หนึ่งครั้ง ต่อท้าย .part (Range) — .part ครบแล้วคืน sha256, ยังไม่ครบคืน None"""
+    offset = await writer.size(part)
+    headers = {"Accept-Encoding": "identity"}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+    t0 = time.perf_counter()
+    async with limiter:
+        t1 = time.perf_counter()
+        metrics.observe("limiter_wait_seconds", t1 - t0)
+        async with session.get(url, headers=headers) as r:
+            t2 = time.perf_counter()
+            metrics.observe("ttfb_seconds", t2 - t1)
+            metrics.inc("http_responses_total", kind="file", status=r.status)
+            if r.status == 416 and offset:
+                # .part อาจครบแล้วแต่ยังไม่ได้ rename (รอบก่อนหลุดตรงนั้นพอดี)
+                _, total = parse_content_range(r.headers.get("Content-Range"))
+                if total == offset:
+                    return (await writer.run(hash_file, part)).hexdigest()
+                await writer.run(part.unlink, True)
+                raise TransferError("range not satisfiable → restart", reason="416")
+            if r.status in CONGESTION_STATUS:
+                raise TransferError(f"status={r.status}", congested=True,
+                                    retry_after=parse_retry_after(r.headers.get("Retry-After")),
+                                    reason=str(r.status))
+            if r.status not in (200, 206):
+                raise TransferError(f"status={r.status}", reason=str(r.status))
+            if r.status == 206:
+                start, _ = parse_content_range(r.headers.get("Content-Range"))
+                if start != offset:
+                    await writer.run(part.unlink, True)
+                    raise TransferError("unexpected Content-Range → restart", reason="bad_range")
+            else:
+                offset = 0            # server ไม่รับ Range → เริ่มใหม่ทั้งไฟล์
+            expected = offset + r.content_length if r.content_length is not None else None
+            # hash ระหว่างสตรีม (resume: hash ส่วนที่มีอยู่ใน .part ก่อน)
+            hasher = (await writer.run(hash_file, part, offset)) if offset else new_hasher()
+            # stream to file — เขียนจริงใน thread ของ writer, loop อ่าน chunk ถัดไปได้เลย
+            disk_wait = 0.0
+            f = await writer.open(part, offset, expected)
             try:
-                async with session.get(url) as r:
-                    if r.status != 200:
-                        await asyncio.sleep(0.5*(i+1))
-                        continue
-                    # stream to file
-                    with open(out_path, "wb") as f:
-                        async for chunk in r.content.iter_chunked(CHUNK):
-                            if chunk:
-                                f.write(chunk)
-                if PER_JOB_DELAY:
-                    await asyncio.sleep(PER_JOB_DELAY)
-                return True
-            except Exception:
-                await asyncio.sleep(0.5*(i+1))
+                async for chunk in r.content.iter_chunked(CHUNK):
+                    if chunk:
+                        hasher.update(chunk)
+                        tw = time.perf_counter()
+                        await f.write(chunk)
+                        disk_wait += time.perf_counter() - tw
+                        limiter.record(len(chunk))
+                        metrics.inc("bytes_total", len(chunk))
+            finally:
+                tw = time.perf_counter()
+                await f.close()
+                disk_wait += time.perf_counter() - tw
+                metrics.observe("disk_wait_seconds", disk_wait)
+                metrics.observe("download_seconds", time.perf_counter() - t2)
+    size = offset + f.written
+    if expected is not None and size != expected:
+        print(f"  [part] {part.name}: {size}/{expected} bytes → resume")
+        metrics.inc("retries_total", reason="short_read")
+        return None
+    return hasher.hexdigest()
+
+async def download(session: ClientSession, url: str, out_path: Path, limiter: AdaptiveLimiter,
+                   writer: DiskWriter, store: BlobStore | None = None) -> str | None:
+    """โหลดสำเร็จคืน sha256 ของไฟล์, ไม่สำเร็จคืน None"""
+    # เขียนลง .part ก่อน ครบขนาดแล้วค่อย rename → ไฟล์ปลายทางที่มีอยู่ = โหลดครบแน่นอน
+    await writer.ensure_dirs([out_path.parent])
+    part = part_path(out_path)
+    for i in range(RETRY):
+        retry_after = None
+        try:
+            digest = await fetch_part(session, url, part, limiter, writer)
+            if digest:
+                if store is not None:
+                    # เก็บตัวจริงใน store แล้วลิงก์มาที่ out_path (รูปซ้ำข้าม disc ใช้ไฟล์เดียวกัน)
+                    await writer.run(store.adopt, part, out_path, digest)
+                else:
+                    await writer.run(os.replace, part, out_path)
+                return digest
+        except TransferError as e:
+            metrics.inc("retries_total", reason=e.reason)
+            if e.congested:
+                limiter.congestion(e.retry_after)
+            retry_after = e.retry_after
+        except asyncio.TimeoutError:
+            metrics.inc("retries_total", reason="timeout")
+            limiter.congestion()
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError):
+            metrics.inc("retries_total", reason="connection")
+            limiter.congestion()
+        except Exception as e:
+            metrics.inc("retries_total", reason=type(e).__name__)
+        # รอนอก slot ของ limiter — งานอื่นใช้ slot ต่อได้ระหว่าง backoff
+        await asyncio.sleep(backoff_delay(i, retry_after))
     print(f"  [ERR ] {out_path.name} <- {url}")
-    return False
+    return None
+
+@dataclass
+class Job:
+    """งานดาวน์โหลด 1 ไฟล์ — urls เรียงตามลำดับที่จะลอง (ตัวแรกไม่ได้ → fallback ตัวถัดไป)"""
+    disc_no: int
+    urls: tuple[str, ...]
+    dest: Path
+    remote_size: int | None = None          # ขนาดตาม listing (ถ้ามีคอลัมน์ size)
+    remote_modified: str | None = None
+
+class CrawlProgress:
+    """นับงานค้างต่อ disc เพื่อบอกว่า disc ไหนเสร็จแล้ว (งานจากหลาย disc วิ่งปนกันในคิวเดียว)"""
+
+    def __init__(self):
+        self.pending: dict[int, int] = {}
+        self.listed: set[int] = set()
+        self.started: dict[int, float] = {}
+        self.disc_bytes: dict[int, int] = {}
+        self.disc_failed: dict[int, int] = {}
+        self.active: set[int] = set()
+        self.on_disc_done = None          # callback(disc, จำนวนไฟล์ที่ล้ม, วินาที) — ใช้ปิด claim ตอน --shard
+        self.queued = 0
+        self.done = 0
+        self.failed = 0
+
+    def start_disc(self, disc_no: int):
+        self.started[disc_no] = time.perf_counter()
+        self.active.add(disc_no)
+
+    def add(self, job: Job):
+        self.pending[job.disc_no] = self.pending.get(job.disc_no, 0) + 1
+        self.queued += 1
+
+    def finish(self, job: Job, ok: bool, size: int = 0):
+        self.done += 1
+        if not ok:
+            self.failed += 1
+            self.disc_failed[job.disc_no] = self.disc_failed.get(job.disc_no, 0) + 1
+        metrics.inc("files_total", result="ok" if ok else "failed")
+        self.disc_bytes[job.disc_no] = self.disc_bytes.get(job.disc_no, 0) + size
+        self.pending[job.disc_no] -= 1
+        self._check_disc(job.disc_no)
+
+    def listing_done(self, disc_no: int):
+        self.listed.add(disc_no)
+        self._check_disc(disc_no)
+
+    def _check_disc(self, disc_no: int):
+        if disc_no in self.listed and not self.pending.get(disc_no):
+            self.pending.pop(disc_no, None)
+            dt = time.perf_counter() - self.started.get(disc_no, time.perf_counter())
+            nbytes = self.disc_bytes.pop(disc_no, 0)
+            metrics.set("disc_seconds", round(dt, 3), disc=disc_no)
+            metrics.set("disc_bytes", nbytes, disc=disc_no)
+            print(f"  [DONE] disc {disc_no}  {nbytes / 1e6:.1f} MB / {dt:.1f}s"
+                  f"  ({nbytes / 1e6 / max(dt, 1e-6):.2f} MB/s)")
+            self.active.discard(disc_no)
+            if self.on_disc_done:
+                self.on_disc_done(disc_no, self.disc_failed.pop(disc_no, 0), dt)
+
+@dataclass
+class Crawl:
+    """state ที่ใช้ร่วมกันทั้งรอบ (ส่งต่อให้ทุก coroutine แทนการโยนพารามิเตอร์ทีละตัว)"""
+    session: ClientSession
+    queue: asyncio.Queue
+    progress: CrawlProgress
+    manifest: CrawlManifest
+    limiter: AdaptiveLimiter
+    writer: DiskWriter
+    store: BlobStore | None
+    out_root: Path
+    verify: bool = False
+    dry_run: bool = False
+
+    async def submit(self, job: Job):
+        if self.dry_run:
+            return
+        self.manifest.add_pending(job.disc_no, job.urls[0], job.dest,
+                                  job.remote_size, job.remote_modified)
+        self.progress.add(job)
+        await self.queue.put(job)
+
+def is_done(states: dict, url: str, dest: Path, crawl: Crawl, disc_no: int,
+            entry: Entry | None = None) -> bool:
+    """ดูจาก manifest ก่อน; ไฟล์ที่ยังไม่อยู่ใน manifest (โหลดไว้ก่อนมี manifest) stat ครั้งเดียวแล้วบันทึก"""
+    st = states.get(url)
+    if st is not None:
+        if entry is not None and entry.size_exact and st[1] is not None and entry.size != st[1]:
+            return False          # ขนาดบน server ไม่ตรงกับที่โหลดไว้ → ไฟล์เปลี่ยน
+        return st[3] == "done"
+    try:
+        fst = dest.stat()
+    except OSError:
+        return False
+    if not crawl.dry_run:
+        crawl.manifest.mark_done(disc_no, url, dest, fst.st_size, fst.st_mtime)
+    return True
 
-async def download_xml(session: ClientSession, disc_no: int, out_dir: Path):
+async def download_xml(crawl: Crawl, disc_no: int, out_dir: Path, states: dict):
     xml_name = f"MedicosConsultantsExport_{disc_no}.xml"
     xml_from_disc = urljoin(urljoin(BASE, f"PillProjectDisc{disc_no}/"), xml_name)
     xml_from_all  = urljoin(ALLXML_URL, xml_name)
     out_path = out_dir / xml_name
-    if out_path.exists():
+    if is_done(states, xml_from_disc, out_path, crawl, disc_no):
         print(f"[SKIP] {xml_name}")
         return
-    sem = asyncio.Semaphore(1)
     print(f"[XML ] {xml_name}")
-    ok = await download(session, xml_from_disc, out_path, sem)
-    if not ok:
-        print("  [warn] จากโฟลเดอร์โครงการไม่ได้ → ลอง ALLXML/")
-        ok2 = await download(session, xml_from_all, out_path, sem)
-        if not ok2:
-            print("  [ERR ] โหลด XML ไม่สำเร็จจากทั้งสองจุด")
+    await crawl.submit(Job(disc_no, (xml_from_disc, xml_from_all), out_path))
 
-async def download_images(session: ClientSession, disc_no: int, out_dir: Path):
+async def download_images(crawl: Crawl, disc_no: int, out_dir: Path, states: dict):
     images_url = urljoin(urljoin(BASE, f"PillProjectDisc{disc_no}/"), "images/")
-    links = await list_links(session, images_url)
-    if not links:
-        print("  [WARN] ลิสต์ images/ ไม่ได้ (ถูกบล็อกหรือไม่มี index)")
+    etag = last_modified = None
+    if not crawl.verify and crawl.manifest.disc_complete(disc_no):
+        etag, last_modified = crawl.manifest.disc_validators(disc_no)
+    listing = await list_links(crawl.session, images_url, etag, last_modified)
+    if listing.not_modified:
+        print(f"  [SKIP] disc {disc_no}: images/ ไม่เปลี่ยน (304)")
+        if not crawl.dry_run:
+            crawl.manifest.touch_disc(disc_no)
+        return
+    if not listing.entries:
+        print(f"  [WARN] disc {disc_no}: ลิสต์ images/ ไม่ได้ (ถูกบล็อกหรือไม่มี index)")
         return
-    file_urls = [u for u in links
-                 if not u.endswith("/")
-                 and urlparse(u).path.lower().endswith(IMAGE_EXTS)]
-    print(f"  [IMGS] พบ {len(file_urls)} ไฟล์ — concurrent={CONC_IMAGE}")
-    sem = asyncio.Semaphore(CONC_IMAGE)
-    tasks = []
+    files = [e for e in listing.entries
+             if not e.url.endswith("/")
+             and urlparse(e.url).path.lower().endswith(IMAGE_EXTS)]
+    print(f"  [IMGS] disc {disc_no}: พบ {len(files)} ไฟล์")
     img_dir = out_dir / "images"
-    for u in file_urls:
-        name = os.path.basename(urlparse(u).path)
+    # ใส่คิวทีละงาน — คิวมีขนาดจำกัด ถ้าเต็ม producer จะรอ (memory ไม่โตตามจำนวนไฟล์)
+    new = 0
+    for e in files:
+        name = os.path.basename(urlparse(e.url).path)
         dest = img_dir / name
-        if dest.exists():
+        if is_done(states, e.url, dest, crawl, disc_no, e):
             continue
-        tasks.append(download(session, u, dest, sem))
-    done = 0
-    for coro in asyncio.as_completed(tasks):
-        await coro
-        done += 1
-        if done and done % 30 == 0:
-            print(f"    [PROG] {done}/{len(tasks)}")
-
-async def crawl_disc(session: ClientSession, disc_no: int, out_root: Path):
-    out_dir = out_root / f"PillProjectDisc{disc_no}"
-    out_dir.mkdir(parents=True, exist_ok=True)
+        new += 1
+        await crawl.submit(Job(disc_no, (e.url,), dest, e.size, e.modified))
+    if crawl.dry_run:
+        listed = {e.url for e in files}
+        gone = [u for u in states if u not in listed and "/images/" in u]
+        print(f"  [DIFF] disc {disc_no}: ต้องโหลด {new}  มีแล้ว {len(files) - new}"
+              f"  หายจาก server {len(gone)}")
+        return
+    crawl.manifest.save_listing(disc_no, images_url, listing.etag, listing.last_modified, len(files))
+
+async def crawl_disc(crawl: Crawl, disc_no: int):
+    out_dir = crawl.out_root / f"PillProjectDisc{disc_no}"
+    if not crawl.dry_run:
+        await crawl.writer.ensure_dirs([out_dir, out_dir / "images"])
     print(f"\n[DISC] {disc_no}")
-    await download_xml(session, disc_no, out_dir)
-    await download_images(session, disc_no, out_dir)
+    crawl.progress.start_disc(disc_no)
+    if crawl.verify:             # dry-run: manifest เป็นสำเนาในหน่วยความจำ → ตรวจได้โดยไม่แตะไฟล์จริง
+        bad = crawl.manifest.verify_disc(disc_no)
+        if bad:
+            print(f"  [VRFY] disc {disc_no}: {bad} ไฟล์หาย/ขนาดไม่ตรง → โหลดใหม่")
+    states = crawl.manifest.file_states(disc_no)
+    quarantined = sum(1 for st in states.values() if st[3] == "quarantined")
+    if quarantined:
+        print(f"  [QUAR] disc {disc_no}: {quarantined} ไฟล์ถูกกักไว้ (validate_images.py) → โหลดใหม่")
+    await download_xml(crawl, disc_no, out_dir, states)
+    await download_images(crawl, disc_no, out_dir, states)
+    crawl.progress.listing_done(disc_no)
+
+async def list_worker(crawl: Crawl, next_disc):
+    # หยิบ disc ถัดไปตามลำดับ — มี LIST_AHEAD ตัวทำงานพร้อมกัน จึงลิสต์ disc ถัดไปไว้ล่วงหน้า
+    while (disc_no := await next_disc()) is not None:
+        await crawl_disc(crawl, disc_no)
+
+async def download_worker(crawl: Crawl):
+    while True:
+        job = await crawl.queue.get()
+        try:
+            if job is None:
+                return
+            digest = None
+            for i, url in enumerate(job.urls):
+                if i:
+                    print(f"  [warn] {job.dest.name}: จากที่แรกไม่ได้ → ลอง {url}")
+                digest = await download(crawl.session, url, job.dest, crawl.limiter, crawl.writer,
+                                        crawl.store)
+                if digest:
+                    break
+            ok = digest is not None
+            size = 0
+            if ok:
+                st = await crawl.writer.run(os.stat, job.dest)
+                size = st.st_size
+                crawl.manifest.mark_done(job.disc_no, job.urls[0], job.dest, st.st_size, st.st_mtime,
+                                         digest)
+            else:
+                crawl.manifest.set_status(job.urls[0], "failed")
+                if len(job.urls) > 1:
+                    print(f"  [ERR ] {job.dest.name}: โหลดไม่สำเร็จจากทุกจุด")
+            crawl.progress.finish(job, ok, size)
+        finally:
+            crawl.queue.task_done()
+
+def listed_discs(discs: list[int]):
+    it = iter(discs)
+
+    async def next_disc():
+        return next(it, None)
+    return next_disc
 
-async def main_async(discs: list[int], out_root: Path, concurrency: int, chunk: int, retry: int):
+def claimed_discs(claims: ClaimFile, manifest: CrawlManifest, seed: Path | None = None):
+    """disc ถัดไปจาก claim file — ของ shard ตัวเองก่อน แล้วค่อยรับงานค้างของ shard ที่ตาย
+    seed = manifest หลัก: แถวของ disc ที่จองได้ (รวมสถานะ quarantined) ถูกคัดลอกมาก่อนเริ่ม
+    flock + อ่าน/เขียน JSON บนไดรฟ์แชร์อาจค้างนาน → ทำในเธรด ไม่บล็อก event loop (การโหลดเดินต่อได้)"""
+    async def next_disc():
+        got = await asyncio.to_thread(claims.claim_next)
+        if got is None:
+            return None
+        disc_no, why = got
+        if why != "own":
+            print(f"[CLAM] รับ disc {disc_no} ต่อ ({why})")
+        if seed is not None:
+            manifest.seed_disc(seed, disc_no)
+        return disc_no
+    return next_disc
+
+async def heartbeat(claims: ClaimFile, progress: CrawlProgress):
+    while True:
+        await asyncio.sleep(HEARTBEAT_EVERY)
+        await asyncio.to_thread(claims.heartbeat, list(progress.active))
+
+async def main_async(discs: list[int], out_root: Path, concurrency: int, chunk: int, retry: int,
+                     verify: bool = False, dry_run: bool = False, manifest_path: Path | None = None,
+                     max_concurrency: int = CONC_MAX, disk_threads: int = DISK_THREADS,
+                     dedup: bool = True, metrics_path: Path | None = None,
+                     claims: ClaimFile | None = None, label: str = "", live_tty: bool | None = None,
+                     seed_manifest: Path | None = None):
     global CONC_IMAGE, CHUNK, RETRY
     CONC_IMAGE, CHUNK, RETRY = concurrency, chunk, retry
+    max_concurrency = max(concurrency, max_concurrency)
 
-    connector = TCPConnector(limit=concurrency*2, ttl_dns_cache=300)
-    async with aiohttp.ClientSession(headers=HEADERS, timeout=TIMEOUT, connector=connector) as session:
+    manifest = CrawlManifest(manifest_path or out_root / MANIFEST_NAME, readonly=dry_run)
+    limiter = AdaptiveLimiter(concurrency, min_limit=min(CONC_MIN, concurrency), max_limit=max_concurrency)
+    writer = DiskWriter(disk_threads)
+    connector = TCPConnector(limit=max_concurrency*2, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(headers=HEADERS, timeout=TIMEOUT, connector=connector,
+                                     trace_configs=[trace_config()]) as session:
         t0 = time.time()
-        for n in discs:
-            await crawl_disc(session, n, out_root)
+        # คิวงานเดียวทั้งช่วง: ทุก disc ป้อนงานเข้าคิวนี้ แล้ว worker ช่วยกันดึงไปโหลด
+        # (worker มี max_concurrency ตัว แต่ limiter เป็นตัวกำหนดว่าวิ่งพร้อมกันได้จริงกี่ตัว)
+        crawl = Crawl(session, asyncio.Queue(maxsize=max_concurrency * QUEUE_FACTOR), CrawlProgress(),
+                      manifest, limiter, writer, BlobStore(out_root) if dedup else None, out_root,
+                      verify=verify, dry_run=dry_run)
+        mode = " (dry-run)" if dry_run else (" (verify)" if verify else "")
+        mode += f" (shard {label})" if label else ""
+        print(f"[RUN ] discs={len(discs)}  concurrent={concurrency}..{max_concurrency}"
+              f"  list-ahead={LIST_AHEAD}{mode}")
+        workers = [asyncio.create_task(download_worker(crawl)) for _ in range(max_concurrency)]
+        live = LiveProgress(crawl.progress, limiter, label=label, tty=live_tty)
+        extra = [asyncio.create_task(live.run())]
+        if claims:
+            # disc มาจาก claim file ทีละตัว (ไม่ใช่ทั้งช่วง) → process ที่ตายไป คนอื่นรับต่อได้
+            finishing = set()
+
+            def on_disc_done(d, failed, dt):
+                t = asyncio.ensure_future(asyncio.to_thread(claims.finish, d, failed, dt))
+                finishing.add(t)
+                t.add_done_callback(finishing.discard)
+            crawl.progress.on_disc_done = on_disc_done
+            next_disc = claimed_discs(claims, manifest, seed_manifest)
+            extra.append(asyncio.create_task(heartbeat(claims, crawl.progress)))
+        else:
+            next_disc = listed_discs(discs)
+        listers = [asyncio.create_task(list_worker(crawl, next_disc))
+                   for _ in range(min(LIST_AHEAD, len(discs)) or 1)]
+        try:
+            await asyncio.gather(*listers)
+            for _ in workers:
+                await crawl.queue.put(None)
+            await asyncio.gather(*workers)
+            if claims:
+                await asyncio.gather(*finishing)      # ปิด claim ของ disc สุดท้ายให้เสร็จก่อน release
+        finally:
+            for t in listers + workers + extra:
+                t.cancel()
+            live.close()
+            writer.close()
+            manifest.close()
+            if claims:
+                claims.release()
         dt = time.time() - t0
+        progress = crawl.progress
+        print(f"\n[SUM ] ไฟล์ {progress.done}/{progress.queued}  ผิดพลาด {progress.failed}"
+              f"  concurrency สุดท้าย {int(limiter.limit)}")
+        if dedup and not dry_run:
+            print_report(dedup_report(out_root, manifest_path))
+        print_metrics_summary(dt)
+        if not dry_run:        # dry-run แค่รายงาน ไม่เขียนอะไรลง output root
+            metrics_path = metrics_path or out_root / METRICS_NAME
+            metrics.write(metrics_path)
+            print(f"[MET ] {metrics_path.with_suffix('.json')}, {metrics_path.with_suffix('.prom')}")
         print(f"\n เสร็จสิ้นทั้งหมด — ใช้เวลา {dt:.1f}s  | output: {out_root.resolve()}")
 
+def print_metrics_summary(elapsed: float):
+    nbytes = metrics.counter("bytes_total")
+    print(f"[NET ] {nbytes / 1e6:,.1f} MB  เฉลี่ย {nbytes / 1e6 / max(elapsed, 1e-6):.2f} MB/s")
+    for name in ("listing_seconds", "limiter_wait_seconds", "pool_wait_seconds", "ttfb_seconds",
+                 "download_seconds", "disk_wait_seconds"):
+        for h in metrics.histograms.get(name, {}).values():
+            print(f"  {name:<22} n={h.count:<7} total={h.sum:8.1f}s  "
+                  f"p50={h.quantile(0.5) * 1000:.0f}ms  p99={h.quantile(0.99) * 1000:.0f}ms")
+    retries = metrics.counters.get("retries_total", {})
+    if retries:
+        print("  retries: " + ", ".join(f"{dict(k)['reason']}={int(v)}" for k, v in sorted(retries.items())))
+
+def set_base(base: str):
+    global BASE, ALLXML_URL
+    BASE = base if base.endswith("/") else base + "/"
+    ALLXML_URL = urljoin(BASE, "ALLXML/")
+    HEADERS["Referer"] = BASE
+
 def resolve_discs():
+    global LISTING_PARSER
     # จากค่าคงที่ด้านบน หรือจาก CLI
     if len(sys.argv) > 1:
         args = parse_args_from_cli()
+        LISTING_PARSER = args.parser
+        set_base(args.base)
         out = Path(args.out)
+        opts = dict(verify=args.verify, dry_run=args.dry_run, max_concurrency=args.max_concurrency,
+                    disk_threads=args.disk_threads, dedup=not args.no_dedup,
+                    metrics_path=Path(args.metrics) if args.metrics else None,
+                    manifest_path=Path(args.manifest) if args.manifest else None,
+                    shard=args.shard, workers=max(1, args.workers), merge=args.merge)
         if args.disc is not None:
-            return [args.disc], out, args.concurrency, args.chunk, args.retry
+            return [args.disc], out, args.concurrency, args.chunk, args.retry, opts
         elif args.range:
             s, e = args.range
-            return list(range(s, e+1)), out, args.concurrency, args.chunk, args.retry
+            return list(range(s, e+1)), out, args.concurrency, args.chunk, args.retry, opts
         else:
             return ( [DISC] if DISC else list(range(START, END+1)),
-                     out, args.concurrency, args.chunk, args.retry )
+                     out, args.concurrency, args.chunk, args.retry, opts )
     else:
         # ใช้ค่าดีฟอลต์ในไฟล์
         discs = [DISC] if DISC else list(range(START, END+1))
-        return discs, OUT_ROOT, CONC_IMAGE, CHUNK, RETRY
+        return discs, OUT_ROOT, CONC_IMAGE, CHUNK, RETRY, {}
+
+def run_shard(i: int, n: int, discs: list[int], out_root: Path, conc: int, chunk: int, retry: int,
+              opts: dict, base: str, parser: str, live_tty: bool | None = None):
+    """crawl หนึ่ง shard ใน process นี้ — session/connector/manifest/metrics ของตัวเอง"""
+    global LISTING_PARSER
+    set_base(base)                        # process ที่ spawn มาไม่ได้ค่า global จาก CLI ของ parent
+    LISTING_PARSER = parser
+    tag = shard_tag(i, n)
+    opts = dict(opts)
+    main_manifest = opts.pop("manifest_path", None) or out_root / MANIFEST_NAME
+    # dry-run อ่าน manifest หลัก (ที่ merge แล้ว) — ไม่สร้างไฟล์ของ shard
+    if opts.get("dry_run"):
+        opts["manifest_path"] = main_manifest
+    else:
+        opts["manifest_path"] = shard_manifest_path(main_manifest.parent, main_manifest.name, i, n)
+        opts["seed_manifest"] = main_manifest
+    metrics_base = opts.pop("metrics_path", None) or out_root / METRICS_NAME
+    opts["metrics_path"] = metrics_base.with_name(f"{metrics_base.name}_{tag}")
+    claims = None
+    if opts.get("dry_run"):
+        discs = [d for d in discs if home_shard(discs, d, n) == i]     # ดูเฉยๆ ไม่จอง
+    else:
+        claims = ClaimFile(out_root / CLAIMS_NAME, discs, i, n)
+        try:
+            claims.check_range()
+        except RuntimeError as e:
+            print(f"[ERR ] {e}", file=sys.stderr)
+            sys.exit(2)
+    asyncio.run(main_async(discs, out_root, conc, chunk, retry, claims=claims, label=f"{i}/{n}",
+                           live_tty=live_tty, **opts))
+
+def run_sharded(discs: list[int], out_root: Path, conc: int, chunk: int, retry: int, opts: dict,
+                shard: tuple[int, int], workers: int) -> int:
+    i, n = shard
+    tags = [(i * workers + k, n * workers) for k in range(workers)]
+    if workers == 1:
+        run_shard(*tags[0], discs, out_root, conc, chunk, retry, opts, BASE, LISTING_PARSER)
+        failed = []
+    else:
+        import multiprocessing
+        ctx = multiprocessing.get_context("spawn")
+        procs = [ctx.Process(target=run_shard, name=shard_tag(si, sn),
+                             args=(si, sn, discs, out_root, conc, chunk, retry, opts, BASE, LISTING_PARSER,
+                                   False))
+                 for si, sn in tags]
+        for pr in procs:
+            pr.start()
+        for pr in procs:
+            pr.join()
+        failed = [pr.name for pr in procs if pr.exitcode]
+        if failed:
+            print(f"[ERR ] process ที่ล้ม: {', '.join(failed)} (disc ที่ค้างจะถูกรับต่อเมื่อรันอีกรอบ)")
+    if opts.get("dry_run"):
+        return 0
+    if n == 1:
+        # ทุก shard อยู่ในเครื่องนี้และจบแล้ว → merge + ตรวจความครบได้ทันที
+        return 0 if merge_run(discs, out_root, opts.get("manifest_path")) and not failed else 1
+    print(f"[INFO] shard {i}/{n} เสร็จ — เมื่อทุกเครื่องเสร็จแล้วรัน --merge ด้วยช่วง disc เดียวกัน")
+    return 1 if failed else 0
+
+def merge_run(discs: list[int], out_root: Path, manifest_path: Path | None = None) -> bool:
+    """รวม manifest ของทุก shard แล้วยืนยันว่าทุก disc ในช่วงครบ — disc ที่ไม่ครบถูกปลด claim ให้รันซ้ำได้"""
+    main_manifest = manifest_path or out_root / MANIFEST_NAME
+    parts = shard_manifests(main_manifest.parent, main_manifest.name)
+    rows = merge_manifests(main_manifest, parts)
+    remove_manifests(parts)
+    print(f"\n[MERG] รวม manifest {len(parts)} shard → {main_manifest} ({rows} แถว, ลบ manifest ของ shard แล้ว)")
+    claims_path = out_root / CLAIMS_NAME
+    claims = json.loads(claims_path.read_text(encoding="utf-8")).get("discs", {}) if claims_path.exists() else {}
+    cov = coverage(main_manifest, discs, claims)
+    ok = print_coverage(cov)
+    if not ok:
+        reset_claims(claims_path, [d for d, c in cov.items() if not c["ok"]])
+    elif claims_path.exists():
+        # ครบแล้ว → เก็บ claim file ไว้ดูย้อนหลัง รอบหน้า (ช่วงไหนก็ได้) เริ่มจองใหม่
+        os.replace(claims_path, claims_path.with_name(claims_path.name + ".merged"))
+    return ok
 
 if __name__ == "__main__":
-    discs, out_root, conc, chunk, retry = resolve_discs()
-    asyncio.run(main_async(discs, out_root, conc, chunk, retry))
+    discs, out_root, conc, chunk, retry, opts = resolve_discs()
+    shard, workers, merge = opts.pop("shard", None), opts.pop("workers", 1), opts.pop("merge", False)
+    if merge:
+        sys.exit(0 if merge_run(discs, out_root, opts.get("manifest_path")) else 1)
+    if shard is not None or workers > 1:
+        sys.exit(run_sharded(discs, out_root, conc, chunk, retry, opts, shard or (0, 1), workers))
+    asyncio.run(main_async(discs, out_root, conc, chunk, retry, **opts))
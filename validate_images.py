@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ตรวจว่ารูปที่โหลด/เตรียมไว้เปิดได้จริง แล้วย้ายไฟล์เสียไปกักไว้ (quarantine)
+
+ปัญหาที่เจอ: server ตอบหน้า HTML error ด้วย status 200, TIFF โหลดมาไม่ครบ — ไปพังเอาตอนเทรนกลาง epoch
+ต่อไฟล์ (process pool): magic bytes → decode เต็มรูปด้วย PIL → ขนาดกว้าง×สูง (เล็กเกิน MIN_SIDE ถือว่าเสีย)
+
+- crawler root : PillProjectDisc*/images/*  → ROOT/_quarantine/PillProjectDisc*/images/
+                 + ตั้ง status='quarantined' ใน crawl manifest → pill_disc_fast_async.py โหลดใหม่รอบถัดไป
+- YOLO root    : images/* (ชั้นเดียว) → YOLO/_quarantine/images/ พร้อม labels/<stem>.txt และสำเนาใน split
+- ผลตรวจ cache ไว้ที่ <root>/.image_check.json ตาม size + mtime → รอบต่อไปตรวจเฉพาะไฟล์ใหม่/เปลี่ยน
+
+    python validate_images.py --root Pills_downloads
+    python validate_images.py --root Pills_downloads --yolo dataset_yolo/dataset_medicines --dry-run
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from blob_store import BlobStore
+from crawl_manifest import CrawlManifest, MANIFEST_NAME
+
+OUT_ROOT = Path("Pills_downloads")
+CACHE_NAME = ".image_check.json"
+QUARANTINE_DIR = "_quarantine"
+QUARANTINE_LOG = "quarantine.jsonl"
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tif", ".tiff", ".webp")
+MIN_SIDE = 32            # px — ด้านสั้นเล็กกว่านี้ถือว่าไม่ใช่รูปยาที่ใช้ได้
+JOBS = os.cpu_count() or 4
+
+MAGIC = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+    (b"BM", "bmp"),
+)
+EXT_FORMAT = {".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".gif": "gif", ".bmp": "bmp",
+              ".tif": "tiff", ".tiff": "tiff", ".webp": "webp"}
+HTML_HEADS = (b"<!doctype", b"<html", b"<head", b"<body", b"<?xml", b"{")
+
+
+def sniff(head: bytes) -> str | None:
+    """ชนิดไฟล์จาก byte แรกๆ — "html" ถ้าเป็นหน้าเว็บ/ข้อความ, None ถ้าไม่รู้จัก"""
+    for magic, fmt in MAGIC:
+        if head.startswith(magic):
+            return fmt
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head.lstrip().lower().startswith(HTML_HEADS):
+        return "html"
+    return None
+
+
+def check_image(path: str) -> tuple[str, str | None, int, int, str]:
+    """(status ok|bad, format จาก magic, กว้าง, สูง, เหตุผล) — รันใน process ลูก
+    ขนาดขั้นต่ำไม่ได้ตรวจที่นี่ (ดู problem) → เปลี่ยน --min-side ได้โดยไม่ต้อง decode ใหม่"""
+    from PIL import Image
+    try:
+        with open(path, "rb") as f:
+            head = f.read(64)
+    except OSError as e:
+        return "bad", None, 0, 0, f"read: {e}"
+    if not head:
+        return "bad", None, 0, 0, "empty: 0 bytes"
+    fmt = sniff(head)
+    if fmt is None or fmt == "html":
+        return "bad", fmt, 0, 0, ("html: HTML/text instead of image" if fmt
+                                  else f"magic: unknown header {head[:8].hex()}")
+    try:
+        with Image.open(path) as im:
+            w, h = im.size
+            im.load()                      # decode ทั้งรูป — ไฟล์ที่ถูกตัดท้ายจะ error ตรงนี้
+    except Exception as e:                 # PIL โยนได้หลายแบบ (OSError, SyntaxError, DecompressionBomb...)
+        return "bad", fmt, 0, 0, f"decode: {type(e).__name__}: {e}"[:200]
+    return "ok", fmt, w, h, ""
+
+
+def problem(row: list, min_side: int = MIN_SIDE) -> str | None:
+    """เหตุผลที่รูปใช้ไม่ได้จากแถวใน cache [size, mtime_ns, status, fmt, w, h, reason] — None = ใช้ได้"""
+    if row[2] != "ok":
+        return row[6]
+    if min(row[4], row[5]) < min_side:
+        return f"small: {row[4]}x{row[5]} < {min_side}px"
+    return None
+
+
+def scan_crawl_root(root: Path) -> list[Path]:
+    out = []
+    for disc_dir in sorted(root.glob("PillProjectDisc*")):
+        img_dir = disc_dir / "images"
+        if img_dir.is_dir():
+            with os.scandir(img_dir) as it:
+                out += [img_dir / e.name for e in it
+                        if e.name.lower().endswith(IMAGE_EXTS) and e.is_file()]
+    return out
+
+
+def scan_yolo_root(root: Path) -> list[Path]:
+    img_dir = root / "images"
+    if not img_dir.is_dir():
+        return []
+    with os.scandir(img_dir) as it:
+        return sorted(img_dir / e.name for e in it if e.name.lower().endswith(IMAGE_EXTS) and e.is_file())
+
+
+def load_cache(root: Path) -> dict:
+    path = root / CACHE_NAME
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8")).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(root: Path, cache: dict):
+    tmp = root / (CACHE_NAME + ".tmp")
+    tmp.write_text(json.dumps({"files": cache}, separators=(",", ":")),
+                   encoding="utf-8")
+    os.replace(tmp, root / CACHE_NAME)
+
+
+def validate(root: Path, files: list[Path], jobs: int = JOBS) -> dict:
+    """ตรวจไฟล์ที่ยังไม่อยู่ใน cache (หรือ size/mtime เปลี่ยน) — คืน cache ใหม่ rel path → แถวผลตรวจ"""
+    old = load_cache(root)
+    cache, todo = {}, []
+    for p in files:
+        rel = p.relative_to(root).as_posix()
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        hit = old.get(rel)
+        if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            cache[rel] = hit
+        else:
+            todo.append((p, rel, st.st_size, st.st_mtime_ns))
+    print(f"[CHK ] {root}: {len(files)} ไฟล์  ตรวจใหม่ {len(todo)}  จาก cache {len(cache)}")
+    if todo:
+        t0 = time.perf_counter()
+        chunk = max(1, min(64, len(todo) // (jobs * 4) or 1))
+        with ProcessPoolExecutor(max_workers=max(1, jobs)) as ex:
+            results = ex.map(check_image, [str(t[0]) for t in todo], chunksize=chunk)
+            for i, ((p, rel, size, mtime), res) in enumerate(zip(todo, results), 1):
+                cache[rel] = [size, mtime, *res]
+                if i % 2000 == 0:
+                    print(f"    [PROG] {i}/{len(todo)}")
+        dt = time.perf_counter() - t0
+        print(f"[TIME] ตรวจ {len(todo)} ไฟล์ {dt:.1f}s ({len(todo) / max(dt, 1e-9):.0f} ไฟล์/s, jobs={jobs})")
+    return cache
+
+
+def find_bad(root: Path, cache: dict, min_side: int = MIN_SIDE) -> list[tuple[Path, list, str]]:
+    out = []
+    for rel, r in sorted(cache.items()):
+        why = problem(r, min_side)
+        if why:
+            out.append((root / rel, r, why))
+    return out
+
+
+def print_summary(cache: dict, bad: list):
+    ok = [r for r in cache.values() if r[2] == "ok"]
+    if ok:
+        sides = sorted(min(r[4], r[5]) for r in ok)
+        print(f"[DIM ] ด้านสั้น min {sides[0]}  median {sides[len(sides) // 2]}  max {sides[-1]} px")
+    mismatch = sum(1 for rel, r in cache.items()
+                   if r[3] and EXT_FORMAT.get(os.path.splitext(rel)[1].lower()) not in (None, r[3]))
+    if mismatch:
+        print(f"  [info] นามสกุลไม่ตรงกับเนื้อไฟล์ {mismatch} ไฟล์ (ยังเปิดได้ ไม่ถือว่าเสีย)")
+    reasons = {}
+    for _, _, why in bad:
+        key = why.split(":")[0]
+        reasons[key] = reasons.get(key, 0) + 1
+    print(f"[BAD ] {len(bad)} ไฟล์" + ("  " + ", ".join(f"{k}={v}" for k, v in sorted(reasons.items()))
+                                     if reasons else ""))
+    for p, _, why in bad[:10]:
+        print(f"    {p}: {why}")
+    if len(bad) > 10:
+        print(f"    ... อีก {len(bad) - 10} ไฟล์ (ดู {QUARANTINE_DIR}/{QUARANTINE_LOG})")
+
+
+def move_to_quarantine(root: Path, path: Path) -> Path:
+    dst = root / QUARANTINE_DIR / path.relative_to(root)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(path, dst)       # ที่เดิมเคยมีไฟล์เสียชื่อเดียวกัน → เขียนทับด้วยตัวล่าสุด
+    return dst
+
+
+def log_quarantine(root: Path, entries: list[dict]):
+    log = root / QUARANTINE_DIR / QUARANTINE_LOG
+    log.parent.mkdir(parents=True, exist_ok=True)
+    with open(log, "a", encoding="utf-8") as f:
+        for e in entries:
+            f.write(json.dumps(e, ensure_ascii=False) + "\n")
+
+
+def quarantine_crawl(root: Path, bad: list, cache: dict, manifest_path: Path | None = None) -> int:
+    """ย้ายรูปเสียของ crawler + status='quarantined' ใน manifest (ลบ blob ที่เป็นไฟล์เสียด้วย)"""
+    manifest = CrawlManifest(manifest_path or root / MANIFEST_NAME)
+    store = BlobStore(root)
+    entries, requeued = [], 0
+    try:
+        by_disc = {}
+        for item in bad:
+            name = item[0].parent.parent.name.removeprefix("PillProjectDisc")
+            by_disc.setdefault(int(name) if name.isdigit() else None, []).append(item)
+        for disc, items in by_disc.items():
+            # path ใน manifest อาจเป็น relative กับ cwd ตอน crawl → จับคู่ด้วย disc + ชื่อไฟล์
+            urls = {Path(path).name: (url, sha) for url, path, sha in manifest.db.execute(
+                "SELECT url, path, sha256 FROM files WHERE disc=?", (disc,))}
+            for p, r, why in items:
+                url, sha = urls.get(p.name, (None, None))
+                if sha:
+                    blob = store.blob_path(sha)
+                    if blob.exists() and blob.samefile(p):
+                        blob.unlink()     # ไม่ให้ดาวน์โหลดรอบหน้าที่ได้เนื้อเดียวกันลิงก์กลับมาที่ไฟล์เสีย
+                dst = move_to_quarantine(root, p)
+                cache.pop(p.relative_to(root).as_posix(), None)
+                if url:
+                    manifest.set_status(url, "quarantined")
+                    requeued += 1
+                entries.append({"time": time.time(), "path": str(p), "moved_to": str(dst), "url": url,
+                                "reason": why, "size": r[0]})
+    finally:
+        manifest.close()
+        log_quarantine(root, entries)
+    return requeued
+
+
+def quarantine_yolo(root: Path, bad: list, cache: dict):
+    """ย้ายรูปเสีย + label คู่กัน (และสำเนาใน images/<split>, labels/<split>) ออกจาก dataset"""
+    entries = []
+    for p, r, why in bad:
+        stem = p.stem
+        moved = [move_to_quarantine(root, p)]
+        cache.pop(p.relative_to(root).as_posix(), None)
+        extra = [root / "labels" / f"{stem}.txt"]
+        for kind, name in (("images", p.name), ("labels", f"{stem}.txt")):
+            d = root / kind
+            if d.is_dir():
+                extra += [sub / name for sub in d.iterdir() if sub.is_dir() and sub.name != QUARANTINE_DIR]
+        for q in extra:
+            if q.exists():
+                moved.append(move_to_quarantine(root, q))
+        entries.append({"time": time.time(), "path": str(p), "moved_to": [str(m) for m in moved],
+                        "reason": why, "size": r[0]})
+    log_quarantine(root, entries)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Decode-check downloaded / dataset images and quarantine bad ones")
+    p.add_argument("--root", default=str(OUT_ROOT), help="crawler output root (PillProjectDisc*/images)")
+    p.add_argument("--no-crawl", action="store_true", help="skip the crawler root (check --yolo only)")
+    p.add_argument("--yolo", action="append", default=[], help="YOLO dataset root with flat images/ (repeatable)")
+    p.add_argument("--manifest", help=f"crawl manifest path (default: ROOT/{MANIFEST_NAME})")
+    p.add_argument("--jobs", type=int, default=JOBS, help="decode processes")
+    p.add_argument("--min-side", type=int, default=MIN_SIDE, help="smallest acceptable short side (px)")
+    p.add_argument("--dry-run", action="store_true", help="report only; do not move files, touch the manifest or write the cache")
+    args = p.parse_args()
+
+    roots = ([("crawl", Path(args.root))] if not args.no_crawl else []) + [("yolo", Path(y)) for y in args.yolo]
+    t0 = time.perf_counter()
+    for kind, root in roots:
+        if not root.is_dir():
+            print(f"[WARN] ไม่พบ {root}")
+            continue
+        files = scan_crawl_root(root) if kind == "crawl" else scan_yolo_root(root)
+        cache = validate(root, files, args.jobs)
+        bad = find_bad(root, cache, args.min_side)
+        print_summary(cache, bad)
+        if bad and not args.dry_run:
+            if kind == "crawl":
+                n = quarantine_crawl(root, bad, cache, Path(args.manifest) if args.manifest else None)
+                print(f"[QUAR] ย้าย {len(bad)} ไฟล์ -> {root / QUARANTINE_DIR}  "
+                      f"ตั้งให้โหลดใหม่ใน manifest {n} ไฟล์ (รัน pill_disc_fast_async.py อีกรอบ)")
+            else:
+                quarantine_yolo(root, bad, cache)
+                print(f"[QUAR] ย้าย {len(bad)} รูป (+label) -> {root / QUARANTINE_DIR}  "
+                      f"→ รัน split_yolo_dataset.py ใหม่")
+        if not args.dry_run:        # dry-run แค่รายงาน ไม่เขียนอะไรลง root
+            save_cache(root, cache)
+    print(f"[DONE] {time.perf_counter() - t0:.1f}s" + (" (dry-run: ไม่ได้ย้ายไฟล์)" if args.dry_run else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())